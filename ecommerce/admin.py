@@ -0,0 +1,270 @@
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Round
+from django.utils.functional import cached_property
+
+from ecommerce.utils import catalog_snapshot, prerender
+from ecommerce.utils.catalog import bump_catalog_version
+from ecommerce.utils.fulfilment import bulk_transition
+from ecommerce.utils.quick_view import invalidate_quick_views
+
+from .models import (
+    Category,
+    Customer,
+    DailyCategorySales,
+    DailyProductSales,
+    Order,
+    OrderItem,
+    OrderStatusEvent,
+    Product,
+    Promotion,
+    Review,
+    Saved,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Use Postgres' row estimate for unfiltered changelists of big tables.
+
+    COUNT(*) on a large table is a full scan; pg_class.reltuples is free and
+    close enough for page links. Filtered querysets still count exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            estimate = int(row[0]) if row else -1
+            if estimate >= getattr(settings, "ADMIN_ESTIMATED_COUNT_THRESHOLD", 10000):
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ("-id",)
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("id", "choice")
+    search_fields = ("choice",)
+
+
+class RepriceActionForm(ActionForm):
+    percentage = forms.DecimalField(
+        required=False,
+        max_digits=5,
+        decimal_places=2,
+        help_text="For “Reprice”: e.g. 10 raises prices 10%, -15 cuts them 15%.",
+    )
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = (
+        "id",
+        "product_name",
+        "category",
+        "product_price",
+        "stock",
+        "reserved",
+        "review_count",
+        "avg_rating",
+    )
+    list_select_related = ("category",)
+    list_filter = ("category",)
+    autocomplete_fields = ("category",)
+    readonly_fields = ("reserved", "review_count", "avg_rating")
+    # Case-sensitive prefix match so Postgres can use the product_name
+    # varchar_pattern_ops index instead of scanning with UPPER(...) LIKE.
+    search_fields = ("=id", "product_name__startswith")
+    search_help_text = "Product id, or the start of the name (case-sensitive)."
+    action_form = RepriceActionForm
+    actions = ["reprice"]
+
+    @admin.action(description="Reprice selected products by a percentage")
+    def reprice(self, request, queryset):
+        try:
+            percentage = Decimal(request.POST.get("percentage") or "")
+        except InvalidOperation:
+            percentage = None
+        if percentage is None or percentage <= -100:
+            self.message_user(
+                request, "Enter a percentage greater than -100.", messages.ERROR
+            )
+            return
+        factor = Value(1 + percentage / 100, output_field=DecimalField())
+        product_ids = list(queryset.values_list("pk", flat=True))
+        updated = Product.objects.filter(pk__in=product_ids).update(
+            product_price=Round(F("product_price") * factor, 2)
+        )
+        # update() skips post_save, so invalidate the caches by hand.
+        invalidate_quick_views(product_ids)
+        bump_catalog_version()
+        catalog_snapshot.schedule_refresh()
+        prerender.schedule_refresh(product_ids)
+        self.message_user(request, f"Repriced {updated} products by {percentage}%.")
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "kind",
+        "code",
+        "value",
+        "min_subtotal",
+        "starts_at",
+        "ends_at",
+        "is_active",
+    )
+    list_filter = ("kind", "is_active")
+    search_fields = ("name", "code")
+    autocomplete_fields = ("products", "categories")
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ("product",)
+    readonly_fields = ("price",)
+
+
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    extra = 0
+    can_delete = False
+    fields = ("created_at", "from_status", "to_status", "changed_by")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "status", "total_amount", "payment_id", "created_at")
+    list_select_related = ("user",)
+    list_filter = ("status",)
+    raw_id_fields = ("user",)
+    search_fields = ("=id", "=payment_id", "=user__username")
+    search_help_text = "Exact order id, Stripe session id or username."
+    inlines = [OrderItemInline, OrderStatusEventInline]
+    actions = ["mark_shipped", "mark_delivered", "cancel_orders"]
+
+    def _transition(self, request, queryset, to_status):
+        moved = bulk_transition(queryset, to_status, changed_by=request.user)
+        self.message_user(
+            request,
+            f"Moved {moved} orders to {to_status}; orders whose status does not "
+            f"allow that were left alone.",
+        )
+
+    @admin.action(description="Mark selected orders as shipped")
+    def mark_shipped(self, request, queryset):
+        self._transition(request, queryset, "shipped")
+
+    @admin.action(description="Mark selected orders as delivered")
+    def mark_delivered(self, request, queryset):
+        self._transition(request, queryset, "delivered")
+
+    @admin.action(description="Cancel selected orders")
+    def cancel_orders(self, request, queryset):
+        self._transition(request, queryset, "cancelled")
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ("id", "order", "product", "quantity", "price")
+    list_select_related = ("order__user", "product")
+    raw_id_fields = ("order", "product")
+    search_fields = ("=order__id", "=product__id")
+    search_help_text = "Exact order id or product id."
+
+
+@admin.register(Review)
+class ReviewAdmin(LargeTableAdmin):
+    list_display = ("id", "product", "user", "rating", "created_at")
+    list_select_related = ("product", "user")
+    list_filter = ("rating",)
+    raw_id_fields = ("product", "user")
+    search_fields = ("=product__id", "=user__username")
+    search_help_text = "Exact product id or username."
+
+
+@admin.register(Saved)
+class SavedAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "product", "saved_at")
+    list_select_related = ("user", "product")
+    raw_id_fields = ("user", "product")
+    search_fields = ("=user__username", "=product__id")
+    search_help_text = "Exact username or product id."
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "phone")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ("user__username__startswith", "=phone")
+    search_help_text = "Start of the username (case-sensitive) or exact phone."
+
+
+class SalesRollupAdmin(admin.ModelAdmin):
+    """Read-only reporting over the rollup tables; never touches Order."""
+
+    change_list_template = "admin/ecommerce/sales_change_list.html"
+    date_hierarchy = "date"
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, "context_data", {}).get("cl")
+        if changelist is not None:
+            response.context_data["totals"] = changelist.queryset.aggregate(
+                units=Sum("units"),
+                revenue=Sum("revenue"),
+                order_count=Sum("order_count"),
+            )
+        return response
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(SalesRollupAdmin):
+    list_display = ("date", "product", "units", "revenue", "order_count")
+    list_select_related = ("product",)
+    list_filter = ("product__category",)
+    search_fields = ("product__product_name__startswith",)
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(SalesRollupAdmin):
+    list_display = ("date", "category", "units", "revenue", "order_count")
+    list_select_related = ("category",)
+    list_filter = ("category",)
@@ -0,0 +1,119 @@
+// ----- Add to Cart / Quantity Stepper -----
+// Cards render #add-btn-<id>, #stepper-<id> and #qty-<id> (a span, or a
+// read-only input on the product page); #decrease-<id> is optional. The cart
+// page has only #qty-<id>, which then just shows the new quantity.
+function setQty(productId, quantity) {
+    const qty = document.getElementById('qty-' + productId);
+    if (!qty) return;
+    if (qty.tagName === 'INPUT') qty.value = quantity;
+    else qty.textContent = quantity;
+}
+
+function showStepper(productId, quantity) {
+    const addBtn = document.getElementById('add-btn-' + productId);
+    const stepper = document.getElementById('stepper-' + productId);
+    const decrease = document.getElementById('decrease-' + productId);
+    if (quantity > 0 || !addBtn) {
+        setQty(productId, quantity);
+        if (addBtn) addBtn.classList.add('d-none');
+        if (stepper) stepper.classList.remove('d-none');
+        if (decrease) decrease.disabled = quantity <= 1;
+    } else {
+        setQty(productId, 1);
+        if (stepper) stepper.classList.add('d-none');
+        addBtn.classList.remove('d-none');
+    }
+}
+
+// Pages with their own totals (the cart) listen for this.
+function cartChanged(productId, data) {
+    updateCartIconCount(data.cart_count ?? data.cart_total_items);
+    document.dispatchEvent(new CustomEvent('cart:changed', {detail: {productId, data}}));
+}
+
+function addToCart(productId) {
+    postJSON(shopUrl('increase', productId))
+    .then(res => res.json())
+    .then(data => {
+        if (data.status === 'success') {
+            showStepper(productId, Number(data.quantity));
+            cartChanged(productId, data);
+            showToast(data.messages_html || 'Added to cart!', 'success');
+        } else {
+            showToast(data.message || 'Failed to add to cart', 'error');
+        }
+    })
+    .catch(() => showToast('Error adding to cart', 'error'));
+}
+
+function updateQty(productId, action) {
+    postJSON(shopUrl(action === 'increase' ? 'increase' : 'decrease', productId))
+    .then(res => res.json())
+    .then(data => {
+        if (data.status !== 'success') {
+            showToast(data.message || 'Failed to update quantity.', 'error');
+            return;
+        }
+        const quantity = Number(data.quantity) || 0;
+        showStepper(productId, quantity);
+        cartChanged(productId, data);
+        if (quantity <= 0) showToast('Removed from cart', 'warning');
+        else showToast(data.message || 'Quantity updated', 'info');
+    })
+    .catch(() => showToast('Failed to update quantity.', 'error'));
+}
+
+function buyNow(productId) {
+    postJSON(shopUrl('increase', productId))
+    .then(res => res.json())
+    .then(data => {
+        if (data.status === 'success') {
+            cartChanged(productId, data);
+            showToast('Added to cart', 'success');
+            // Leave the toast up briefly before going to the cart.
+            setTimeout(() => { window.location.href = shopUrl('cart'); }, 500);
+        } else {
+            showToast(data.message || 'Failed to add to cart', 'error');
+        }
+    })
+    .catch(() => showToast('Error adding to cart', 'error'));
+}
+
+// ----- Buy Now forms -----
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.buy-now-form').forEach(form => {
+        form.addEventListener('submit', function(e) {
+            e.preventDefault();
+            postJSON(this.action)
+            .then(res => res.json())
+            .then(data => {
+                if (data.status === 'success') {
+                    const url = new URL(data.redirect_url, window.location.origin);
+                    url.searchParams.set('msg', data.message);
+                    window.location.href = url;
+                } else {
+                    showToast(data.message || 'Failed to buy now', 'error');
+                }
+            })
+            .catch(() => showToast('Failed to buy now', 'error'));
+        });
+    });
+});
+
+// ----- Save / Unsave -----
+function toggleSave(button) {
+    const productId = button.dataset.productId;
+    if (!productId) return;
+    postJSON(shopUrl('save', productId))
+    .then(resp => {
+        if (resp.status === 403) { showToast('Please login to save products', 'warning'); return null; }
+        return resp.json();
+    })
+    .then(data => {
+        if (!data) return;
+        if (data.status === 'added') { button.classList.add('saved'); button.innerHTML = '<i class="bi bi-bookmark-fill"></i>'; showToast(data.message, 'success'); }
+        else if (data.status === 'removed') { button.classList.remove('saved'); button.innerHTML = '<i class="bi bi-bookmark"></i>'; showToast(data.message, 'info'); }
+        else { showToast(data.message || 'Unknown response', 'error'); }
+    })
+    .catch(() => showToast('Failed to toggle saved status', 'error'));
+}
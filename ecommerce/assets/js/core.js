@@ -0,0 +1,80 @@
+// ----- Page config -----
+// URLs are rendered by base.html as data-*-url attributes on <body>. Per-product
+// endpoints are rendered for product id 0 and filled in by shopUrl().
+function shopUrl(name, productId) {
+    const url = document.body.dataset[name + 'Url'];
+    return productId === undefined ? url : url.replace(/\/0\/$/, `/${productId}/`);
+}
+
+// ----- CSRF -----
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie) {
+        document.cookie.split(';').forEach(cookie => {
+            cookie = cookie.trim();
+            if (cookie.startsWith(name + '=')) cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+        });
+    }
+    return cookieValue;
+}
+
+function postJSON(url) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {'X-CSRFToken': getCookie('csrftoken'), 'X-Requested-With': 'XMLHttpRequest'},
+    });
+}
+
+// ----- Toast Helper -----
+function showToast(message, type='primary') {
+    const toastContainer = document.getElementById('toast-container');
+    if (!toastContainer) return;
+
+    const bgClass = {
+        'success': 'text-bg-success',
+        'info': 'text-bg-info',
+        'warning': 'text-bg-warning',
+        'error': 'text-bg-danger',
+        'danger': 'text-bg-danger',
+    }[type] || 'text-bg-primary';
+
+    const icon = {
+        'success': '✅',
+        'info': 'ℹ️',
+        'warning': '⚠️',
+        'error': '❌',
+        'danger': '❌',
+    }[type] || '';
+
+    const tempDiv = document.createElement('div');
+    tempDiv.innerHTML = `
+    <div class="toast ${bgClass} border-0" role="alert" data-bs-delay="2500" aria-live="polite" aria-atomic="true">
+      <div class="d-flex">
+        <div class="toast-body">${icon} ${message}</div>
+        <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast" aria-label="Close"></button>
+      </div>
+    </div>`;
+    const toastEl = tempDiv.firstElementChild;
+    toastContainer.appendChild(toastEl);
+
+    const bsToast = new bootstrap.Toast(toastEl);
+    bsToast.show();
+    toastEl.addEventListener('hidden.bs.toast', () => toastEl.remove());
+}
+
+// ----- Cart Icon -----
+function updateCartIconCount(count) {
+    const cartCount = document.getElementById('cart-count');
+    if (cartCount && count !== undefined) {
+        const numCount = Number(count);
+        cartCount.textContent = numCount;
+        cartCount.style.display = numCount > 0 ? 'inline' : 'none';
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    fetch(shopUrl('cartCount'))
+        .then(res => res.json())
+        .then(data => updateCartIconCount(data.cart_count))
+        .catch(() => console.error('Error fetching cart count'));
+});
@@ -0,0 +1,52 @@
+// ----- Load older reviews -----
+const loadMoreReviews = document.getElementById('load-more-reviews');
+if (loadMoreReviews) {
+    loadMoreReviews.addEventListener('click', () => {
+        const url = `${loadMoreReviews.dataset.url}?cursor=${encodeURIComponent(loadMoreReviews.dataset.cursor)}`;
+        loadMoreReviews.disabled = true;
+        fetch(url)
+            .then(res => res.json())
+            .then(data => {
+                document.getElementById('review-list').insertAdjacentHTML('beforeend', data.html);
+                if (data.next_cursor) {
+                    loadMoreReviews.dataset.cursor = data.next_cursor;
+                    loadMoreReviews.disabled = false;
+                } else {
+                    loadMoreReviews.remove();
+                }
+            })
+            .catch(() => { loadMoreReviews.disabled = false; });
+    });
+}
+
+// ----- Star rating -----
+document.querySelectorAll('#star-rating .star').forEach(star => {
+    star.addEventListener('click', () => {
+        const value = Number(star.dataset.value);
+        document.getElementById('rating-input').value = value;
+        document.querySelectorAll('#star-rating .star').forEach(s => s.textContent = '☆');
+        for (let i = 0; i < value; i++) document.querySelectorAll('#star-rating .star')[i].textContent = '★';
+    });
+});
+
+// ----- Save for Later -----
+document.querySelectorAll('.save-product-form').forEach(form => {
+    form.addEventListener('submit', function(e) {
+        e.preventDefault();
+        const messageDiv = document.getElementById(`save-message-${this.dataset.productId}`);
+        postJSON(this.action)
+        .then(res => res.json())
+        .then(data => {
+            messageDiv.innerHTML = `<div class="alert alert-info">${data.message}</div>`;
+            setTimeout(() => messageDiv.innerHTML = '', 3000);
+            const btn = this.querySelector('button');
+            if (data.status === 'added') {
+                btn.innerHTML = '<i class="bi bi-bookmark-check"></i> Remove from Saved';
+                btn.classList.remove('btn-outline-secondary'); btn.classList.add('btn-warning');
+            } else {
+                btn.innerHTML = '<i class="bi bi-bookmark"></i> Save for Later';
+                btn.classList.remove('btn-warning'); btn.classList.add('btn-outline-secondary');
+            }
+        });
+    });
+});
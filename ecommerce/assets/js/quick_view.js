@@ -0,0 +1,48 @@
+// ----- Quick View -----
+// Fragments for cards that scroll into view are fetched in one batch request.
+const quickViewFragments = {};
+const quickViewRequested = new Set();
+let quickViewPending = [];
+let quickViewTimer = null;
+
+function prefetchQuickViews() {
+    const ids = quickViewPending;
+    quickViewPending = [];
+    quickViewTimer = null;
+    if (!ids.length) return;
+    fetch(`${shopUrl('quickViewBatch')}?ids=${ids.join(',')}`)
+    .then(res => res.json())
+    .then(data => Object.assign(quickViewFragments, data.fragments || {}))
+    .catch(() => ids.forEach(id => quickViewRequested.delete(id)));
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const cards = document.querySelectorAll('.product-item[data-product-id]');
+    if (!cards.length || !('IntersectionObserver' in window)) return;
+    const quickViewObserver = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            const id = entry.target.dataset.productId;
+            if (!entry.isIntersecting || quickViewRequested.has(id)) return;
+            quickViewRequested.add(id);
+            quickViewPending.push(id);
+            quickViewObserver.unobserve(entry.target);
+        });
+        if (quickViewPending.length && !quickViewTimer) {
+            quickViewTimer = setTimeout(prefetchQuickViews, 150);
+        }
+    }, {rootMargin: '200px'});
+    cards.forEach(el => quickViewObserver.observe(el));
+});
+
+function loadQuickViewContent(productId) {
+    const modalBody = document.querySelector('#productQuickViewModal .modal-body');
+    if (quickViewFragments[productId]) {
+        modalBody.innerHTML = quickViewFragments[productId];
+        return;
+    }
+    modalBody.innerHTML = `<div class="text-center py-5"><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div><p class="mt-2">Loading product details...</p></div>`;
+    fetch(shopUrl('quickView', productId))
+    .then(res => res.json())
+    .then(data => { modalBody.innerHTML = data.html || '<p class="text-danger text-center">Failed to load product details.</p>'; })
+    .catch(() => { modalBody.innerHTML = '<p class="text-danger text-center">Error loading product details. Please try again.</p>'; });
+}
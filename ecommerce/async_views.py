@@ -0,0 +1,96 @@
+"""Native async versions of the JSON endpoints, used when SERVER_MODE=asgi.
+
+Each wraps the helpers behind the view of the same name in ecommerce.views:
+the session, user and cache I/O is done with the async APIs, and the helper
+(which touches the ORM) runs in a thread, so a uvicorn worker can keep many
+of these short I/O-bound requests in flight at once.
+
+Wrapping the sync helpers in sync_to_async, rather than rewriting them on
+the async ORM (aget, acount, ...), is deliberate: the WSGI and ASGI views
+then share one implementation of the cart, saved-item and stock rules and
+cannot drift apart. Keep new endpoints to the same pattern.
+"""
+
+from asgiref.sync import sync_to_async
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from ecommerce.utils import metrics
+from ecommerce.utils.quick_view import aget_quick_view_fragments
+from ecommerce.utils.rate_limit import client_ip, rate_limit
+
+from . import views
+from .views import login_required_json
+
+
+async def _get_cart(request):
+    return views._session_cart(await request.session.aget("cart", {}))
+
+
+async def _update_cart(request, change, product_id, *args):
+    """Apply a views helper to the session cart, saving it unless it was a no-op."""
+    cart = await _get_cart(request)
+    payload = await sync_to_async(change)(cart, product_id, *args)
+    if payload is not None:
+        await request.session.aset("cart", cart)
+    return payload
+
+
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip))
+@metrics.count_cart_operation("add")
+@require_POST
+async def add_to_cart(request, product_id):
+    return JsonResponse(await _update_cart(request, views._add_to_cart, product_id))
+
+
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip))
+@metrics.count_cart_operation("increase")
+@require_POST
+async def increase_quantity(request, product_id):
+    coupon = await request.session.aget("coupon")
+    return JsonResponse(
+        await _update_cart(request, views._increase_quantity, product_id, coupon)
+    )
+
+
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip))
+@metrics.count_cart_operation("decrease")
+@require_POST
+async def decrease_quantity(request, product_id):
+    coupon = await request.session.aget("coupon")
+    payload = await _update_cart(request, views._decrease_quantity, product_id, coupon)
+    return JsonResponse(views.NOT_IN_CART if payload is None else payload)
+
+
+@metrics.instrument_view
+async def cart_count(request):
+    cart = await _get_cart(request)
+    return JsonResponse({"cart_count": len(cart)})
+
+
+@metrics.instrument_view
+@require_POST
+async def save_product(request, product_id):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return login_required_json(request)
+    return JsonResponse(await sync_to_async(views._save_product)(user, product_id))
+
+
+@metrics.instrument_view
+@require_POST
+async def remove_saved(request, product_id):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return login_required_json(request)
+    return JsonResponse(await sync_to_async(views._remove_saved)(user, product_id))
+
+
+@metrics.instrument_view
+async def quick_view_product(request, product_id):
+    fragments = await aget_quick_view_fragments([product_id])
+    return JsonResponse(views._quick_view(fragments, product_id))
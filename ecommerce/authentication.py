@@ -0,0 +1,131 @@
+"""JWT authentication for the API that trusts the token's own claims.
+
+simplejwt's JWTAuthentication loads the User row on every request, and
+request.user.customer costs a second query. Tokens issued through
+ShopTokenObtainPairSerializer also carry the username, is_staff, the
+customer id and the user's token version, so ClaimsJWTAuthentication
+builds a ClaimsUser from the token alone. The User and Customer rows are
+only fetched if a view touches something the claims don't cover.
+
+Revocation: revoke_tokens() bumps Customer.token_version, and tokens
+carrying an older version are rejected. The current version is cached per
+process for JWT_TOKEN_VERSION_TTL seconds, so revoking takes effect in the
+other workers within that window. ecommerce.signals revokes a user's tokens
+when they log out, and when their password, is_active or is_staff changes.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from ecommerce.models import Customer
+from ecommerce.utils.search_cache import LRUCache
+
+VERSION_CLAIM = "token_version"
+
+_versions = LRUCache(maxsize=10000, ttl=getattr(settings, "JWT_TOKEN_VERSION_TTL", 30))
+
+
+def current_version(user_id):
+    version = _versions.get(user_id)
+    if version is None:
+        version = (
+            Customer.objects.filter(user_id=user_id)
+            .values_list("token_version", flat=True)
+            .first()
+        ) or 0
+        _versions.set(user_id, version)
+    return version
+
+
+def revoke_tokens(user):
+    """Invalidate every token issued to `user` so far."""
+    bumped = Customer.objects.filter(user=user).update(
+        token_version=F("token_version") + 1
+    )
+    if not bumped:
+        # Tokens of users without a Customer row carry version 0.
+        Customer.objects.get_or_create(user=user, defaults={"token_version": 1})
+    _versions.set(user.pk, None)  # reloaded on this worker's next request
+
+
+class ClaimsUser:
+    """request.user for API calls, built from the token's claims.
+
+    ``id``, ``username``, ``is_active``, ``is_staff`` and ``customer_id``
+    come from the token; any other attribute loads the User row (once per
+    request). Use ``user_id=request.user.id`` rather than
+    ``user=request.user`` in queries.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = int(token[api_settings.USER_ID_CLAIM])
+        self.username = token["username"]
+        self.is_active = token.get("is_active", True)
+        self.is_staff = token.get("is_staff", False)
+        self.customer_id = token.get("customer_id")
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.id)
+
+    @cached_property
+    def customer(self):
+        if self.customer_id is None:
+            raise Customer.DoesNotExist("User has no customer.")
+        return Customer.objects.get(pk=self.customer_id)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __eq__(self, other):
+        return isinstance(other, (ClaimsUser, User)) and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return self.username
+
+    def get_username(self):
+        return self.username
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if "username" not in validated_token:
+            # Issued before tokens carried claims: load the user as before.
+            return super().get_user(validated_token)
+        user = ClaimsUser(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if validated_token.get(VERSION_CLAIM, 0) != current_version(user.id):
+            raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+        return user
+
+
+class ShopTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        customer = (
+            Customer.objects.filter(user=user)
+            .values_list("pk", "token_version")
+            .first()
+        )
+        token["username"] = user.get_username()
+        token["is_active"] = user.is_active
+        token["is_staff"] = user.is_staff
+        token["customer_id"], token[VERSION_CLAIM] = customer or (None, 0)
+        return token
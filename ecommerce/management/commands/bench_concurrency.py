@@ -0,0 +1,71 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.models import Product
+from ecommerce.utils import bench
+
+from .bench_storefront import current_commit
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent-connection throughput of the JSON cart/quick-view "
+        "endpoints against a running server. Run it once against a "
+        "SERVER_MODE=wsgi server and once against SERVER_MODE=asgi with the "
+        "same --output file to get both modes side by side. Start the server "
+        "with RATE_LIMIT_ENABLED=False, or the cart limits will reject most "
+        "requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--label", required=True, help="name for this run, e.g. wsgi or asgi"
+        )
+        parser.add_argument(
+            "--connections", type=int, nargs="+", default=[1, 10, 50, 100]
+        )
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--products", type=int, default=50)
+        parser.add_argument("--output", default="bench_concurrency.json")
+
+    def handle(self, *args, **options):
+        product_ids = list(
+            Product.objects.order_by("id").values_list("id", flat=True)[
+                : options["products"]
+            ]
+        )
+        if not product_ids:
+            raise CommandError("The database the server uses has no products.")
+
+        runs = []
+        for connections in options["connections"]:
+            result = bench.run_http_load(
+                options["url"], product_ids, connections, options["duration"]
+            )
+            runs.append(result)
+            self.stdout.write(
+                f"{options['label']:>6} {connections:>4} conns  "
+                f"{result['throughput_rps']:>9.1f} req/s  "
+                f"p50 {result['p50_ms']:>8.2f} ms  "
+                f"p95 {result['p95_ms']:>8.2f} ms  "
+                f"errors {result['errors']}"
+            )
+
+        report = {}
+        if os.path.exists(options["output"]):
+            with open(options["output"]) as fh:
+                report = json.load(fh)
+        report[options["label"]] = {
+            "commit": current_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "url": options["url"],
+            "duration_s": options["duration"],
+            "runs": runs,
+        }
+        with open(options["output"], "w") as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
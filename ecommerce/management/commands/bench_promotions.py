@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.utils import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the promotion engine in memory: compile N synthetic rules, then "
+        "price an M-line cart repeatedly. No database is used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rules", type=int, default=100)
+        parser.add_argument("--lines", type=int, default=50)
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        result = bench.run_promotions_benchmark(
+            rules=options["rules"],
+            lines=options["lines"],
+            iterations=options["iterations"],
+        )
+        self.stdout.write(
+            f"{result['rules']} rules x {result['lines']} lines: "
+            f"compile {result['compile_ms']} ms, price "
+            f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+            f"p99 {result['p99_ms']} ms  ({result['throughput_rps']} carts/s)"
+        )
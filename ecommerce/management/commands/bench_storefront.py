@@ -0,0 +1,87 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ecommerce.utils import bench
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic catalog in a throwaway test database and benchmark "
+        "the storefront views in-process. Results are written as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--products", type=int, default=50, help="per category")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--reviews", type=int, default=5, help="per product")
+        parser.add_argument("--saved", type=int, default=10, help="per user")
+        parser.add_argument("--orders", type=int, default=10, help="per user")
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument(
+            "--only", nargs="*", help="run only these scenarios (default: all)"
+        )
+        parser.add_argument("--output", default="bench_results.json")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            dataset = bench.seed_catalog(
+                categories=options["categories"],
+                products_per_category=options["products"],
+                users=options["users"],
+                reviews_per_product=options["reviews"],
+                saved_per_user=options["saved"],
+                orders_per_user=options["orders"],
+            )
+            results = bench.run_benchmarks(
+                iterations=options["iterations"],
+                warmup=options["warmup"],
+                only=options["only"],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "commit": current_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "dataset": dataset,
+            "iterations": options["iterations"],
+            "results": results,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:16} {stats['throughput_rps']:>9} req/s  "
+                f"p50 {stats['p50_ms']:>8}ms  p95 {stats['p95_ms']:>8}ms  "
+                f"p99 {stats['p99_ms']:>8}ms  {stats['mean_bytes']:>7} B"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.utils.assets import OUTPUT_DIR, build_bundles
+
+
+class Command(BaseCommand):
+    help = (
+        "Concatenate the CSS/JS sources in ecommerce/assets into the static "
+        "bundles the templates load."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if any bundle is out of date instead of writing it.",
+        )
+
+    def handle(self, *args, **options):
+        changed = build_bundles(check=options["check"])
+        if options["check"]:
+            if changed:
+                raise CommandError(
+                    f"Out of date bundles: {', '.join(changed)}. "
+                    "Run manage.py build_assets."
+                )
+            self.stdout.write(self.style.SUCCESS("Bundles are up to date."))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {len(changed)} bundles to {OUTPUT_DIR}.")
+        )
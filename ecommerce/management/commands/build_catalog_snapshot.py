@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.utils.catalog_snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the binary catalog snapshot that workers mmap to sort and filter "
+        "product listings. The file is swapped in atomically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", default=None, help="Defaults to CATALOG_SNAPSHOT_PATH."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.CATALOG_SNAPSHOT_PATH
+        if not path:
+            raise CommandError("Set CATALOG_SNAPSHOT_PATH or pass --path.")
+        count = build_snapshot(path)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} products to {path}."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.utils.related_products import rebuild_relations
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the frequently-bought-together table from OrderItem, keeping "
+        "the top K co-purchased products for each product."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=None)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = rebuild_relations(
+            top_k=options["top_k"], chunk_size=options["chunk_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} product relations."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.utils.sales_rollups import rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold new orders into the daily product/category sales rollups, "
+        "starting from the stored watermark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="discard the rollups and recompute them from every order",
+        )
+        parser.add_argument(
+            "--lag",
+            type=int,
+            default=None,
+            help="skip orders newer than this many seconds",
+        )
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        run = rebuild_rollups if options["rebuild"] else update_rollups
+        processed = run(options["lag"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} orders."))
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.models import Product
+from ecommerce.storage import ContentAddressedStorage, product_photo_storage
+from ecommerce.utils import prerender
+from ecommerce.utils.images import blob_for_name
+from ecommerce.utils.quick_view import invalidate_quick_views
+
+
+class Command(BaseCommand):
+    help = (
+        "Move product photos saved before content-addressed storage to their "
+        "hashed names, so identical images share one file and one ImageBlob."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete-originals",
+            action="store_true",
+            help="Remove the old files once no product references them.",
+        )
+
+    def handle(self, *args, **options):
+        storage = product_photo_storage()
+        originals = {}
+        moved = {}
+        products = (
+            Product.objects.exclude(product_photo="")
+            .exclude(product_photo__isnull=True)
+            .values_list("pk", "product_photo", "photo_blob_id")
+        )
+        for product_id, name, blob_id in products.iterator():
+            if ContentAddressedStorage.digest_of(name):
+                if blob_id is None:
+                    blob = blob_for_name(name)
+                    Product.objects.filter(pk=product_id).update(photo_blob=blob)
+                continue
+            if name not in originals:
+                if not storage.exists(name):
+                    self.stderr.write(f"Missing file for product {product_id}: {name}")
+                    originals[name] = None
+                    continue
+                with storage.open(name) as f:
+                    originals[name] = (storage.save(name, f), storage.size(name))
+            if originals[name] is None:
+                continue
+            hashed_name = originals[name][0]
+            Product.objects.filter(pk=product_id).update(
+                product_photo=hashed_name, photo_blob=blob_for_name(hashed_name)
+            )
+            moved[product_id] = hashed_name
+
+        # update() skips post_save; the photo URL appears in these pages.
+        invalidate_quick_views(list(moved))
+        prerender.schedule_refresh(list(moved))
+
+        migrated = {name: saved for name, saved in originals.items() if saved}
+        before = sum(size for _, size in migrated.values())
+        blobs = {hashed_name for hashed_name, _ in migrated.values()}
+        after = sum(storage.size(hashed_name) for hashed_name in blobs)
+        if options["delete_originals"]:
+            still_used = set(
+                Product.objects.filter(product_photo__in=list(migrated)).values_list(
+                    "product_photo", flat=True
+                )
+            )
+            for name in migrated.keys() - still_used:
+                storage.delete(name)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Moved {len(moved)} products from {len(migrated)} files to "
+                f"{len(blobs)} blobs ({before} -> {after} bytes)."
+            )
+        )
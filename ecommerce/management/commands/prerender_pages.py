@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.utils.prerender import render_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the anonymous product detail and category listing pages to "
+        "PRERENDER_ROOT, using a process pool for the product pages."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="1 renders inline."
+        )
+        parser.add_argument("--chunk-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not settings.PRERENDER_ROOT:
+            raise CommandError("Set PRERENDER_ROOT to enable pre-rendering.")
+        start = time.perf_counter()
+        products, listings = render_all(
+            workers=options["workers"], chunk_size=options["chunk_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {products} product pages and {listings} listings "
+                f"in {time.perf_counter() - start:.1f}s."
+            )
+        )
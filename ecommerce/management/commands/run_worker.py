@@ -0,0 +1,56 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce import tasks  # noqa: F401  registers the tasks
+from ecommerce.utils import task_queue
+
+STALE_CHECK_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Run background tasks from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.TASK_WORKER_CONCURRENCY,
+            help="worker threads in this process",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=settings.TASK_POLL_INTERVAL
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="exit once no task is due instead of waiting for more",
+        )
+
+    def requeue_stale(self):
+        requeued = task_queue.requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale tasks.")
+
+    def handle(self, *args, **options):
+        # Before starting, so a burst run also picks up abandoned tasks.
+        self.requeue_stale()
+        stop, threads = task_queue.run_workers(
+            options["concurrency"], options["poll_interval"], options["burst"]
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write(f"Started {len(threads)} worker threads.")
+
+        while True:
+            # Returns as soon as every worker has exited (in burst mode, once
+            # the queue is empty) or after STALE_CHECK_INTERVAL otherwise.
+            deadline = time.monotonic() + STALE_CHECK_INTERVAL
+            for thread in threads:
+                thread.join(max(0, deadline - time.monotonic()))
+            if not any(thread.is_alive() for thread in threads):
+                break
+            self.requeue_stale()
+        self.stdout.write("Workers stopped.")
@@ -0,0 +1,161 @@
+import logging
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from ecommerce.utils import metrics, perf_budget, prerender, query_metrics
+
+logger = logging.getLogger("ecommerce.perf_budget")
+
+
+def get_view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.view_name
+
+
+class SyncInstrumentedMiddleware:
+    """Base for middleware that wraps the DB connection of the current thread.
+
+    Under ASGI the view's queries run on executor threads, out of reach of
+    ``connection.execute_wrapper``, so async requests are passed straight
+    through instead of forcing the whole chain back onto a single thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        return self.process(request)
+
+
+class QueryMetricsMiddleware(SyncInstrumentedMiddleware):
+    """Record per-view query count, DB time and the slowest statement.
+
+    Only a sample of requests is instrumented (QUERY_METRICS_SAMPLE_RATE);
+    the per-view totals are exported on /metrics and logged periodically.
+    With DEBUG on, the numbers for the current request are also sent back as
+    ``Server-Timing`` / ``X-DB-*`` headers.
+    """
+
+    def process(self, request):
+        if not query_metrics.should_sample():
+            return self.get_response(request)
+
+        collector = query_metrics.QueryCollector()
+        with collector.capture(request):
+            response = self.get_response(request)
+
+        view_name = get_view_name(request)
+        query_metrics.record(view_name, collector)
+        metrics.record_query_sample(view_name, collector)
+        if settings.DEBUG:
+            db_ms = collector.duration * 1000
+            response["Server-Timing"] = (
+                f'db;dur={db_ms:.2f};desc="{collector.count} queries"'
+            )
+            response["X-DB-Query-Count"] = str(collector.count)
+            response["X-DB-Slowest-Ms"] = f"{collector.slowest_duration * 1000:.2f}"
+        return response
+
+
+class PerformanceBudgetMiddleware(SyncInstrumentedMiddleware):
+    """Enforce PERFORMANCE_BUDGETS per URL name and flag N+1 query patterns.
+
+    Violations are logged, or raised as PerformanceBudgetExceeded when
+    PERFORMANCE_BUDGET_ACTION is "raise" (useful in DEBUG and in tests).
+    """
+
+    def process(self, request):
+        if not getattr(settings, "PERFORMANCE_BUDGETS_ENABLED", False):
+            return self.get_response(request)
+
+        collector = perf_budget.ShapeCollector()
+        start = time.perf_counter()
+        with collector.capture(request):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        problems = perf_budget.check_budget(get_view_name(request), collector, elapsed)
+        if problems:
+            if getattr(settings, "PERFORMANCE_BUDGET_ACTION", "log") == "raise":
+                raise perf_budget.PerformanceBudgetExceeded("\n".join(problems))
+            for problem in problems:
+                logger.warning(problem)
+        return response
+
+
+class PrerenderedPageMiddleware:
+    """Serve pages written by ``manage.py prerender_pages`` to anonymous users.
+
+    Must come after CsrfViewMiddleware, AuthenticationMiddleware and
+    MessageMiddleware: the visitor's CSRF token is substituted into the file,
+    and the CSRF middleware then sets the matching cookie on the way out.
+    Logged-in users, visitors with a cart or flash messages to show (the
+    files are rendered for an empty session), and any request the files do
+    not cover, fall through to the views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.eligible(request) and not request.user.is_authenticated:
+            response = self.prerendered_response(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.eligible(request) and not (await request.auser()).is_authenticated:
+            response = await sync_to_async(self.prerendered_response)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def eligible(self, request):
+        return request.method in ("GET", "HEAD") and bool(prerender.prerender_root())
+
+    def personalised(self, request):
+        # len() reads the messages without marking them as shown
+        return bool(request.session.get("cart")) or bool(
+            len(messages.get_messages(request))
+        )
+
+    def prerendered_response(self, request):
+        relative_path = prerender.lookup(request.path_info, request.GET)
+        if relative_path is None or self.personalised(request):
+            return None
+        try:
+            with open(
+                os.path.join(prerender.prerender_root(), relative_path),
+                encoding="utf-8",
+            ) as f:
+                html = f.read()
+        except FileNotFoundError:
+            return None
+        response = HttpResponse(
+            html.replace(prerender.CSRF_PLACEHOLDER, get_token(request))
+        )
+        response["X-Prerendered"] = "1"
+        return response
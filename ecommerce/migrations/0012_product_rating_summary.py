@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Product = apps.get_model("ecommerce", "Product")
+    Review = apps.get_model("ecommerce", "Review")
+    summaries = Review.objects.values("product_id").annotate(
+        count=Count("id"), avg=Avg("rating")
+    )
+    for row in summaries.iterator():
+        Product.objects.filter(pk=row["product_id"]).update(
+            review_count=row["count"], avg_rating=round(row["avg"], 1)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0011_alter_product_product_photo"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="avg_rating",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "-created_at", "-id"],
+                name="ecommerce_r_product_3dc5b4_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
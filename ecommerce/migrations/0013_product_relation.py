@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0012_product_rating_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductRelation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.PositiveIntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="relations",
+                        to="ecommerce.product",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="ecommerce.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product", "-score"],
+                        name="ecommerce_p_product_71fead_idx",
+                    )
+                ],
+                "unique_together": {("product", "related")},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0015_product_stock"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="payment_id",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=255, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="product_name",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:33
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_slugs(apps, schema_editor):
+    Category = apps.get_model("ecommerce", "Category")
+    taken = set()
+    for category in Category.objects.order_by("id"):
+        base = slugify(category.choice) or "category"
+        slug, n = base, 1
+        while slug in taken:
+            n += 1
+            slug = f"{base}-{n}"
+        taken.add(slug)
+        category.slug = slug
+        category.save(update_fields=["slug"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0018_task_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="slug",
+            field=models.SlugField(blank=True, max_length=120, null=True),
+        ),
+        migrations.RunPython(backfill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="category",
+            name="slug",
+            field=models.SlugField(blank=True, max_length=120, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "product_price"],
+                name="ecommerce_p_categor_43a3af_idx",
+            ),
+        ),
+    ]
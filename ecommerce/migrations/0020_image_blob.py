@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:48
+
+import django.db.models.deletion
+import ecommerce.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0019_category_slug"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                ("name", models.CharField(max_length=255)),
+                ("size", models.PositiveBigIntegerField()),
+                ("width", models.PositiveIntegerField(blank=True, null=True)),
+                ("height", models.PositiveIntegerField(blank=True, null=True)),
+                ("format", models.CharField(blank=True, max_length=16)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="product_photo",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=ecommerce.storage.product_photo_storage,
+                upload_to="products/",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="photo_blob",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="products",
+                to="ecommerce.imageblob",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0020_image_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="token_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
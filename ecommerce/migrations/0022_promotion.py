@@ -0,0 +1,73 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0021_customer_token_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Promotion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("percent", "Percentage off"),
+                            ("flat", "Flat amount off"),
+                            ("bxgy", "Buy X get Y free"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "code",
+                    models.CharField(
+                        blank=True,
+                        db_index=True,
+                        help_text="Coupon code; leave blank to apply automatically.",
+                        max_length=32,
+                    ),
+                ),
+                (
+                    "value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                ("buy_quantity", models.PositiveIntegerField(default=0)),
+                ("get_quantity", models.PositiveIntegerField(default=0)),
+                (
+                    "min_subtotal",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                ("starts_at", models.DateTimeField(blank=True, null=True)),
+                ("ends_at", models.DateTimeField(blank=True, null=True)),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "categories",
+                    models.ManyToManyField(
+                        blank=True, related_name="promotions", to="ecommerce.category"
+                    ),
+                ),
+                (
+                    "products",
+                    models.ManyToManyField(
+                        blank=True, related_name="promotions", to="ecommerce.product"
+                    ),
+                ),
+            ],
+        ),
+    ]
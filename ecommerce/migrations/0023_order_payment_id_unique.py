@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:22
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def clear_duplicate_payment_ids(apps, schema_editor):
+    """Keep each payment_id on its oldest order so the unique index builds.
+
+    Blank ids become null; later orders sharing an id (double-submitted
+    checkouts) lose it.
+    """
+    Order = apps.get_model("ecommerce", "Order")
+    Order.objects.filter(payment_id="").update(payment_id=None)
+    duplicated = (
+        Order.objects.exclude(payment_id=None)
+        .values("payment_id")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("payment_id", flat=True)
+    )
+    for payment_id in list(duplicated):
+        ids = Order.objects.filter(payment_id=payment_id).order_by("id")
+        Order.objects.filter(pk__in=list(ids.values_list("id", flat=True)[1:])).update(
+            payment_id=None
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0022_promotion"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_payment_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="order",
+            name="payment_id",
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0023_order_payment_id_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="discount",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
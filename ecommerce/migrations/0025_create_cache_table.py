@@ -0,0 +1,22 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The default cache is a DatabaseCache when REDIS_URL is unset; existing
+    # deploys only run migrate, so the table is created here. It is a no-op
+    # for other cache backends and when the table already exists.
+    call_command(
+        "createcachetable", database=schema_editor.connection.alias, verbosity=0
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecommerce", "0024_orderitem_discount"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,19 @@
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
+
+from ecommerce.storage import product_photo_storage
 
 
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    
+
     address = models.TextField(blank=True, null=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
+    # Bumped to revoke the user's API tokens (ecommerce.authentication).
+    token_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.user.username
@@ -14,26 +21,136 @@ class Customer(models.Model):
 
 class Category(models.Model):
     choice = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=120, unique=True, blank=True)
 
     def __str__(self):
         return self.choice
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = slugify(self.choice) or "category"
+            if Category.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
+                self.slug = f"{self.slug}-{get_random_string(6).lower()}"
+        super().save(*args, **kwargs)
+
+
+class ImageBlob(models.Model):
+    """One stored image file, shared by every product that uses it."""
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    format = models.CharField(max_length=16, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
 
 class Product(models.Model):
-    product_name = models.CharField(max_length=255)
+    product_name = models.CharField(max_length=255, db_index=True)
     product_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.CharField(max_length=50)
-    product_photo = models.ImageField(upload_to="products/", blank=True, null=True)
+    product_photo = models.ImageField(
+        upload_to="products/", storage=product_photo_storage, blank=True, null=True
+    )
+    # Set on save from the content-addressed photo name (ecommerce.utils.images).
+    photo_blob = models.ForeignKey(
+        ImageBlob,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name="products",
+    )
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    # Denormalized from Review, kept up to date by ecommerce.signals
+    review_count = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(default=0)
+    # Units on hand; null means stock is not tracked for this product.
+    # `reserved` counts units held by open checkouts (see StockReservation).
+    stock = models.PositiveIntegerField(blank=True, null=True)
+    reserved = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.product_name
 
+    def save(self, *args, **kwargs):
+        from ecommerce.utils import images  # images imports this module
+
+        photo = self.product_photo
+        if photo and not photo._committed:
+            # Normally done in pre_save; done here so the stored name (and
+            # so the blob) is known before the row is written.
+            photo.save(photo.name, photo.file, save=False)
+        images.link_blob(self)
+        super().save(*args, **kwargs)
+
     class Meta:
         indexes = [
             models.Index(fields=["product_price"]),
+            models.Index(fields=["category", "product_price"]),
         ]
 
+
+class Promotion(models.Model):
+    """A discount rule, compiled and applied by ecommerce.utils.promotions.
+
+    Rules scoped to products and/or categories discount the matching cart
+    lines (each line gets its best rule). Percentage and flat rules with no
+    scope discount the whole order instead; a buy-X-get-Y rule with no scope
+    applies to every line.
+    """
+
+    PERCENT = "percent"
+    FLAT = "flat"
+    BUY_X_GET_Y = "bxgy"
+    KIND_CHOICES = [
+        (PERCENT, "Percentage off"),
+        (FLAT, "Flat amount off"),
+        (BUY_X_GET_Y, "Buy X get Y free"),
+    ]
+
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    code = models.CharField(
+        max_length=32,
+        blank=True,
+        db_index=True,
+        help_text="Coupon code; leave blank to apply automatically.",
+    )
+    # Percent for PERCENT; rupees off the order, or off each unit when
+    # scoped, for FLAT.
+    value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    buy_quantity = models.PositiveIntegerField(default=0)
+    get_quantity = models.PositiveIntegerField(default=0)
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    products = models.ManyToManyField(Product, blank=True, related_name="promotions")
+    categories = models.ManyToManyField(Category, blank=True, related_name="promotions")
+    starts_at = models.DateTimeField(blank=True, null=True)
+    ends_at = models.DateTimeField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.kind == self.PERCENT and not 0 < self.value <= 100:
+            raise ValidationError({"value": "Enter a percentage between 0 and 100."})
+        if self.kind == self.FLAT and self.value <= 0:
+            raise ValidationError({"value": "Enter an amount greater than 0."})
+        if self.kind == self.BUY_X_GET_Y and not (
+            self.buy_quantity and self.get_quantity
+        ):
+            raise ValidationError("Buy X get Y needs both quantities.")
+
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+
 class Saved(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="saved_by"
@@ -67,6 +184,7 @@ class Review(models.Model):
         unique_together = ("product", "user")
         indexes = [
             models.Index(fields=["product", "user"]),
+            models.Index(fields=["product", "-created_at", "-id"]),
         ]
         ordering = ["-created_at"]
 
@@ -84,14 +202,40 @@ class Order(models.Model):
     ]
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
-    payment_id = models.CharField(max_length=255, blank=True, null=True)
+    payment_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
- 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+
+class OrderStatusEvent(models.Model):
+    """Audit row written for every status change (ecommerce.utils.fulfilment)."""
+
+    order = models.ForeignKey(
+        Order, related_name="status_events", on_delete=models.CASCADE
+    )
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(
+        User, blank=True, null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["order", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
 
 
 class OrderItem(models.Model):
@@ -99,6 +243,122 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Promotions taken off this line, including its share of order-level
+    # discounts: the line was charged quantity * price - discount.
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     def __str__(self):
         return f"{self.product.product_name} x {self.quantity}"
+
+
+class ProductRelation(models.Model):
+    """Top-K "frequently bought together" neighbours, built from OrderItem."""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="relations"
+    )
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    score = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("product", "related")
+        indexes = [
+            models.Index(fields=["product", "-score"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+
+
+class DailyProductSales(models.Model):
+    """Per-day sales rollup, maintained by the build_sales_rollups command."""
+
+    date = models.DateField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "product")
+        ordering = ["-date"]
+        verbose_name_plural = "daily product sales"
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}"
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "category")
+        ordering = ["-date"]
+        verbose_name_plural = "daily category sales"
+
+    def __str__(self):
+        return f"{self.date} {self.category_id}"
+
+
+class RollupWatermark(models.Model):
+    """Highest Order id already folded into a rollup."""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_order_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_order_id}"
+
+
+class StockReservation(models.Model):
+    """Units held for one checkout until it is paid for or expires."""
+
+    token = models.CharField(max_length=64, db_index=True)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity} ({self.token})"
+
+
+class Task(models.Model):
+    """A queued background job, run by `manage.py run_worker`."""
+
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
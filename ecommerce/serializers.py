@@ -1,6 +1,5 @@
 # serializers.py
 from django.contrib.auth.models import User
-from django.db.models import Avg
 from rest_framework import serializers
 
 from .models import Category, Order, OrderItem, Product, Review, Saved
@@ -39,16 +38,15 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
 
     def get_avg_rating(self, obj):
-        avg = obj.reviews.aggregate(Avg("rating"))["rating__avg"]
-        return round(avg, 1) if avg else 0
+        return obj.avg_rating
 
     def get_review_count(self, obj):
-        return obj.reviews.count()
+        return obj.review_count
 
     def get_is_saved(self, obj):
         request = self.context.get("request")
         if request and request.user.is_authenticated:
-            return Saved.objects.filter(user=request.user, product=obj).exists()
+            return Saved.objects.filter(user_id=request.user.id, product=obj).exists()
         return False
 
 
@@ -0,0 +1,161 @@
+"""Static and media file serving for SERVE_STATIC_FILES mode (see myshop/urls.py).
+
+Unlike django.views.static.serve this is meant for production: it serves
+precompressed variants, answers conditional and Range requests, and marks
+fingerprinted files (and uploaded media, whose names are never reused) as
+immutable for a year.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=3600"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def _choose_variant(request, path):
+    """(path, stat, content_encoding) for the best precompressed variant."""
+    accepted = request.headers.get("Accept-Encoding", "")
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted:
+            st = _stat(path + suffix)
+            if st is not None:
+                return path + suffix, st, encoding
+    return path, _stat(path), None
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive, None to ignore the header, or False if unsatisfiable.
+
+    Only single ranges are supported; anything else is served in full.
+    """
+    match = RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, path, document_root, immutable=None):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if _stat(fullpath) is None:
+        raise Http404
+
+    range_header = request.headers.get("Range")
+    if range_header:
+        # Byte ranges always refer to the identity encoding.
+        filepath, st, encoding = fullpath, _stat(fullpath), None
+    else:
+        filepath, st, encoding = _choose_variant(request, fullpath)
+
+    etag = quote_etag(f"{st.st_size:x}-{st.st_mtime_ns:x}{encoding or ''}")
+    last_modified = int(st.st_mtime)
+    if immutable is None:
+        immutable = bool(HASHED_NAME.search(path))
+    compressible = any(_stat(fullpath + suffix) is not None for _, suffix in ENCODINGS)
+
+    def finish(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+        response["Accept-Ranges"] = "bytes"
+        if compressible:
+            response["Vary"] = "Accept-Encoding"
+        return response
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if conditional is not None:
+        return finish(conditional)
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    byte_range = None
+    if range_header and _if_range_matches(request, etag, last_modified):
+        byte_range = _parse_range(range_header, st.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{st.st_size}"
+        return finish(response)
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        body = () if request.method == "HEAD" else _read_range(filepath, start, length)
+        response = StreamingHttpResponse(body, status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        response["Content-Length"] = str(length)
+        return finish(response)
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+        response["Content-Length"] = str(st.st_size)
+    else:
+        response = FileResponse(
+            open(filepath, "rb"),
+            content_type=content_type,
+            filename=os.path.basename(fullpath),
+        )
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return finish(response)
+
+
+def _if_range_matches(request, etag, last_modified):
+    """A stale If-Range means the client's partial copy is outdated: send it all."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
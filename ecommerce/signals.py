@@ -0,0 +1,78 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from ecommerce import tasks
+from ecommerce.authentication import revoke_tokens
+from ecommerce.models import Category, Product, Promotion, Review
+from ecommerce.utils import catalog_snapshot, prerender, promotions
+from ecommerce.utils.catalog import bump_catalog_version
+from ecommerce.utils.quick_view import invalidate_quick_views
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, **kwargs):
+    tasks.refresh_rating_summary.delay(instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    invalidate_quick_views([instance.pk])
+    bump_catalog_version()
+    catalog_snapshot.schedule_refresh()
+    prerender.schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_changed(sender, instance, created, **kwargs):
+    product_ids = []
+    if not created:
+        product_ids = list(instance.product_set.values_list("pk", flat=True))
+        invalidate_quick_views(product_ids)
+    bump_catalog_version()
+    catalog_snapshot.schedule_refresh()
+    prerender.schedule_refresh(product_ids)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
+    catalog_snapshot.schedule_refresh()
+    prerender.schedule_refresh()
+
+
+@receiver([post_save, post_delete], sender=Promotion)
+@receiver(m2m_changed, sender=Promotion.products.through)
+@receiver(m2m_changed, sender=Promotion.categories.through)
+def promotion_changed(sender, **kwargs):
+    promotions.bump_promotions_version()
+
+
+# User fields that API tokens depend on; changing any of them revokes them.
+TOKEN_FIELDS = ("password", "is_active", "is_staff")
+
+
+@receiver(pre_save, sender=User)
+def remember_token_fields(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(TOKEN_FIELDS):
+        return  # e.g. the last_login update on every login
+    instance._token_fields = (
+        User.objects.filter(pk=instance.pk).values_list(*TOKEN_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    before = instance.__dict__.pop("_token_fields", None)
+    after = tuple(getattr(instance, field) for field in TOKEN_FIELDS)
+    if before is not None and before != after:
+        revoke_tokens(instance)
+
+
+@receiver(user_logged_out)
+def user_logged_out_everywhere(sender, request, user, **kwargs):
+    if user is not None:
+        revoke_tokens(user)
@@ -0,0 +1,11 @@
+/* Generated by `manage.py build_assets` from ecommerce/assets: js/auth.js */
+
+// ----- Show / hide password -----
+// <button data-toggle-password="<input id>"> on the login and register forms.
+document.querySelectorAll('[data-toggle-password]').forEach(button => {
+    button.addEventListener('click', () => {
+        const input = document.getElementById(button.dataset.togglePassword);
+        input.type = input.type === 'password' ? 'text' : 'password';
+        button.textContent = input.type === 'password' ? '👁️' : '🙈';
+    });
+});
@@ -0,0 +1,29 @@
+/* Generated by `manage.py build_assets` from ecommerce/assets: js/cart.js */
+
+// ----- Cart page: keep line and cart totals in step with the stepper -----
+document.addEventListener('cart:changed', e => {
+    const {productId, data} = e.detail;
+    if (data.status !== 'success') return;
+    const itemTotal = document.getElementById('item-total-' + productId);
+    if (itemTotal) itemTotal.innerText = '₹' + Number(data.item_total).toFixed(2);
+
+    // With promotions active the server sends the discounted totals; order
+    // discounts can't be worked out by adding up the lines.
+    let cartTotal = data.cart_total;
+    if (cartTotal === undefined) {
+        cartTotal = 0;
+        document.querySelectorAll('.item-total').forEach(el => {
+            cartTotal += parseFloat(el.innerText.replace('₹', '').trim());
+        });
+    }
+    const total = document.getElementById('cart-total');
+    if (total) total.innerText = '₹' + cartTotal.toFixed(2);
+    const subtotal = document.getElementById('cart-subtotal');
+    if (subtotal && data.cart_subtotal !== undefined) {
+        subtotal.innerText = '₹' + data.cart_subtotal.toFixed(2);
+    }
+    const discount = document.getElementById('cart-discount');
+    if (discount && data.cart_discount !== undefined) {
+        discount.innerText = '−₹' + data.cart_discount.toFixed(2);
+    }
+});
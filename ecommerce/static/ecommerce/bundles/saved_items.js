@@ -0,0 +1,47 @@
+/* Generated by `manage.py build_assets` from ecommerce/assets: js/saved_items.js */
+
+// ----- Saved items: add to cart in place -----
+document.querySelectorAll('.saved-add-form').forEach(form => {
+    form.addEventListener('submit', function(e) {
+        e.preventDefault();
+        postJSON(this.action)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'success') {
+                updateCartIconCount(data.cart_total_items);
+                Swal.fire({
+                    toast: true,
+                    position: 'top-end',
+                    icon: 'success',
+                    title: data.message,
+                    showConfirmButton: false,
+                    timer: 2000
+                });
+            } else {
+                Swal.fire('Error', data.message, 'error');
+            }
+        });
+    });
+});
+
+// ----- Remove saved item -----
+document.querySelectorAll('.remove-btn').forEach(btn => {
+    btn.addEventListener('click', function() {
+        postJSON(shopUrl('removeSaved', this.dataset.id))
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'removed') {
+                Swal.fire({
+                    toast: true,
+                    position: 'top-end',
+                    icon: 'success',
+                    title: data.message,
+                    showConfirmButton: false,
+                    timer: 2000,
+                    timerProgressBar: true
+                });
+                this.closest('.saved-card').remove();
+            }
+        });
+    });
+});
@@ -0,0 +1,251 @@
+/* Generated by `manage.py build_assets` from ecommerce/assets: js/core.js, js/cart_controls.js, js/quick_view.js */
+
+// ----- Page config -----
+// URLs are rendered by base.html as data-*-url attributes on <body>. Per-product
+// endpoints are rendered for product id 0 and filled in by shopUrl().
+function shopUrl(name, productId) {
+    const url = document.body.dataset[name + 'Url'];
+    return productId === undefined ? url : url.replace(/\/0\/$/, `/${productId}/`);
+}
+
+// ----- CSRF -----
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie) {
+        document.cookie.split(';').forEach(cookie => {
+            cookie = cookie.trim();
+            if (cookie.startsWith(name + '=')) cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+        });
+    }
+    return cookieValue;
+}
+
+function postJSON(url) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {'X-CSRFToken': getCookie('csrftoken'), 'X-Requested-With': 'XMLHttpRequest'},
+    });
+}
+
+// ----- Toast Helper -----
+function showToast(message, type='primary') {
+    const toastContainer = document.getElementById('toast-container');
+    if (!toastContainer) return;
+
+    const bgClass = {
+        'success': 'text-bg-success',
+        'info': 'text-bg-info',
+        'warning': 'text-bg-warning',
+        'error': 'text-bg-danger',
+        'danger': 'text-bg-danger',
+    }[type] || 'text-bg-primary';
+
+    const icon = {
+        'success': '✅',
+        'info': 'ℹ️',
+        'warning': '⚠️',
+        'error': '❌',
+        'danger': '❌',
+    }[type] || '';
+
+    const tempDiv = document.createElement('div');
+    tempDiv.innerHTML = `
+    <div class="toast ${bgClass} border-0" role="alert" data-bs-delay="2500" aria-live="polite" aria-atomic="true">
+      <div class="d-flex">
+        <div class="toast-body">${icon} ${message}</div>
+        <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast" aria-label="Close"></button>
+      </div>
+    </div>`;
+    const toastEl = tempDiv.firstElementChild;
+    toastContainer.appendChild(toastEl);
+
+    const bsToast = new bootstrap.Toast(toastEl);
+    bsToast.show();
+    toastEl.addEventListener('hidden.bs.toast', () => toastEl.remove());
+}
+
+// ----- Cart Icon -----
+function updateCartIconCount(count) {
+    const cartCount = document.getElementById('cart-count');
+    if (cartCount && count !== undefined) {
+        const numCount = Number(count);
+        cartCount.textContent = numCount;
+        cartCount.style.display = numCount > 0 ? 'inline' : 'none';
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    fetch(shopUrl('cartCount'))
+        .then(res => res.json())
+        .then(data => updateCartIconCount(data.cart_count))
+        .catch(() => console.error('Error fetching cart count'));
+});
+
+// ----- Add to Cart / Quantity Stepper -----
+// Cards render #add-btn-<id>, #stepper-<id> and #qty-<id> (a span, or a
+// read-only input on the product page); #decrease-<id> is optional. The cart
+// page has only #qty-<id>, which then just shows the new quantity.
+function setQty(productId, quantity) {
+    const qty = document.getElementById('qty-' + productId);
+    if (!qty) return;
+    if (qty.tagName === 'INPUT') qty.value = quantity;
+    else qty.textContent = quantity;
+}
+
+function showStepper(productId, quantity) {
+    const addBtn = document.getElementById('add-btn-' + productId);
+    const stepper = document.getElementById('stepper-' + productId);
+    const decrease = document.getElementById('decrease-' + productId);
+    if (quantity > 0 || !addBtn) {
+        setQty(productId, quantity);
+        if (addBtn) addBtn.classList.add('d-none');
+        if (stepper) stepper.classList.remove('d-none');
+        if (decrease) decrease.disabled = quantity <= 1;
+    } else {
+        setQty(productId, 1);
+        if (stepper) stepper.classList.add('d-none');
+        addBtn.classList.remove('d-none');
+    }
+}
+
+// Pages with their own totals (the cart) listen for this.
+function cartChanged(productId, data) {
+    updateCartIconCount(data.cart_count ?? data.cart_total_items);
+    document.dispatchEvent(new CustomEvent('cart:changed', {detail: {productId, data}}));
+}
+
+function addToCart(productId) {
+    postJSON(shopUrl('increase', productId))
+    .then(res => res.json())
+    .then(data => {
+        if (data.status === 'success') {
+            showStepper(productId, Number(data.quantity));
+            cartChanged(productId, data);
+            showToast(data.messages_html || 'Added to cart!', 'success');
+        } else {
+            showToast(data.message || 'Failed to add to cart', 'error');
+        }
+    })
+    .catch(() => showToast('Error adding to cart', 'error'));
+}
+
+function updateQty(productId, action) {
+    postJSON(shopUrl(action === 'increase' ? 'increase' : 'decrease', productId))
+    .then(res => res.json())
+    .then(data => {
+        if (data.status !== 'success') {
+            showToast(data.message || 'Failed to update quantity.', 'error');
+            return;
+        }
+        const quantity = Number(data.quantity) || 0;
+        showStepper(productId, quantity);
+        cartChanged(productId, data);
+        if (quantity <= 0) showToast('Removed from cart', 'warning');
+        else showToast(data.message || 'Quantity updated', 'info');
+    })
+    .catch(() => showToast('Failed to update quantity.', 'error'));
+}
+
+function buyNow(productId) {
+    postJSON(shopUrl('increase', productId))
+    .then(res => res.json())
+    .then(data => {
+        if (data.status === 'success') {
+            cartChanged(productId, data);
+            showToast('Added to cart', 'success');
+            // Leave the toast up briefly before going to the cart.
+            setTimeout(() => { window.location.href = shopUrl('cart'); }, 500);
+        } else {
+            showToast(data.message || 'Failed to add to cart', 'error');
+        }
+    })
+    .catch(() => showToast('Error adding to cart', 'error'));
+}
+
+// ----- Buy Now forms -----
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.buy-now-form').forEach(form => {
+        form.addEventListener('submit', function(e) {
+            e.preventDefault();
+            postJSON(this.action)
+            .then(res => res.json())
+            .then(data => {
+                if (data.status === 'success') {
+                    const url = new URL(data.redirect_url, window.location.origin);
+                    url.searchParams.set('msg', data.message);
+                    window.location.href = url;
+                } else {
+                    showToast(data.message || 'Failed to buy now', 'error');
+                }
+            })
+            .catch(() => showToast('Failed to buy now', 'error'));
+        });
+    });
+});
+
+// ----- Save / Unsave -----
+function toggleSave(button) {
+    const productId = button.dataset.productId;
+    if (!productId) return;
+    postJSON(shopUrl('save', productId))
+    .then(resp => {
+        if (resp.status === 403) { showToast('Please login to save products', 'warning'); return null; }
+        return resp.json();
+    })
+    .then(data => {
+        if (!data) return;
+        if (data.status === 'added') { button.classList.add('saved'); button.innerHTML = '<i class="bi bi-bookmark-fill"></i>'; showToast(data.message, 'success'); }
+        else if (data.status === 'removed') { button.classList.remove('saved'); button.innerHTML = '<i class="bi bi-bookmark"></i>'; showToast(data.message, 'info'); }
+        else { showToast(data.message || 'Unknown response', 'error'); }
+    })
+    .catch(() => showToast('Failed to toggle saved status', 'error'));
+}
+
+// ----- Quick View -----
+// Fragments for cards that scroll into view are fetched in one batch request.
+const quickViewFragments = {};
+const quickViewRequested = new Set();
+let quickViewPending = [];
+let quickViewTimer = null;
+
+function prefetchQuickViews() {
+    const ids = quickViewPending;
+    quickViewPending = [];
+    quickViewTimer = null;
+    if (!ids.length) return;
+    fetch(`${shopUrl('quickViewBatch')}?ids=${ids.join(',')}`)
+    .then(res => res.json())
+    .then(data => Object.assign(quickViewFragments, data.fragments || {}))
+    .catch(() => ids.forEach(id => quickViewRequested.delete(id)));
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const cards = document.querySelectorAll('.product-item[data-product-id]');
+    if (!cards.length || !('IntersectionObserver' in window)) return;
+    const quickViewObserver = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            const id = entry.target.dataset.productId;
+            if (!entry.isIntersecting || quickViewRequested.has(id)) return;
+            quickViewRequested.add(id);
+            quickViewPending.push(id);
+            quickViewObserver.unobserve(entry.target);
+        });
+        if (quickViewPending.length && !quickViewTimer) {
+            quickViewTimer = setTimeout(prefetchQuickViews, 150);
+        }
+    }, {rootMargin: '200px'});
+    cards.forEach(el => quickViewObserver.observe(el));
+});
+
+function loadQuickViewContent(productId) {
+    const modalBody = document.querySelector('#productQuickViewModal .modal-body');
+    if (quickViewFragments[productId]) {
+        modalBody.innerHTML = quickViewFragments[productId];
+        return;
+    }
+    modalBody.innerHTML = `<div class="text-center py-5"><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div><p class="mt-2">Loading product details...</p></div>`;
+    fetch(shopUrl('quickView', productId))
+    .then(res => res.json())
+    .then(data => { modalBody.innerHTML = data.html || '<p class="text-danger text-center">Failed to load product details.</p>'; })
+    .catch(() => { modalBody.innerHTML = '<p class="text-danger text-center">Error loading product details. Please try again.</p>'; });
+}
@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage, storages
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed static files, plus .gz (and .br) variants written at collectstatic.
+
+    ecommerce.serving.serve picks the variant matching Accept-Encoding, so
+    text assets are compressed once at deploy time instead of per request.
+    """
+
+    manifest_strict = False
+    compress_extensions = (".css", ".js", ".map", ".svg", ".json", ".txt", ".html")
+    compress_min_size = 512
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            # A template referencing a file that was never collected renders
+            # its plain URL (which 404s) rather than failing the whole page.
+            logger.warning("Static file %r is missing from STATIC_ROOT.", name)
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for hashed_name in sorted(hashed_names):
+            if hashed_name.endswith(self.compress_extensions):
+                self.write_compressed(self.path(hashed_name))
+
+    def write_compressed(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < self.compress_min_size:
+            return
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data)
+        for suffix, compressed in variants.items():
+            # Not worth a second file (or the Vary handling) if it barely shrinks.
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each upload under the SHA-256 of its bytes.
+
+    ``upload_to`` only picks the directory: ``products/<original>.jpg`` is
+    saved as ``products/ab/ab12…ef.jpg``. Identical uploads resolve to the
+    same name, so the second one is never written and every product using
+    that picture shares one file (and one ImageBlob row, see
+    ecommerce.utils.images).
+    """
+
+    HASHED_NAME = re.compile(r"(?:^|/)[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$")
+
+    @classmethod
+    def digest_of(cls, name):
+        match = cls.HASHED_NAME.search(name or "")
+        return match.group(1) if match else None
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return "/".join(part for part in (directory, digest[:2], digest + ext) if part)
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content, so "taken" means "already stored".
+        return name
+
+    def _save(self, name, content):
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        name = self.hashed_name(name, hasher.hexdigest())
+        if self.exists(name):
+            return name
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if hasattr(content, "seek"):
+            content.seek(0)
+        # Write aside and rename, so a concurrent identical upload never sees
+        # a partial file (and whichever rename lands last is byte-identical).
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return name
+
+
+def product_photo_storage():
+    return storages["product_photos"]
@@ -0,0 +1,36 @@
+"""Background tasks. Queue with ``.delay(...)``; run with ``manage.py run_worker``."""
+
+from ecommerce.models import OrderItem
+from ecommerce.utils import (
+    catalog_snapshot,
+    prerender,
+    related_products,
+    review_utils,
+)
+from ecommerce.utils.task_queue import task
+
+
+@task
+def refresh_rating_summary(product_id):
+    review_utils.refresh_rating_summary(product_id)
+    prerender.refresh([product_id], listings=False)
+
+
+@task
+def record_order_copurchases(order_id):
+    product_ids = list(
+        OrderItem.objects.filter(order_id=order_id).values_list("product_id", flat=True)
+    )
+    related_products.record_order_copurchases(product_ids)
+    # "Frequently bought together" on these product pages may have changed.
+    prerender.refresh(product_ids, listings=False)
+
+
+@task
+def refresh_catalog_snapshot():
+    catalog_snapshot.refresh()
+
+
+@task
+def refresh_prerendered_pages(product_ids, listings=True):
+    prerender.refresh(product_ids, listings)
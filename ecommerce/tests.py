@@ -0,0 +1,2340 @@
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse, QueryDict
+from django.db import connection, connections, transaction
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, clear_url_caches, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import AuthenticationFailed
+
+from ecommerce import authentication, serving
+from ecommerce.admin import EstimatedCountPaginator
+from ecommerce.authentication import (
+    ClaimsJWTAuthentication,
+    ClaimsUser,
+    ShopTokenObtainPairSerializer,
+    revoke_tokens,
+)
+from ecommerce import urls as ecommerce_urls
+from ecommerce.models import (
+    Category,
+    Customer,
+    DailyCategorySales,
+    DailyProductSales,
+    ImageBlob,
+    Order,
+    OrderItem,
+    OrderStatusEvent,
+    Product,
+    ProductRelation,
+    Promotion,
+    Review,
+    Saved,
+    StockReservation,
+    Task,
+)
+from ecommerce.storage import product_photo_storage
+from ecommerce.utils import (
+    catalog,
+    catalog_snapshot,
+    facets,
+    fulfilment,
+    inventory,
+    metrics,
+    prerender,
+    promotions,
+    query_metrics,
+    quick_view,
+    rate_limit,
+    related_products,
+    review_utils,
+    sales_rollups,
+    saved_utils,
+    search_cache,
+    task_queue,
+)
+from ecommerce.middleware import PerformanceBudgetMiddleware
+from ecommerce.utils.perf_budget import (
+    PerformanceBudgetExceeded,
+    assert_query_budget,
+    fingerprint,
+)
+from ecommerce.views import ProductListView
+
+SMALL = 1
+LARGE = 50
+
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+# Only the views' own queries are counted: the database cache fallback would
+# add its own (set_many is one round trip per key); production uses Redis.
+@override_settings(CACHES=LOCAL_CACHE)
+class QueryCountTests(TestCase):
+    """Every named route must issue the same number of queries for small and
+    large fixtures, both anonymous and logged in."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(choice="Fruits")
+        self.product = self.make_products(1)[0]
+        self.user = User.objects.create_user("shopper", password="secret-pass-123")
+        Customer.objects.create(user=self.user)  # as register does
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.counter = 0
+
+    # fixtures ----------------------------------------------------------------
+
+    def make_products(self, n, category=None):
+        start = Product.objects.count()
+        return Product.objects.bulk_create(
+            [
+                Product(
+                    product_name=f"Product {start + i}",
+                    product_price=Decimal("100.00"),
+                    quantity="500 g",
+                    product_photo="products/test.jpg",
+                    category=category or self.category,
+                    stock=1000,
+                )
+                for i in range(n)
+            ]
+        )
+
+    def make_relations(self, product, size):
+        ProductRelation.objects.bulk_create(
+            [
+                ProductRelation(product=product, related=related, score=size - i)
+                for i, related in enumerate(self.make_products(size))
+            ]
+        )
+
+    def make_users(self, n):
+        self.counter += 1
+        return User.objects.bulk_create(
+            [User(username=f"u{self.counter}_{i}", password="!") for i in range(n)]
+        )
+
+    def set_cart(self, client, products):
+        """Two of each product, and of self.product, which cart routes act on."""
+        session = client.session
+        session["cart"] = {str(p.pk): 2 for p in [self.product, *products]}
+        session.pop("stock_reservation", None)
+        session.save()
+
+    # measuring ---------------------------------------------------------------
+
+    def expect(self, request, status=200, check=None):
+        """A scenario's request, the status it must return and a state check.
+
+        A route that fails early (a redirect, a 404) issues fewer queries, so
+        counts are only compared for requests that did their work.
+        """
+        return request, status, check
+
+    def capture(self, scenario):
+        request, status, check = scenario
+        cache.clear()
+        search_cache.results.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertEqual(response.status_code, status)
+        if check is not None:
+            check(response)
+        return [q["sql"] for q in ctx.captured_queries]
+
+    def assert_constant_queries(self, name, scenario):
+        for authenticated in (False, True):
+            with self.subTest(route=name, authenticated=authenticated):
+                client = self.client_class()
+                client.shop_user = self.user if authenticated else None
+                if authenticated:
+                    client.force_login(self.user)
+                small = self.capture(scenario(client, SMALL))
+                large = self.capture(scenario(client, LARGE))
+                if len(small) != len(large):
+                    self.fail(self.describe_difference(name, small, large))
+
+    def describe_difference(self, name, small, large):
+        small_shapes = Counter(fingerprint(sql) for sql in small)
+        large_shapes = Counter(fingerprint(sql) for sql in large)
+        lines = [
+            f"{name}: {len(small)} queries with {SMALL} rows, "
+            f"{len(large)} with {LARGE} rows. Queries that scale with data:"
+        ]
+        for sql in large:
+            shape = fingerprint(sql)
+            if large_shapes[shape] != small_shapes[shape]:
+                was = small_shapes[shape]
+                lines.append(f"  {large_shapes[shape]}x (was {was}) {sql}")
+                large_shapes[shape] = small_shapes[shape]
+        return "\n".join(lines)
+
+    # scenarios ---------------------------------------------------------------
+    # Each scenario(client, size) grows the relevant data to `size` rows and
+    # returns self.expect(request, status, check), where request is a
+    # zero-argument callable returning the response. client.shop_user is the
+    # logged-in user, or None for the anonymous pass.
+
+    def scenario_index(self, client, size):
+        category = Category.objects.create(choice=f"Category {self.counter}-{size}")
+        self.counter += 1
+        self.make_products(size, category)
+        return self.expect(
+            lambda: client.get(reverse("index")),
+            check=lambda response: self.assertContains(response, category.choice),
+        )
+
+    def scenario_detail(self, client, size):
+        products = self.make_products(size)
+        Saved.objects.bulk_create(
+            [Saved(user=self.user, product=p) for p in products], ignore_conflicts=True
+        )
+        return self.expect(
+            lambda: client.get(
+                reverse("detail"),
+                {
+                    "search": "product",
+                    "sort_by": "price_asc",
+                    "category": ["fruits", "vegetables"],
+                    "price": ["100-250"],
+                },
+            ),
+            check=lambda response: self.assertTrue(response.context["products"]),
+        )
+
+    def scenario_product_detail(self, client, size):
+        product = self.make_products(1)[0]
+        Review.objects.bulk_create(
+            [Review(product=product, user=u, rating=4) for u in self.make_users(size)]
+        )
+        self.make_relations(product, size)
+
+        def check(response):
+            self.assertEqual(response.context["object"], product)
+            self.assertEqual(
+                len(response.context["related_products"]),
+                min(size, settings.RELATED_PRODUCTS_TOP_K),
+            )
+
+        return self.expect(
+            lambda: client.get(reverse("product_detail", args=[product.pk])), 200, check
+        )
+
+    def scenario_product_reviews(self, client, size):
+        product = self.make_products(1)[0]
+        Review.objects.bulk_create(
+            [Review(product=product, user=u, rating=4) for u in self.make_users(size)]
+        )
+
+        def check(response):
+            more = size > settings.REVIEWS_PAGE_SIZE
+            self.assertEqual(response.json()["next_cursor"] is not None, more)
+
+        return self.expect(
+            lambda: client.get(reverse("product_reviews", args=[product.pk])),
+            200,
+            check,
+        )
+
+    def scenario_related_products(self, client, size):
+        product = self.make_products(1)[0]
+        self.make_relations(product, size)
+        return self.expect(
+            lambda: client.get(reverse("related_products", args=[product.pk])),
+            check=lambda response: self.assertEqual(
+                len(response.json()["products"]),
+                min(size, settings.RELATED_PRODUCTS_TOP_K),
+            ),
+        )
+
+    def scenario_quick_view_product(self, client, size):
+        self.make_products(size)
+        return self.expect(
+            lambda: client.get(reverse("quick_view_product", args=[self.product.pk])),
+            check=lambda response: self.assertIn(
+                self.product.product_name, response.json()["html"]
+            ),
+        )
+
+    def scenario_quick_view_batch(self, client, size):
+        ids = ",".join(str(p.pk) for p in self.make_products(size))
+        return self.expect(
+            lambda: client.get(reverse("quick_view_batch"), {"ids": ids}),
+            check=lambda response: self.assertEqual(
+                len(response.json()["fragments"]),
+                min(size, settings.QUICK_VIEW_BATCH_LIMIT),
+            ),
+        )
+
+    def scenario_login(self, client, size):
+        self.make_users(size)
+        return self.expect(
+            lambda: client.post(
+                reverse("login"), {"username": "nobody", "password": "wrong-password"}
+            ),
+            check=lambda response: self.assertContains(
+                response, "invalid username or password"
+            ),
+        )
+
+    def scenario_logout(self, client, size):
+        if client.shop_user:
+            client.force_login(client.shop_user)
+        return self.expect(
+            lambda: client.post(reverse("logout")),
+            302,
+            lambda response: self.assertFalse(
+                response.wsgi_request.user.is_authenticated
+            ),
+        )
+
+    def scenario_register(self, client, size):
+        self.make_users(size)
+        return self.expect(lambda: client.get(reverse("register")))
+
+    def cart_scenario(self, name, method, status, quantity):
+        """self.product starts at 2 and must end up at `quantity` (None: gone)."""
+
+        def scenario(client, size):
+            self.set_cart(client, self.make_products(size))
+
+            def check(response):
+                cart = client.session["cart"]
+                self.assertEqual(cart.get(str(self.product.pk)), quantity)
+                self.assertEqual(len(cart), size + 1 if quantity else size)
+
+            def request():
+                if method == "get":
+                    return client.get(reverse(name))
+                return client.post(reverse(name, args=[self.product.pk]))
+
+            return self.expect(request, status, check)
+
+        return scenario
+
+    def scenario_create_checkout_session(self, client, size):
+        self.set_cart(client, self.make_products(size))
+        session = mock.Mock(id="cs_x", url="https://checkout.stripe.test/session")
+        patcher = mock.patch(
+            "ecommerce.views.stripe.checkout.Session.create", return_value=session
+        )
+
+        def request():
+            with patcher:
+                return client.post(reverse("create_checkout_session"))
+
+        def check(response):
+            if client.shop_user:
+                self.assertEqual(response["Location"], session.url)
+                self.assertIn("stock_reservation", client.session)
+            else:
+                self.assertEqual(response["Location"], reverse("login"))
+
+        return self.expect(request, 302, check)
+
+    def scenario_apply_coupon(self, client, size):
+        self.counter += 1
+        Promotion.objects.bulk_create(
+            [
+                Promotion(
+                    name=f"Coupon {i}",
+                    kind=Promotion.PERCENT,
+                    value=Decimal("10"),
+                    code=f"SAVE{self.counter}X{i}",
+                )
+                for i in range(size)
+            ]
+        )
+        code = f"SAVE{self.counter}X0"
+        return self.expect(
+            lambda: client.post(reverse("apply_coupon"), {"code": code}),
+            302,
+            lambda response: self.assertEqual(client.session["coupon"], code),
+        )
+
+    def scenario_payment_success(self, client, size):
+        # at least two products so co-purchases are always recorded
+        self.set_cart(client, self.make_products(size + 1))
+        self.counter += 1
+        session_id = f"cs_{self.counter}"
+        created = mock.Mock(id=session_id, url="https://checkout.stripe.test/session")
+        with mock.patch(
+            "ecommerce.views.stripe.checkout.Session.create", return_value=created
+        ):
+            client.post(reverse("create_checkout_session"))
+        orders = Order.objects.count()
+        total = Decimal(client.session.get("checkout", {}).get("total", 0))
+        paid = mock.Mock(
+            id=session_id, payment_status="paid", amount_total=int(total * 100)
+        )
+
+        def request():
+            with mock.patch(
+                "ecommerce.views.stripe.checkout.Session.retrieve", return_value=paid
+            ):
+                return client.get(
+                    reverse("payment_success"), {"session_id": session_id}
+                )
+
+        def check(response):
+            placed = 1 if client.shop_user else 0
+            self.assertEqual(Order.objects.count(), orders + placed)
+            self.assertEqual(not client.session["cart"], bool(placed))
+
+        return self.expect(request, 200 if client.shop_user else 302, check)
+
+    def scenario_payment_cancel(self, client, size):
+        return self.expect(lambda: client.get(reverse("payment_cancel")))
+
+    def scenario_saved_items(self, client, size):
+        Saved.objects.bulk_create(
+            [Saved(user=self.user, product=p) for p in self.make_products(size)]
+        )
+        if not client.shop_user:
+            return self.expect(lambda: client.get(reverse("saved_items")), 302)
+        return self.expect(
+            lambda: client.get(reverse("saved_items")),
+            check=lambda response: self.assertGreaterEqual(
+                len(response.context["saved_products"]),
+                min(size, settings.SAVED_ITEMS_PAGE_SIZE),
+            ),
+        )
+
+    def scenario_save_product(self, client, size):
+        Saved.objects.bulk_create(
+            [Saved(user=self.user, product=p) for p in self.make_products(size)]
+        )
+        Saved.objects.filter(product=self.product).delete()
+        return self.expect(
+            lambda: client.post(reverse("save_product", args=[self.product.pk])),
+            200 if client.shop_user else 403,
+            lambda response: self.assertEqual(
+                Saved.objects.filter(product=self.product).exists(),
+                bool(client.shop_user),
+            ),
+        )
+
+    def scenario_save_products_bulk(self, client, size):
+        products = self.make_products(size)
+        ids = ",".join(str(p.pk) for p in products)
+        return self.expect(
+            lambda: client.post(
+                reverse("save_products_bulk"), {"action": "save", "product_ids": ids}
+            ),
+            200 if client.shop_user else 403,
+            lambda response: self.assertEqual(
+                Saved.objects.filter(product__in=products).count(),
+                size if client.shop_user else 0,
+            ),
+        )
+
+    def scenario_remove_saved(self, client, size):
+        Saved.objects.bulk_create(
+            [Saved(user=self.user, product=p) for p in self.make_products(size)]
+        )
+        Saved.objects.get_or_create(user=self.user, product=self.product)
+        return self.expect(
+            lambda: client.post(reverse("remove_saved", args=[self.product.pk])),
+            200 if client.shop_user else 403,
+            lambda response: self.assertEqual(
+                Saved.objects.filter(product=self.product).exists(),
+                not client.shop_user,
+            ),
+        )
+
+    def scenario_order_history(self, client, size):
+        products = self.make_products(3)
+        orders = Order.objects.bulk_create(
+            [Order(user=self.user, total_amount=300) for _ in range(size * 2)]
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=p, quantity=1, price=p.product_price)
+                for order in orders
+                for p in products
+            ]
+        )
+        if not client.shop_user:
+            return self.expect(lambda: client.get(reverse("order_history")), 302)
+        return self.expect(
+            lambda: client.get(reverse("order_history")),
+            check=lambda response: self.assertGreaterEqual(
+                len(response.context["orders"]), size * 2
+            ),
+        )
+
+    def scenario_metrics(self, client, size):
+        client.force_login(self.staff)
+        return self.expect(
+            lambda: client.get(reverse("metrics")),
+            check=lambda response: self.assertContains(response, "# TYPE"),
+        )
+
+    def scenario_token_obtain_pair(self, client, size):
+        self.make_users(size)
+        return self.expect(
+            lambda: client.post(
+                reverse("token_obtain_pair"),
+                {"username": "shopper", "password": "secret-pass-123"},
+                content_type="application/json",
+            ),
+            check=lambda response: self.assertIn("access", response.json()),
+        )
+
+    def scenario_token_refresh(self, client, size):
+        self.make_users(size)
+        refresh = ShopTokenObtainPairSerializer.get_token(self.user)
+        return self.expect(
+            lambda: client.post(
+                reverse("token_refresh"),
+                {"refresh": str(refresh)},
+                content_type="application/json",
+            ),
+            check=lambda response: self.assertIn("access", response.json()),
+        )
+
+    def get_scenario(self, name):
+        # route: (method, status, quantity of self.product afterwards)
+        cart_routes = {
+            "add_to_cart": ("post", 200, 3),
+            "remove_from_cart": ("post", 302, None),
+            "increase_quantity": ("post", 200, 3),
+            "decrease_quantity": ("post", 200, 1),
+            "view_cart": ("get", 200, 2),
+            "cart_count": ("get", 200, 2),
+        }
+        if name in cart_routes:
+            return self.cart_scenario(name, *cart_routes[name])
+        return getattr(self, f"scenario_{name}", None)
+
+    # tests -------------------------------------------------------------------
+
+    def route_names(self):
+        return [
+            pattern.name
+            for pattern in ecommerce_urls.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        ]
+
+    def test_every_route_has_a_scenario(self):
+        missing = [name for name in self.route_names() if not self.get_scenario(name)]
+        self.assertEqual(missing, [], "add a query-count scenario for these routes")
+
+    def test_query_count_does_not_scale_with_data(self):
+        for name in self.route_names():
+            scenario = self.get_scenario(name)
+            if scenario is not None:
+                self.assert_constant_queries(name, scenario)
+
+
+class StockReservationTests(TransactionTestCase):
+    """Checkouts racing for the last units must never oversell."""
+
+    THREADS = 8
+
+    def setUp(self):
+        category = Category.objects.create(choice="Fruits")
+        self.product = Product.objects.create(
+            product_name="Mango",
+            product_price=Decimal("100.00"),
+            quantity="1 kg",
+            product_photo="products/test.jpg",
+            category=category,
+            stock=5,
+        )
+        self.cart = {str(self.product.pk): 2}
+
+    def run_concurrently(self, func):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest(
+                "in-memory SQLite raises 'table is locked' instead of waiting"
+            )
+        options = connection.settings_dict["OPTIONS"]
+        if connection.vendor == "sqlite" and options.get("transaction_mode") != (
+            "IMMEDIATE"
+        ):
+            self.skipTest("SQLite only queues writers in IMMEDIATE transaction mode")
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                results.append(func())
+            except inventory.OutOfStock:
+                results.append(None)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.THREADS)
+        return [result for result in results if result]
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        tokens = self.run_concurrently(lambda: inventory.reserve(self.cart))
+        self.assertEqual(len(tokens), 2)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (5, 4))
+        self.assertEqual(StockReservation.objects.count(), 2)
+
+    def test_concurrent_commits_do_not_oversell(self):
+        def checkout():
+            with transaction.atomic():
+                inventory.commit(self.cart)
+            return True
+
+        self.assertEqual(len(self.run_concurrently(checkout)), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_commit_consumes_own_reservation(self):
+        token = inventory.reserve(self.cart)
+        inventory.reserve({str(self.product.pk): 3})
+        with transaction.atomic():
+            inventory.commit(self.cart, token)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (3, 3))
+        with self.assertRaises(inventory.OutOfStock):
+            inventory.reserve({str(self.product.pk): 1})
+
+    def test_release_expired(self):
+        inventory.reserve(self.cart)
+        inventory.reserve(self.cart)
+        later = timezone.now() + timedelta(seconds=inventory._ttl() + 1)
+        self.assertEqual(inventory.release_expired(now=later), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_hold_frees_stock_for_next_checkout(self):
+        abandoned = inventory.reserve({str(self.product.pk): 5})
+        with self.assertRaises(inventory.OutOfStock):
+            inventory.reserve(self.cart)
+        StockReservation.objects.filter(token=abandoned).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        token = inventory.reserve(self.cart)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 2)
+        self.assertEqual(
+            list(StockReservation.objects.values_list("token", flat=True)), [token]
+        )
+
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        inventory.reserve({str(self.product.pk): 5}, token="other")
+        StockReservation.objects.filter(token="other").update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        with transaction.atomic():
+            inventory.commit({str(self.product.pk): 5})
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (0, 0))
+
+
+@override_settings(
+    PERFORMANCE_BUDGETS_ENABLED=True,
+    PERFORMANCE_BUDGET_ACTION="log",
+    N_PLUS_ONE_THRESHOLD=3,
+    PERFORMANCE_BUDGETS={"default": {"queries": 4, "time_ms": 100}},
+)
+class PerformanceBudgetTests(TestCase):
+    def setUp(self):
+        self.ids = [Category.objects.create(choice=f"C{i}").pk for i in range(5)]
+
+    def lookups(self, n):
+        """A response that looks categories up one at a time."""
+
+        def get_response(request):
+            for pk in self.ids[:n]:
+                Category.objects.get(pk=pk)
+            return HttpResponse()
+
+        return get_response
+
+    def problems(self, get_response):
+        middleware = PerformanceBudgetMiddleware(get_response)
+        with mock.patch("ecommerce.middleware.logger") as logger:
+            middleware(RequestFactory().get("/"))
+        return [call.args[0] for call in logger.warning.call_args_list]
+
+    def test_n_plus_one_threshold(self):
+        self.assertEqual(self.problems(self.lookups(2)), [])
+        (problem,) = self.problems(self.lookups(3))
+        self.assertTrue(problem.startswith("unresolved: possible N+1, 3x SELECT"))
+
+    def test_query_and_time_budgets(self):
+        problems = self.problems(self.lookups(5))
+        self.assertEqual(problems[0], "unresolved: 5 queries (budget 4)")
+        self.assertIn("possible N+1, 5x", problems[1])
+
+        with mock.patch("time.perf_counter", side_effect=[10.0, 10.25]):
+            problems = self.problems(self.lookups(0))
+        self.assertEqual(problems, ["unresolved: 250.0ms (budget 100ms)"])
+
+        with override_settings(
+            PERFORMANCE_BUDGETS={"unresolved": {"queries": 5}, "default": {}}
+        ):
+            self.assertEqual(self.problems(self.lookups(2)), [])
+
+    def test_raise_or_log(self):
+        with override_settings(PERFORMANCE_BUDGET_ACTION="raise"):
+            with self.assertRaisesMessage(
+                PerformanceBudgetExceeded, "unresolved: 5 queries (budget 4)"
+            ):
+                PerformanceBudgetMiddleware(self.lookups(5))(RequestFactory().get("/"))
+        with self.assertLogs("ecommerce.perf_budget", "WARNING") as logs:
+            response = PerformanceBudgetMiddleware(self.lookups(5))(
+                RequestFactory().get("/")
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(logs.output), 2)
+        with override_settings(PERFORMANCE_BUDGETS_ENABLED=False):
+            self.assertEqual(self.problems(self.lookups(5)), [])
+
+    def test_assert_query_budget(self):
+        with assert_query_budget(max_queries=2) as collector:
+            self.lookups(2)(None)
+        self.assertEqual(collector.count, 2)
+        with self.assertRaisesMessage(AssertionError, "3 queries, expected at most 2"):
+            with assert_query_budget(max_queries=2):
+                self.lookups(3)(None)
+        with self.assertRaisesMessage(AssertionError, "possible N+1, 3x SELECT"):
+            with assert_query_budget():
+                self.lookups(3)(None)
+        with assert_query_budget(n_plus_one_threshold=4):
+            self.lookups(3)(None)
+
+
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        search_cache.results.clear()
+        self.category = Category.objects.create(choice="Fruits")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    product_name=f"Mango {i}",
+                    product_price=Decimal(100 + i),
+                    quantity="1 kg",
+                    product_photo="products/test.jpg",
+                    category=self.category,
+                )
+                for i in range(5)
+            ]
+        )
+
+    def names(self, response):
+        return [p.product_name for p in response.context["products"]]
+
+    def test_normalized_queries_share_an_entry(self):
+        url = reverse("detail")
+        first = self.client.get(url, {"search": "Mango", "sort_by": "price_desc"})
+        second = self.client.get(url, {"search": "  mango ", "sort_by": "price_desc"})
+        self.assertEqual(self.names(first), self.names(second))
+        self.assertEqual(self.names(first)[0], "Mango 4")
+        self.assertEqual(search_cache.stats()["hits"], 1)
+        self.assertEqual(search_cache.stats()["misses"], 1)
+
+    def test_catalog_change_invalidates(self):
+        url = reverse("detail")
+        self.client.get(url, {"search": "mango"})
+        Product.objects.create(
+            product_name="Mango new",
+            product_price=Decimal("50.00"),
+            quantity="1 kg",
+            product_photo="products/test.jpg",
+            category=self.category,
+        )
+        response = self.client.get(url, {"search": "mango"})
+        self.assertIn("Mango new", self.names(response))
+        self.assertEqual(search_cache.stats()["hits"], 0)
+
+    def test_invalid_filters(self):
+        url = reverse("detail")
+        for params in (
+            {"min_price": "NaN"},
+            {"max_price": "Infinity"},
+            {"min_price": "-inf", "max_price": "abc"},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(len(self.names(self.client.get(url, params))), 5)
+        self.assertEqual(self.names(self.client.get(url, {"category": "bogus"})), [])
+        self.assertEqual(
+            len(self.names(self.client.get(url, {"category": ["bogus", "fruits"]}))),
+            5,
+        )
+
+    def test_lru_eviction_and_expiry(self):
+        lru = search_cache.LRUCache(maxsize=2, ttl=60)
+        lru.set("a", [1])
+        lru.set("b", [2])
+        lru.get("a")
+        lru.set("c", [3])
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), [1])
+        self.assertEqual(lru.stats()["evictions"], 1)
+        with mock.patch.object(search_cache.time, "monotonic", return_value=1e12):
+            self.assertIsNone(lru.get("a"))
+
+    def test_snapshot_matches_database(self):
+        vegetables = Category.objects.create(choice="Vegetables")
+        Product.objects.create(
+            product_name="Carrot",
+            product_price=Decimal("300.00"),
+            quantity="1 kg",
+            category=vegetables,
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog.snapshot")
+            with override_settings(CATALOG_SNAPSHOT_PATH=path):
+                catalog_snapshot.build_snapshot()
+                categories = list(Category.objects.all())
+                view = ProductListView()
+                for params in (
+                    {},
+                    {"sort_by": "price_desc", "search": "MANGO"},
+                    {"sort_by": "name_asc", "category": "vegetables"},
+                    {"price": ["100-250", "250-500"], "max_price": "103"},
+                    {"search": "veg", "sort_by": "newest"},
+                    {"min_price": "NaN", "max_price": "Infinity"},
+                    {"category": "bogus"},
+                    {"category": ["bogus", "vegetables"]},
+                ):
+                    with self.subTest(params=params):
+                        request = RequestFactory().get("/", params)
+                        filters = facets.parse_filters(request.GET, categories)
+                        view.setup(request)
+                        expected = list(
+                            view.get_queryset().values_list("pk", flat=True)
+                        )
+                        self.assertEqual(
+                            catalog_snapshot.query(filters, view.sort_by), expected
+                        )
+
+                # A catalog change makes the mapped snapshot stale until the
+                # replacement file is swapped in.
+                Product.objects.filter(product_name="Carrot").delete()
+                filters = facets.parse_filters(QueryDict(), categories)
+                self.assertIsNone(catalog_snapshot.query(filters, None))
+                catalog_snapshot.refresh()
+                self.assertEqual(len(catalog_snapshot.query(filters, None)), 5)
+
+
+class StaticServingTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        overrides = override_settings(
+            STATIC_ROOT=self.root,
+            STORAGES={
+                **settings.STORAGES,
+                "staticfiles": {
+                    "BACKEND": "ecommerce.storage.CompressedManifestStaticFilesStorage"
+                },
+            },
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.name = staticfiles_storage.stored_name("admin/css/base.css")
+
+    def get(self, **headers):
+        request = RequestFactory().get("/", headers=headers)
+        return serving.serve(request, self.name, self.root)
+
+    def test_collectstatic_writes_hashed_precompressed_files(self):
+        self.assertRegex(self.name, r"^admin/css/base\.[0-9a-f]{12}\.css$")
+        self.assertTrue(os.path.exists(os.path.join(self.root, self.name + ".gz")))
+
+        response = self.get(accept_encoding="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(
+            self.get(
+                accept_encoding="gzip", if_none_match=response["ETag"]
+            ).status_code,
+            304,
+        )
+
+    def test_range_requests(self):
+        full = b"".join(self.get().streaming_content)
+        response = self.get(range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), full[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(full)}")
+        self.assertEqual(self.get(range=f"bytes={len(full)}-").status_code, 416)
+        stale = self.get(range="bytes=0-9", if_range='"outdated"')
+        self.assertEqual(stale.status_code, 200)
+
+
+class AssetBundleTests(TestCase):
+    def test_bundles_are_built_and_pages_have_no_inline_assets(self):
+        call_command("build_assets", check=True, stdout=StringIO())
+        category = Category.objects.create(choice="Fruits")
+        product = Product.objects.create(
+            product_name="Mango",
+            product_price=Decimal("100.00"),
+            quantity="1 kg",
+            product_photo="products/test.jpg",
+            category=category,
+        )
+        for url in (
+            reverse("index"),
+            reverse("detail"),
+            reverse("product_detail", args=[product.pk]),
+            reverse("view_cart"),
+            reverse("login"),
+        ):
+            with self.subTest(url=url):
+                html = self.client.get(url).content.decode()
+                self.assertNotIn("<style>", html)
+                self.assertNotIn("<script>", html)
+                self.assertIn("ecommerce/bundles/shop.js", html)
+
+
+class PrerenderTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(PRERENDER_ROOT=tmp.name, TASKS_ALWAYS_EAGER=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.category = Category.objects.create(choice="Fruits")
+        self.product = Product.objects.create(
+            product_name="Mango",
+            product_price=Decimal("100.00"),
+            quantity="1 kg",
+            product_photo="products/test.jpg",
+            category=self.category,
+        )
+        self.url = reverse("product_detail", args=[self.product.pk])
+
+    def test_anonymous_visitors_get_prerendered_pages(self):
+        self.assertEqual(prerender.render_all(workers=1), (1, 2))
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Prerendered"], "1")
+        html = response.content.decode()
+        self.assertNotIn(prerender.CSRF_PLACEHOLDER, html)
+        self.assertRegex(html, r'name="csrfmiddlewaretoken" value="[A-Za-z0-9]{64}"')
+        self.assertIn("csrftoken", response.cookies)
+        listing = self.client.get(reverse("detail"), {"category": "fruits"})
+        self.assertEqual(listing["X-Prerendered"], "1")
+        self.assertFalse(
+            self.client.get(reverse("detail"), {"sort_by": "newest"}).has_header(
+                "X-Prerendered"
+            )
+        )
+
+        user = User.objects.create_user("shopper")
+        self.client.force_login(user)
+        self.assertFalse(self.client.get(self.url).has_header("X-Prerendered"))
+
+    def test_visitors_with_a_cart_or_messages_get_live_pages(self):
+        prerender.render_all(workers=1)
+        self.client.post(reverse("apply_coupon"), {"code": "NOPE"})
+        self.assertFalse(self.client.get(self.url).has_header("X-Prerendered"))
+        # kept for the next page that shows messages
+        self.assertContains(
+            self.client.get(reverse("login")), "That coupon code is not valid."
+        )
+        self.assertEqual(self.client.get(self.url)["X-Prerendered"], "1")
+
+        self.client.post(reverse("add_to_cart", args=[self.product.pk]))
+        self.assertFalse(self.client.get(self.url).has_header("X-Prerendered"))
+
+    def test_catalog_changes_rebuild_pages(self):
+        self.product.product_name = "Alphonso"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertContains(self.client.get(self.url), "Alphonso")
+        self.assertEqual(self.client.get(self.url)["X-Prerendered"], "1")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ProductImageStorageTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(MEDIA_ROOT=tmp.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.category = Category.objects.create(choice="Vegetables")
+        buffer = BytesIO()
+        Image.new("RGB", (40, 30), "orange").save(buffer, "PNG")
+        self.image = buffer.getvalue()
+
+    def create(self, name, photo):
+        return Product.objects.create(
+            product_name=name,
+            product_price=Decimal("30.00"),
+            quantity="500 g",
+            product_photo=photo,
+            category=self.category,
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        large = self.create("Carrot 500 g", SimpleUploadedFile("a.PNG", self.image))
+        small = self.create("Carrot 250 g", SimpleUploadedFile("b.png", self.image))
+
+        self.assertEqual(large.product_photo.name, small.product_photo.name)
+        self.assertRegex(
+            large.product_photo.name, r"^products/[0-9a-f]{2}/\w{64}\.png$"
+        )
+        blob = ImageBlob.objects.get()
+        self.assertEqual(
+            (blob.width, blob.height, blob.format, blob.size),
+            (40, 30, "PNG", len(self.image)),
+        )
+        self.assertEqual(set(blob.products.all()), {large, small})
+        directory = os.path.dirname(large.product_photo.path)
+        self.assertEqual(os.listdir(directory), [os.path.basename(blob.name)])
+
+    def test_dedupe_command_migrates_legacy_files(self):
+        storage = product_photo_storage()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "products"))
+        legacy = ["products/1_carrot.png", "products/2_carrot.png"]
+        for name in legacy:
+            with open(storage.path(name), "wb") as f:
+                f.write(self.image)
+        products = [self.create(name, name) for name in legacy]
+        self.assertIsNone(products[0].photo_blob)
+
+        out = StringIO()
+        call_command("dedupe_product_images", delete_originals=True, stdout=out)
+
+        self.assertIn(f"2 files to 1 blobs ({2 * len(self.image)} ->", out.getvalue())
+        blob = ImageBlob.objects.get()
+        for product in products:
+            product.refresh_from_db()
+            self.assertEqual(product.product_photo.name, blob.name)
+            self.assertEqual(product.photo_blob, blob)
+        self.assertFalse(any(storage.exists(name) for name in legacy))
+        self.assertTrue(storage.exists(blob.name))
+
+
+@override_settings(
+    RATE_LIMITS={**settings.RATE_LIMITS, "login_user": (2, 60), "cart_ip": (1, 60)}
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(rate_limit._local.clear)
+
+    def rejections(self, scope):
+        return metrics.RATE_LIMITED.values.get((scope,), 0)
+
+    def test_login_rejected_before_password_check(self):
+        before = self.rejections("login_user")
+        data = {"username": "Shopper", "password": "wrong-password"}
+        with mock.patch(
+            "ecommerce.views.authenticate", return_value=None
+        ) as authenticate:
+            statuses = [
+                self.client.post(reverse("login"), data).status_code for _ in range(3)
+            ]
+            other = self.client.post(
+                reverse("login"), {**data, "username": "someone-else"}
+            )
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(authenticate.call_count, 3)
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(self.rejections("login_user"), before + 1)
+
+    def test_json_token_requests_are_limited_per_username(self):
+        User.objects.create_user("shopper", password="secret-pass-123")
+
+        def token(username, password="wrong-password"):
+            return self.client.post(
+                reverse("token_obtain_pair"),
+                {"username": username, "password": password},
+                content_type="application/json",
+            ).status_code
+
+        self.assertEqual(
+            [token("shopper"), token(" Shopper "), token("shopper", "secret-pass-123")],
+            [401, 401, 429],
+        )
+        self.assertEqual(token("someone-else"), 401)
+
+    def test_cart_limit_falls_back_to_local_buckets(self):
+        product = Product.objects.create(
+            product_name="Mango",
+            product_price=Decimal("100.00"),
+            quantity="1 kg",
+            category=Category.objects.create(choice="Fruits"),
+        )
+        url = reverse("add_to_cart", args=[product.pk])
+        self.assertEqual(self.client.post(url).status_code, 200)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["status"], "error")
+        self.assertEqual(response["Retry-After"], "60")
+
+        cache.clear()
+        with mock.patch.object(rate_limit, "_cache", side_effect=ConnectionError):
+            self.assertEqual(self.client.post(url).status_code, 200)
+            self.assertEqual(self.client.post(url).status_code, 429)
+
+    def test_buckets_are_shared_between_workers(self):
+        self.assertNotIsInstance(rate_limit._cache(), LocMemCache)
+        other_worker = caches.create_connection(settings.RATE_LIMIT_CACHE)
+        burst, period = settings.RATE_LIMITS["login_user"]
+        with mock.patch.object(rate_limit, "_cache", return_value=other_worker):
+            waits = [rate_limit.hit("login_user", "shopper") for _ in range(burst)]
+        self.assertEqual(waits, [0] * burst)
+        self.assertGreater(rate_limit.hit("login_user", "shopper"), 0)
+
+
+class PromotionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fruits = Category.objects.create(choice="Fruits")
+        self.mango = self.product("Mango", "100.00", self.fruits)
+        self.apple = self.product("Apple", "40.00", self.fruits)
+        self.rice = self.product(
+            "Rice", "75.50", Category.objects.create(choice="Rice")
+        )
+        fruit_sale = Promotion.objects.create(
+            name="Fruit week", kind=Promotion.PERCENT, value=Decimal("10")
+        )
+        fruit_sale.categories.add(self.fruits)
+        apple_deal = Promotion.objects.create(
+            name="Apples 2+1",
+            kind=Promotion.BUY_X_GET_Y,
+            buy_quantity=2,
+            get_quantity=1,
+        )
+        apple_deal.products.add(self.apple)
+        Promotion.objects.create(
+            name="Welcome", kind=Promotion.FLAT, value=Decimal("25"), code="welcome"
+        )
+        self.user = User.objects.create_user("shopper", password="secret-pass-123")
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["cart"] = {
+            str(self.mango.pk): 2,
+            str(self.apple.pk): 3,
+            str(self.rice.pk): 1,
+        }
+        session.save()
+
+    def product(self, name, price, category):
+        return Product.objects.create(
+            product_name=name,
+            product_price=Decimal(price),
+            quantity="1 kg",
+            product_photo="products/test.jpg",
+            category=category,
+        )
+
+    def test_best_line_rule_then_coupon(self):
+        pricing = self.client.get(reverse("view_cart")).context["pricing"]
+        # Mango 10% of 200; apples: 2+1 (40) beats 10% of 120 (12).
+        self.assertEqual(
+            [(line.product, line.discount) for line in pricing.lines],
+            [
+                (self.mango, Decimal("20.00")),
+                (self.apple, Decimal("40.00")),
+                (self.rice, Decimal("0.00")),
+            ],
+        )
+        self.assertEqual(pricing.total, Decimal("335.50"))
+
+        self.client.post(reverse("apply_coupon"), {"code": "nope"})
+        self.client.post(reverse("apply_coupon"), {"code": " Welcome "})
+        response = self.client.post(reverse("increase_quantity", args=[self.mango.pk]))
+        self.assertEqual(response.json()["item_total"], 270.0)
+        self.assertEqual(response.json()["cart_total"], 400.5)
+
+        session = mock.Mock(id="cs_x", url="https://checkout.stripe.test/session")
+        with mock.patch(
+            "ecommerce.views.stripe.checkout.Session.create", return_value=session
+        ) as create:
+            self.client.post(reverse("create_checkout_session"))
+        line_items = create.call_args.kwargs["line_items"]
+        self.assertEqual(
+            sum(i["price_data"]["unit_amount"] * i["quantity"] for i in line_items),
+            40050,
+        )
+
+        # Promotions ending before the customer returns don't change the order.
+        Promotion.objects.all().delete()
+        paid = mock.Mock(id="cs_x", payment_status="paid", amount_total=40050)
+        with mock.patch(
+            "ecommerce.views.stripe.checkout.Session.retrieve", return_value=paid
+        ):
+            self.client.get(reverse("payment_success"), {"session_id": "cs_x"})
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal("400.50"))
+        items = {item.product: item for item in order.items.all()}
+        self.assertEqual(
+            (items[self.mango].price, items[self.mango].discount),
+            (Decimal("100.00"), Decimal("45.86")),
+        )
+        self.assertEqual(
+            sum(item.quantity * item.price - item.discount for item in items.values()),
+            order.total_amount,
+        )
+
+    def test_rules_follow_changes_made_by_another_worker(self):
+        # The version is only seen by other processes through a shared cache.
+        self.assertNotIsInstance(caches["default"], LocMemCache)
+        self.assertFalse(promotions.get_rules().has_code("SPRING"))
+        other_worker = caches.create_connection("default")
+        with mock.patch.object(catalog, "cache", other_worker):
+            Promotion.objects.create(
+                name="Spring", kind=Promotion.FLAT, value=Decimal("5"), code="SPRING"
+            )
+        self.assertTrue(promotions.get_rules().has_code("SPRING"))
+
+        # Changes that skip the version bump are picked up after max age.
+        Promotion.objects.filter(code="SPRING").update(code="SUMMER")
+        self.assertFalse(promotions.get_rules().has_code("SUMMER"))
+        with override_settings(PROMOTIONS_RULES_MAX_AGE=0):
+            self.assertTrue(promotions.get_rules().has_code("SUMMER"))
+
+    @override_settings(MINIMUM_ORDER_AMOUNT=500)
+    def test_minimum_order_uses_discounted_total(self):
+        with mock.patch("ecommerce.views.stripe.checkout.Session.create") as create:
+            response = self.client.post(reverse("create_checkout_session"))
+        self.assertRedirects(
+            response, reverse("view_cart"), fetch_redirect_response=False
+        )
+        create.assert_not_called()
+        self.assertContains(self.client.get(reverse("view_cart")), "at least ₹500")
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="secret-pass-123")
+        self.customer = Customer.objects.create(user=self.user)
+        self.authentication = ClaimsJWTAuthentication()
+        authentication._versions.clear()
+
+    def authenticate(self, access):
+        request = RequestFactory().get(
+            "/", headers={"authorization": f"Bearer {access}"}
+        )
+        return self.authentication.authenticate(request)
+
+    def test_claims_user_is_built_without_loading_the_user(self):
+        response = self.client.post(
+            reverse("token_obtain_pair"),
+            {"username": "shopper", "password": "secret-pass-123"},
+            content_type="application/json",
+        )
+        access = response.json()["access"]
+
+        with self.assertNumQueries(1):  # the token version, then cached
+            user, _ = self.authenticate(access)
+            self.authenticate(access)
+        self.assertIsInstance(user, ClaimsUser)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                (user.id, user.username, user.is_staff, user.customer_id),
+                (self.user.pk, "shopper", False, self.customer.pk),
+            )
+            self.assertTrue(user.is_authenticated)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password("secret-pass-123"))
+            self.assertEqual(user.date_joined, self.user.date_joined)
+        self.assertEqual(user, self.user)
+
+    def test_revoked_tokens_are_rejected(self):
+        access = ShopTokenObtainPairSerializer.get_token(self.user).access_token
+        self.assertEqual(self.authenticate(access)[0], self.user)
+
+        revoke_tokens(self.user)
+        with self.assertRaisesMessage(AuthenticationFailed, "revoked"):
+            self.authenticate(access)
+        fresh = ShopTokenObtainPairSerializer.get_token(self.user).access_token
+        self.assertEqual(self.authenticate(fresh)[0], self.user)
+
+    def assertRevoked(self, access, revoked=True):
+        authentication._versions.clear()
+        if revoked:
+            with self.assertRaisesMessage(AuthenticationFailed, "revoked"):
+                self.authenticate(access)
+        else:
+            self.assertEqual(self.authenticate(access)[0], self.user)
+
+    def access(self):
+        self.user.refresh_from_db()
+        return ShopTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def test_logout_revokes_tokens(self):
+        access = self.access()
+        self.client.login(username="shopper", password="secret-pass-123")
+        self.assertRevoked(access, revoked=False)
+        self.client.get(reverse("logout"))
+        self.assertRevoked(access)
+
+    def test_account_changes_revoke_tokens(self):
+        access = self.access()
+        self.user.first_name = "Sam"
+        self.user.save()
+        self.user.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=["last_login"])
+        self.assertRevoked(access, revoked=False)
+
+        for change in ("password", "is_staff", "is_active"):
+            with self.subTest(change=change):
+                access = self.access()
+                if change == "password":
+                    self.user.set_password("another-pass-456")
+                else:
+                    setattr(self.user, change, not getattr(self.user, change))
+                self.user.save()
+                self.assertRevoked(access)
+
+    def test_revoking_without_a_customer(self):
+        self.customer.delete()
+        access = self.access()
+        revoke_tokens(self.user)
+        self.assertEqual(Customer.objects.get(user=self.user).token_version, 1)
+        self.assertRevoked(access)
+
+    def test_inactive_users_are_rejected(self):
+        access = self.access()
+        self.assertTrue(access["is_active"])
+        access["is_active"] = False
+        with self.assertRaisesMessage(AuthenticationFailed, "inactive"):
+            self.authenticate(access)
+
+    def test_admin_password_change_revokes_tokens(self):
+        access = self.access()
+        self.client.force_login(
+            User.objects.create_superuser("admin", password="secret-pass-123")
+        )
+        response = self.client.post(
+            reverse("admin:auth_user_password_change", args=[self.user.pk]),
+            {"password1": "another-pass-456", "password2": "another-pass-456"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertRevoked(access)
+
+
+@task_queue.task(max_attempts=2)
+def failing_task():
+    raise RuntimeError("boom")
+
+
+@override_settings(TASKS_ALWAYS_EAGER=False)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(choice="Fruits")
+        self.product = Product.objects.create(
+            product_name="Mango",
+            product_price=Decimal("100.00"),
+            quantity="1 kg",
+            category=category,
+        )
+        self.user = User.objects.create_user("reviewer")
+
+    def test_review_recompute_is_queued_and_run_by_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.user, rating=4)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 0)
+
+        task = task_queue.claim("test-worker")
+        self.assertEqual(task.name, "ecommerce.tasks.refresh_rating_summary")
+        self.assertEqual(task_queue.execute(task), "done")
+        self.assertIsNone(task_queue.claim("test-worker"))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.review_count, self.product.avg_rating), (1, 4))
+
+    def test_failures_back_off_then_fail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            failing_task.delay()
+        task = task_queue.claim("test-worker")
+        self.assertEqual(task_queue.execute(task), "retry")
+        task.refresh_from_db()
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIsNone(task_queue.claim("test-worker"))
+
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        task = task_queue.claim("test-worker")
+        self.assertEqual(task_queue.execute(task), "failed")
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ("failed", 2))
+        self.assertIn("RuntimeError: boom", task.last_error)
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.user, rating=5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 1)
+        self.assertFalse(Task.objects.exists())
+
+    def test_tasks_wait_for_the_callers_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                failing_task.delay()
+                raise RuntimeError("rolled back")
+        self.assertFalse(Task.objects.exists())
+
+        with override_settings(TASKS_ALWAYS_EAGER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    failing_task.delay()
+                    Category.objects.create(choice="Rice")
+        # the eager task failed after the commit without undoing it
+        self.assertTrue(Category.objects.filter(choice="Rice").exists())
+
+    def test_burst_worker_exits_once_the_queue_is_empty(self):
+        stale = Task.objects.create(
+            name="ecommerce.tasks.refresh_catalog_snapshot",
+            status="running",
+            locked_at=timezone.now() - timedelta(days=1),
+            run_at=timezone.now(),
+        )
+        out = StringIO()
+        started = time.monotonic()
+        # worker threads can't see this test's uncommitted rows
+        with mock.patch.object(task_queue, "claim", return_value=None):
+            call_command("run_worker", "--burst", stdout=out)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn("Requeued 1 stale tasks.", out.getvalue())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, "queued")
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.requests = self.registry.counter("t_requests_total", "Requests.", ["view"])
+        self.latency = self.registry.histogram(
+            "t_latency_seconds", "Latency.", buckets=(0.1, 1.0)
+        )
+
+    def test_render(self):
+        self.requests.inc(view="index")
+        self.requests.inc(2, view="index")
+        self.latency.observe(0.05)
+        self.latency.observe(0.5)
+        self.assertEqual(
+            self.registry.render().splitlines(),
+            [
+                "# HELP t_requests_total Requests.",
+                "# TYPE t_requests_total counter",
+                't_requests_total{view="index"} 3',
+                "# HELP t_latency_seconds Latency.",
+                "# TYPE t_latency_seconds histogram",
+                't_latency_seconds_bucket{le="0.1"} 1',
+                't_latency_seconds_bucket{le="1.0"} 2',
+                't_latency_seconds_bucket{le="+Inf"} 2',
+                "t_latency_seconds_sum 0.55",
+                "t_latency_seconds_count 2",
+            ],
+        )
+
+    def test_multiprocess_files_are_merged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(METRICS_MULTIPROC_DIR=tmp):
+                self.requests.inc(view="index")
+                self.latency.observe(0.05)
+                # Another worker's dump, plus one that is half written.
+                other = {
+                    "t_requests_total": [[["index"], 4], [["cart"], 1]],
+                    "t_latency_seconds": [[[], [[0, 1], 2.0, 1]]],
+                }
+                with open(os.path.join(tmp, "metrics-1.json"), "w") as f:
+                    json.dump(other, f)
+                with open(os.path.join(tmp, "metrics-2.json"), "w") as f:
+                    f.write('{"t_requests_total": [[["index"], ')
+                merged = self.registry.collect()
+        self.assertEqual(merged["t_requests_total"], {("index",): 5, ("cart",): 1})
+        self.assertEqual(merged["t_latency_seconds"], {(): [[1, 1], 2.05, 2]})
+
+    @override_settings(METRICS_TOKEN="scrape-secret", METRICS_ALLOWED_IPS=[])
+    def test_endpoint_access(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(
+            self.client.get(url, headers={"authorization": "Bearer nope"}).status_code,
+            403,
+        )
+        response = self.client.get(
+            url, headers={"authorization": "Bearer scrape-secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("# TYPE myshop_view_responses_total counter", response.text)
+        with override_settings(METRICS_ALLOWED_IPS=["10.0.0.5"]):
+            self.assertEqual(
+                self.client.get(url, REMOTE_ADDR="10.0.0.5").status_code, 200
+            )
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(CACHES=LOCAL_CACHE, QUERY_METRICS_SAMPLE_RATE=1.0)
+class QueryMetricsTests(TestCase):
+    def setUp(self):
+        query_metrics.reset()
+        self.addCleanup(query_metrics.reset)
+        Category.objects.create(choice="Fruits")
+
+    def sampled(self, view):
+        values = metrics.registry.collect()["myshop_sampled_request_queries"]
+        counts, total, count = values.get((view,), [None, 0, 0])
+        return count, total
+
+    def test_sampling(self):
+        with override_settings(QUERY_METRICS_SAMPLE_RATE=0.0):
+            self.client.get(reverse("detail"))
+        self.assertEqual(query_metrics.snapshot(), {})
+        with override_settings(QUERY_METRICS_SAMPLE_RATE=0.5):
+            with mock.patch.object(query_metrics.random, "random", return_value=0.7):
+                self.client.get(reverse("detail"))
+            self.assertEqual(query_metrics.snapshot(), {})
+            with mock.patch.object(query_metrics.random, "random", return_value=0.3):
+                self.client.get(reverse("detail"))
+        self.assertEqual(query_metrics.snapshot()["detail"]["requests"], 1)
+
+    def test_headers_only_in_debug(self):
+        response = self.client.get(reverse("detail"))
+        self.assertNotIn("Server-Timing", response.headers)
+        self.assertNotIn("X-DB-Query-Count", response.headers)
+        with override_settings(DEBUG=True):
+            response = self.client.get(reverse("detail"))
+        count = int(response["X-DB-Query-Count"])
+        self.assertGreater(count, 0)
+        self.assertRegex(
+            response["Server-Timing"], rf'^db;dur=[\d.]+;desc="{count} queries"$'
+        )
+        self.assertRegex(response["X-DB-Slowest-Ms"], r"^[\d.]+$")
+
+    def test_aggregates_are_logged_and_exported(self):
+        before = self.sampled("detail")
+        with override_settings(QUERY_METRICS_LOG_EVERY=2):
+            with self.assertLogs("ecommerce.query_metrics", "INFO") as logs:
+                with CaptureQueriesContext(connection) as ctx:
+                    self.client.get(reverse("detail"))
+                    self.client.get(reverse("detail"))
+        queries = len(ctx.captured_queries)
+        summary = query_metrics.snapshot()["detail"]
+        self.assertEqual(summary["requests"], 2)
+        self.assertEqual(summary["queries"], queries)
+        self.assertEqual(summary["avg_queries"], queries / 2)
+        self.assertGreaterEqual(summary["db_time_ms"], summary["slowest_ms"])
+        self.assertTrue(summary["slowest_sql"].startswith("SELECT"))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("'detail'", logs.output[0])
+
+        count, total = self.sampled("detail")
+        self.assertEqual(count - before[0], 2)
+        self.assertEqual(total - before[1], queries)
+        self.assertIn(
+            'myshop_sampled_request_queries_count{view="detail"}',
+            metrics.registry.render(),
+        )
+
+    def test_one_execute_wrapper_per_request(self):
+        request = RequestFactory().get("/")
+        outer, inner = query_metrics.QueryCollector(), query_metrics.QueryCollector()
+        with outer.capture(request):
+            Category.objects.count()
+            with inner.capture(request):
+                self.assertEqual(len(connection.execute_wrappers), 1)
+                Category.objects.count()
+        self.assertEqual(connection.execute_wrappers, [])
+        self.assertFalse(hasattr(request, "_query_collectors"))
+        self.assertEqual((outer.count, inner.count), (2, 1))
+
+        wrappers = []
+        real_execute = connection.execute_wrapper
+
+        def execute_wrapper(wrapper):
+            wrappers.append(wrapper)
+            return real_execute(wrapper)
+
+        with override_settings(PERFORMANCE_BUDGETS_ENABLED=True):
+            with mock.patch.object(connection, "execute_wrapper", execute_wrapper):
+                # index is wrapped in instrument_view as well
+                self.client.get(reverse("index"))
+        self.assertEqual(len(wrappers), 1)
+
+
+class SavedIdsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(choice="Fruits")
+        self.ids = [
+            product.pk
+            for product in Product.objects.bulk_create(
+                [
+                    Product(
+                        product_name=f"Mango {i}",
+                        product_price=Decimal("100.00"),
+                        quantity="1 kg",
+                        category=category,
+                    )
+                    for i in range(3)
+                ]
+            )
+        ]
+        self.user = User.objects.create_user("shopper")
+
+    def saved_ids(self, from_cache):
+        """get_saved_ids, checking whether it had to read Saved."""
+        with CaptureQueriesContext(connection) as ctx:
+            ids = saved_utils.get_saved_ids(self.user)
+        reads = [q for q in ctx.captured_queries if "ecommerce_saved" in q["sql"]]
+        self.assertEqual(len(reads), 0 if from_cache else 1)
+        return ids
+
+    def cached_ids(self):
+        return self.saved_ids(from_cache=True)
+
+    def test_writes_invalidate_cached_ids(self):
+        self.assertEqual(saved_utils.get_saved_ids(self.user), set())
+        saved_utils.save_products(self.user, self.ids[:2])
+        self.assertEqual(self.saved_ids(from_cache=False), set(self.ids[:2]))
+        self.assertEqual(self.cached_ids(), set(self.ids[:2]))
+        self.assertFalse(saved_utils.toggle_saved(self.user, self.ids[0]))
+        self.assertEqual(self.saved_ids(from_cache=False), {self.ids[1]})
+        saved_utils.save_products(self.user, [self.ids[2]])
+        saved_utils.unsave_products(self.user, [self.ids[1]])
+        self.assertEqual(self.saved_ids(from_cache=False), {self.ids[2]})
+        self.assertEqual(self.cached_ids(), {self.ids[2]})
+
+    def test_interleaved_writers_do_not_lose_changes(self):
+        saved_utils.get_saved_ids(self.user)
+        other_worker = caches.create_connection("default")
+        stale = other_worker.get(saved_utils._cache_key(self.user.pk))
+        saved_utils.save_products(self.user, [self.ids[0]])
+        with mock.patch.object(saved_utils, "cache", other_worker):
+            # The other worker read the set before the first save landed.
+            with mock.patch.object(other_worker, "get", return_value=stale):
+                saved_utils.save_products(self.user, [self.ids[1]])
+        self.assertEqual(self.saved_ids(from_cache=False), set(self.ids[:2]))
+
+    def test_changes_made_by_another_worker_are_seen(self):
+        # Invalidation only reaches other processes through a shared cache.
+        self.assertNotIsInstance(caches["default"], LocMemCache)
+        self.assertEqual(saved_utils.get_saved_ids(self.user), set())
+        other_worker = caches.create_connection("default")
+        with mock.patch.object(saved_utils, "cache", other_worker):
+            saved_utils.save_products(self.user, [self.ids[0]])
+        self.assertEqual(self.saved_ids(from_cache=False), {self.ids[0]})
+        with mock.patch.object(saved_utils, "cache", other_worker):
+            saved_utils.unsave_products(self.user, [self.ids[0]])
+        self.assertEqual(self.saved_ids(from_cache=False), set())
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            product_name="Mango",
+            product_price=Decimal("100.00"),
+            quantity="1 kg",
+            category=Category.objects.create(choice="Fruits"),
+        )
+        self.users = [User.objects.create_user(f"reviewer{i}") for i in range(2)]
+
+    def review(self, user, rating):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Review.objects.create(product=self.product, user=user, rating=rating)
+
+    def summary(self):
+        self.product.refresh_from_db()
+        with CaptureQueriesContext(connection) as ctx:
+            histogram = review_utils.rating_histogram(self.product.pk)
+        # Served from the entry the refresh wrote, not recomputed.
+        self.assertNotIn("ecommerce_review", str(ctx.captured_queries))
+        return self.product.review_count, self.product.avg_rating, histogram
+
+    def test_reviews_refresh_the_cached_summary(self):
+        self.assertEqual(
+            review_utils.rating_histogram(self.product.pk),
+            {5: 0, 4: 0, 3: 0, 2: 0, 1: 0},
+        )
+        first = self.review(self.users[0], 4)
+        self.assertEqual(self.summary(), (1, 4.0, {5: 0, 4: 1, 3: 0, 2: 0, 1: 0}))
+        self.review(self.users[1], 1)
+        self.assertEqual(self.summary(), (2, 2.5, {5: 0, 4: 1, 3: 0, 2: 0, 1: 1}))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.summary(), (1, 1.0, {5: 0, 4: 0, 3: 0, 2: 0, 1: 1}))
+
+    def test_entries_expire(self):
+        with mock.patch.object(review_utils.cache, "set") as cache_set:
+            review_utils.rating_histogram(self.product.pk)
+        self.assertEqual(
+            cache_set.call_args.args[2], settings.RATING_HISTOGRAM_CACHE_TIMEOUT
+        )
+
+
+class QuickViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(choice="Fruits")
+        self.products = [
+            Product.objects.create(
+                product_name=name,
+                product_price=Decimal(price),
+                quantity="1 kg",
+                category=self.category,
+            )
+            for name, price in (("Mango", "100.00"), ("Apple", "40.00"))
+        ]
+        self.ids = [product.pk for product in self.products]
+
+    def fragments(self, product_ids, rendered):
+        """Fragments for `product_ids`, checking how many were rendered."""
+        with CaptureQueriesContext(connection) as ctx:
+            fragments = quick_view.get_quick_view_fragments(product_ids)
+        product_queries = [
+            q for q in ctx.captured_queries if 'FROM "ecommerce_product"' in q["sql"]
+        ]
+        self.assertEqual(len(product_queries), 1 if rendered else 0)
+        return fragments
+
+    def test_fragments_are_cached_until_the_product_changes(self):
+        fragments = self.fragments(self.ids + [0], rendered=True)
+        self.assertEqual(list(fragments), self.ids)
+        self.assertIn("Mango", fragments[self.ids[0]])
+        self.assertIn("₹100.00", fragments[self.ids[0]])
+        self.assertIn("Fruits", fragments[self.ids[1]])
+        self.assertEqual(self.fragments(self.ids, rendered=False), fragments)
+
+        mango = self.products[0]
+        mango.product_price = Decimal("90.00")
+        mango.save()
+        self.assertIn("₹90.00", self.fragments([mango.pk], rendered=True)[mango.pk])
+        self.assertEqual(
+            self.fragments([self.ids[1]], rendered=False)[self.ids[1]],
+            fragments[self.ids[1]],
+        )
+
+        self.category.choice = "Seasonal fruit"
+        self.category.save()
+        fragments = self.fragments(self.ids, rendered=True)
+        self.assertTrue(all("Seasonal fruit" in html for html in fragments.values()))
+
+    def test_async_lookup_matches_and_shares_the_cache(self):
+        fragments = async_to_sync(quick_view.aget_quick_view_fragments)(self.ids)
+        self.assertEqual(fragments, self.fragments(self.ids, rendered=False))
+        self.assertEqual(
+            async_to_sync(quick_view.aget_quick_view_fragments)([0, self.ids[1]]),
+            {self.ids[1]: fragments[self.ids[1]]},
+        )
+
+
+class RelatedProductsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="pw")
+        category = Category.objects.create(choice="Fruits")
+        self.ids = [
+            Product.objects.create(
+                product_name=f"Product {i}",
+                product_price=Decimal("10.00"),
+                quantity="1 kg",
+                category=category,
+            ).pk
+            for i in range(5)
+        ]
+
+    def order(self, *indexes):
+        order = Order.objects.create(user=self.user, total_amount=Decimal("10.00"))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_id=self.ids[i], quantity=1, price=10)
+            for i in indexes
+        )
+        related_products.record_order_copurchases([self.ids[i] for i in indexes])
+
+    def neighbours(self, index):
+        return {
+            self.ids.index(related_id): score
+            for related_id, score in ProductRelation.objects.filter(
+                product_id=self.ids[index]
+            ).values_list("related_id", "score")
+        }
+
+    def test_incremental_updates_match_a_rebuild(self):
+        self.order(0, 1)
+        self.order(0, 1, 2)
+        self.order(1, 3)
+        self.assertEqual(self.neighbours(0), {1: 2, 2: 1})
+        self.assertEqual(self.neighbours(1), {0: 2, 2: 1, 3: 1})
+        incremental = set(
+            ProductRelation.objects.values_list("product", "related", "score")
+        )
+        related_products.rebuild_relations()
+        self.assertEqual(
+            set(ProductRelation.objects.values_list("product", "related", "score")),
+            incremental,
+        )
+
+    @override_settings(RELATED_PRODUCTS_TOP_K=2)
+    def test_only_the_top_k_neighbours_are_kept(self):
+        self.order(0, 1)
+        self.order(0, 1)
+        self.order(0, 2, 3)
+        self.assertEqual(self.neighbours(0), {1: 2, 2: 1})
+        self.assertEqual(self.neighbours(3), {0: 1, 2: 1})
+        # 3 was pruned from 0's neighbours, but 3 still lists 0.
+        self.order(0, 3)
+        self.assertEqual(self.neighbours(0), {1: 2, 3: 2})
+
+    @override_settings(RELATED_PRODUCTS_MAX_BASKET=3)
+    def test_large_baskets_are_trimmed(self):
+        self.order(0, 1, 2, 3, 4)
+        self.assertEqual(self.neighbours(0), {1: 1, 2: 1})
+        self.assertEqual(self.neighbours(3), {})
+        self.assertEqual(self.neighbours(4), {})
+        self.order(3, 4)
+        self.assertEqual(self.neighbours(3), {4: 1})
+
+
+class PaymentSuccessTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            product_name="Mango",
+            product_price=Decimal("100.00"),
+            quantity="1 kg",
+            product_photo="products/test.jpg",
+            category=Category.objects.create(choice="Fruits"),
+            stock=5,
+        )
+        self.user = User.objects.create_user("shopper", password="secret-pass-123")
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["cart"] = {str(self.product.pk): 2}
+        session.save()
+        created = mock.Mock(id="cs_1", url="https://checkout.stripe.test/session")
+        with mock.patch(
+            "ecommerce.views.stripe.checkout.Session.create", return_value=created
+        ):
+            self.client.post(reverse("create_checkout_session"))
+
+    def finish(self, session_id="cs_1", payment_status="paid"):
+        checkout = mock.Mock(
+            id=session_id,
+            payment_status=payment_status,
+            payment_intent="pi_1",
+            amount_total=20000,
+        )
+        with (
+            mock.patch(
+                "ecommerce.views.stripe.checkout.Session.retrieve",
+                return_value=checkout,
+            ) as retrieve,
+            mock.patch("ecommerce.views.stripe.Refund.create") as refund,
+        ):
+            response = self.client.get(
+                reverse("payment_success"), {"session_id": session_id}
+            )
+        return response, retrieve, refund
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock, self.product.reserved
+
+    def test_paid_session_places_the_order_once(self):
+        self.assertEqual(self.stock(), (5, 2))
+        # the order is what Stripe charged, not what the cart became since
+        session = self.client.session
+        session["cart"] = {str(self.product.pk): 4}
+        session.save()
+        response, retrieve, refund = self.finish()
+        self.assertEqual(response.status_code, 200)
+        retrieve.assert_called_once_with("cs_1")
+        order = Order.objects.get()
+        self.assertEqual((order.payment_id, order.status), ("cs_1", "processing"))
+        self.assertEqual(order.total_amount, Decimal("200.00"))
+        self.assertEqual(order.items.get().quantity, 2)
+        self.assertEqual(self.stock(), (3, 0))
+
+        response, retrieve, refund = self.finish()
+        self.assertEqual(response.context["order"], order)
+        retrieve.assert_not_called()
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.stock(), (3, 0))
+
+    def test_unpaid_or_foreign_sessions_place_nothing(self):
+        response, retrieve, refund = self.finish(payment_status="unpaid")
+        self.assertRedirects(
+            response, reverse("view_cart"), fetch_redirect_response=False
+        )
+        response, retrieve, refund = self.finish(session_id="cs_other")
+        retrieve.assert_not_called()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), (5, 2))
+        self.assertEqual(self.client.session["cart"], {str(self.product.pk): 2})
+
+    def test_sold_out_after_payment_is_refunded(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        response, retrieve, refund = self.finish()
+        self.assertRedirects(
+            response, reverse("view_cart"), fetch_redirect_response=False
+        )
+        refund.assert_called_once_with(payment_intent="pi_1")
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), (1, 0))
+        self.assertContains(
+            self.client.get(reverse("view_cart")), "your payment has been refunded"
+        )
+
+
+class FulfilmentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("staff", password="secret-pass-123")
+        category = Category.objects.create(choice="Fruits")
+        self.mango, self.apple = (
+            Product.objects.create(
+                product_name=name,
+                product_price=Decimal("10.00"),
+                quantity="1 kg",
+                category=category,
+                stock=stock,
+            )
+            for name, stock in (("Mango", 10), ("Apple", None))
+        )
+
+    def order(self, status):
+        order = Order.objects.create(
+            user=self.user, total_amount=Decimal("30.00"), status=status
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=self.mango, quantity=2, price=10),
+                OrderItem(order=order, product=self.apple, quantity=1, price=10),
+            ]
+        )
+        return order
+
+    def events(self):
+        return list(
+            OrderStatusEvent.objects.order_by("pk").values_list(
+                "order_id", "from_status", "to_status", "changed_by"
+            )
+        )
+
+    def mango_stock(self):
+        self.mango.refresh_from_db()
+        return self.mango.stock
+
+    def test_allowed_transitions_are_audited(self):
+        order = self.order("processing")
+        fulfilment.transition(order, "shipped", changed_by=self.user)
+        fulfilment.transition(order, "delivered")
+        self.assertEqual(Order.objects.get().status, "delivered")
+        self.assertEqual(
+            self.events(),
+            [
+                (order.pk, "processing", "shipped", self.user.pk),
+                (order.pk, "shipped", "delivered", None),
+            ],
+        )
+        self.assertEqual(self.mango_stock(), 10)
+
+    def test_forbidden_transitions_change_nothing(self):
+        order = self.order("shipped")
+        for to_status in ("processing", "cancelled", "refunded"):
+            with self.assertRaises(fulfilment.InvalidTransition):
+                fulfilment.transition(order, to_status)
+        stale = Order.objects.get()
+        Order.objects.update(status="delivered")
+        with self.assertRaises(fulfilment.InvalidTransition):
+            fulfilment.transition(stale, "delivered")
+        self.assertEqual(self.events(), [])
+        self.assertEqual(self.mango_stock(), 10)
+
+    def test_cancelling_a_paid_order_restocks_it(self):
+        pending, paid = self.order("pending"), self.order("processing")
+        fulfilment.transition(pending, "cancelled")
+        self.assertEqual(self.mango_stock(), 10)
+        fulfilment.transition(paid, "cancelled")
+        self.assertEqual(self.mango_stock(), 12)
+        self.assertIsNone(Product.objects.get(pk=self.apple.pk).stock)
+
+    def test_bulk_transition_moves_only_allowed_orders(self):
+        orders = [
+            self.order(status)
+            for status in ("pending", "processing", "processing", "shipped")
+        ]
+        moved = fulfilment.bulk_transition(
+            Order.objects.all(), "cancelled", changed_by=self.user, batch_size=2
+        )
+        self.assertEqual(moved, 3)
+        self.assertEqual(
+            list(Order.objects.order_by("pk").values_list("status", flat=True)),
+            ["cancelled", "cancelled", "cancelled", "shipped"],
+        )
+        self.assertEqual(
+            self.events(),
+            [
+                (orders[0].pk, "pending", "cancelled", self.user.pk),
+                (orders[1].pk, "processing", "cancelled", self.user.pk),
+                (orders[2].pk, "processing", "cancelled", self.user.pk),
+            ],
+        )
+        self.assertEqual(self.mango_stock(), 14)
+
+        ids = [order.pk for order in orders]
+        self.assertEqual(fulfilment.bulk_transition(ids, "delivered"), 1)
+        self.assertEqual(Order.objects.get(pk=orders[3].pk).status, "delivered")
+        self.assertEqual(fulfilment.bulk_transition(ids, "cancelled"), 0)
+        self.assertEqual(self.mango_stock(), 14)
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", password="secret-pass-123")
+        self.client.force_login(self.admin)
+        category = Category.objects.create(choice="Fruits")
+        self.products = [
+            Product.objects.create(
+                product_name=name,
+                product_price=Decimal(price),
+                quantity="1 kg",
+                category=category,
+            )
+            for name, price in (
+                ("Mango", "10.00"),
+                ("Apple", "19.99"),
+                ("Kiwi", "0.05"),
+                ("Plum", "7.00"),
+            )
+        ]
+
+    def act(self, model, action, objects, **data):
+        response = self.client.post(
+            reverse(f"admin:ecommerce_{model}_changelist"),
+            {
+                "action": action,
+                "_selected_action": [obj.pk for obj in objects],
+                **data,
+            },
+            follow=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        return [str(message) for message in response.context["messages"]]
+
+    def prices(self):
+        return list(
+            Product.objects.order_by("pk").values_list("product_price", flat=True)
+        )
+
+    def test_reprice_rejects_missing_or_impossible_percentages(self):
+        version = catalog.get_catalog_version()
+        for percentage in ("", "-100", "-150"):
+            with self.subTest(percentage=percentage):
+                messages = self.act(
+                    "product", "reprice", self.products, percentage=percentage
+                )
+                self.assertEqual(messages, ["Enter a percentage greater than -100."])
+        # The action form itself rejects non-numbers before the action runs.
+        self.act("product", "reprice", self.products, percentage="abc")
+        self.assertEqual(
+            self.prices(),
+            [Decimal("10.00"), Decimal("19.99"), Decimal("0.05"), Decimal("7.00")],
+        )
+        self.assertEqual(catalog.get_catalog_version(), version)
+
+    def test_reprice_rounds_to_paise(self):
+        messages = self.act("product", "reprice", self.products[:3], percentage="12.5")
+        self.assertEqual(messages, ["Repriced 3 products by 12.5%."])
+        self.assertEqual(
+            self.prices(),
+            [Decimal("11.25"), Decimal("22.49"), Decimal("0.06"), Decimal("7.00")],
+        )
+        self.act("product", "reprice", self.products[:2], percentage="-15")
+        self.assertEqual(self.prices()[:2], [Decimal("9.56"), Decimal("19.12")])
+
+    def test_reprice_invalidates_caches(self):
+        ids = [product.pk for product in self.products]
+        quick_view.get_quick_view_fragments(ids)
+        version = catalog.get_catalog_version()
+        self.act("product", "reprice", self.products[:2], percentage="10")
+        self.assertNotEqual(catalog.get_catalog_version(), version)
+        cached = cache.get_many([quick_view._cache_key(pk) for pk in ids])
+        self.assertEqual(sorted(cached), [quick_view._cache_key(pk) for pk in ids[2:]])
+        self.assertIn("₹11.00", quick_view.get_quick_view_fragments(ids)[ids[0]])
+
+    def test_order_actions_skip_disallowed_statuses(self):
+        orders = [
+            Order.objects.create(
+                user=self.admin, total_amount=Decimal("10.00"), status=status
+            )
+            for status in ("pending", "processing", "shipped", "delivered")
+        ]
+
+        def statuses():
+            return list(Order.objects.order_by("pk").values_list("status", flat=True))
+
+        self.assertEqual(
+            self.act("order", "mark_shipped", orders),
+            [
+                "Moved 1 orders to shipped; orders whose status does not allow "
+                "that were left alone."
+            ],
+        )
+        self.assertEqual(statuses(), ["pending", "shipped", "shipped", "delivered"])
+        self.act("order", "mark_delivered", orders)
+        self.assertEqual(statuses(), ["pending", "delivered", "delivered", "delivered"])
+        self.act("order", "cancel_orders", orders)
+        self.assertEqual(
+            statuses(), ["cancelled", "delivered", "delivered", "delivered"]
+        )
+        self.assertEqual(
+            OrderStatusEvent.objects.filter(changed_by=self.admin).count(), 4
+        )
+
+    def test_paginator_counts_exactly_unless_postgres_and_unfiltered(self):
+        queryset = Product.objects.order_by("pk")
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 4)
+
+        postgres = mock.MagicMock(vendor="postgresql")
+        cursor = postgres.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (25000.0,)
+        with mock.patch("ecommerce.admin.connections", {"default": postgres}):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 25000)
+            filtered = queryset.filter(product_name__startswith="M")
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 1)
+            cursor.fetchone.return_value = (12.0,)
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 4)
+            cursor.fetchone.return_value = None
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 4)
+
+
+class AsyncViewTests(TestCase):
+    """Under SERVER_MODE=asgi the JSON endpoints answer exactly as before."""
+
+    def setUp(self):
+        cache.clear()
+        fruits = Category.objects.create(choice="Fruits")
+        self.mango, self.apple = (
+            Product.objects.create(
+                product_name=name,
+                product_price=Decimal(price),
+                quantity="1 kg",
+                product_photo="products/test.jpg",
+                category=fruits,
+            )
+            for name, price in (("Mango", "100.00"), ("Apple", "40.00"))
+        )
+        sale = Promotion.objects.create(
+            name="Fruit week", kind=Promotion.PERCENT, value=Decimal("10")
+        )
+        sale.categories.add(fruits)
+        self.user = User.objects.create_user("shopper", password="secret-pass-123")
+        self.addCleanup(self.route_json_views, settings.SERVER_MODE)
+
+    def route_json_views(self, mode):
+        with override_settings(SERVER_MODE=mode):
+            importlib.reload(ecommerce_urls)
+        # include() resolved the old urlpatterns when the root URLconf loaded
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def responses(self):
+        """Every JSON endpoint's (status, body) over one shopping session."""
+        self.client.logout()
+        Saved.objects.all().delete()
+        mango, apple = self.mango.pk, self.apple.pk
+        requests = [
+            ("post", "save_product", mango),
+            ("post", "add_to_cart", mango),
+            ("post", "add_to_cart", apple),
+            ("post", "add_to_cart", 0),
+            ("post", "increase_quantity", mango),
+            ("post", "decrease_quantity", apple),
+            ("post", "decrease_quantity", apple),
+            ("get", "cart_count", None),
+            ("get", "quick_view_product", apple),
+            ("get", "quick_view_product", 0),
+            ("login", None, None),
+            ("post", "save_product", mango),
+            ("post", "save_product", apple),
+            ("post", "save_product", mango),
+            ("post", "remove_saved", apple),
+        ]
+        responses = []
+        for method, name, product_id in requests:
+            if method == "login":
+                self.client.force_login(self.user)
+                continue
+            args = [] if product_id is None else [product_id]
+            response = getattr(self.client, method)(reverse(name, args=args))
+            body = response.json() if response.status_code != 404 else None
+            responses.append((name, response.status_code, body))
+        return responses
+
+    def test_async_views_match_the_sync_views(self):
+        self.route_json_views("wsgi")
+        self.assertEqual(
+            resolve(reverse("cart_count")).func.__module__, "ecommerce.views"
+        )
+        expected = self.responses()
+        self.assertEqual(
+            [
+                body["status"]
+                for name, status, body in expected
+                if name == "save_product"
+            ],
+            ["error", "added", "added", "removed"],
+        )
+        self.assertEqual(expected[4][2]["cart_total"], 216.0)
+
+        self.route_json_views("asgi")
+        self.assertEqual(
+            resolve(reverse("cart_count")).func.__module__, "ecommerce.async_views"
+        )
+        self.assertEqual(self.responses(), expected)
+        self.assertFalse(Saved.objects.filter(product=self.apple).exists())
+        self.assertEqual(self.client.session["cart"], {str(self.mango.pk): 2})
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("shopper")
+        self.fruits = Category.objects.create(choice="Fruits")
+        self.rice = Category.objects.create(choice="Rice")
+        self.mango, self.apple, self.basmati = (
+            Product.objects.create(
+                product_name=name,
+                product_price=Decimal("10.00"),
+                quantity="1 kg",
+                category=category,
+            )
+            for name, category in (
+                ("Mango", self.fruits),
+                ("Apple", self.fruits),
+                ("Basmati", self.rice),
+            )
+        )
+
+    def order(self, age, *lines, status="processing"):
+        """An order placed `age` ago with (product, quantity, discount) lines."""
+        order = Order.objects.create(
+            user=self.user, total_amount=Decimal("0.00"), status=status
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product=product,
+                quantity=quantity,
+                price=product.product_price,
+                discount=Decimal(discount),
+            )
+            for product, quantity, discount in lines
+        )
+        self.age(order, age)
+        return order
+
+    def age(self, order, age):
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - age)
+
+    def rollups(self):
+        return (
+            sorted(
+                DailyProductSales.objects.values_list(
+                    "date", "product", "units", "revenue", "order_count"
+                )
+            ),
+            sorted(
+                DailyCategorySales.objects.values_list(
+                    "date", "category", "units", "revenue", "order_count"
+                )
+            ),
+        )
+
+    def test_incremental_runs_match_a_rebuild(self):
+        day = timedelta(days=1)
+        self.order(2 * day, (self.mango, 2, "0"), (self.basmati, 1, "1.50"))
+        self.order(2 * day, (self.mango, 1, "2.00"), (self.apple, 3, "0"))
+        self.order(2 * day, (self.apple, 5, "0"), status="cancelled")
+        self.assertEqual(sales_rollups.update_rollups(0, batch_size=2), 3)
+        self.order(2 * day, (self.mango, 1, "0"))
+        self.order(day, (self.mango, 4, "5.00"), (self.apple, 1, "0"))
+        self.assertEqual(sales_rollups.update_rollups(0, batch_size=2), 2)
+        self.assertEqual(sales_rollups.update_rollups(0), 0)
+
+        incremental = self.rollups()
+        mango = DailyProductSales.objects.get(
+            product=self.mango, date=(timezone.now() - 2 * day).date()
+        )
+        self.assertEqual(
+            (mango.units, mango.revenue, mango.order_count), (4, Decimal("38.00"), 3)
+        )
+        fruits = DailyCategorySales.objects.get(
+            category=self.fruits, date=(timezone.now() - 2 * day).date()
+        )
+        self.assertEqual((fruits.units, fruits.order_count), (7, 3))
+
+        self.assertEqual(sales_rollups.rebuild_rollups(0), 5)
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_orders_inside_the_lag_wait_for_a_later_run(self):
+        lag = 15 * 60
+        recent = self.order(timedelta(minutes=1), (self.apple, 1, "0"))
+        # older by the clock but with a later id, so it waits behind `recent`
+        self.order(timedelta(hours=1), (self.mango, 1, "0"))
+        self.assertEqual(sales_rollups.update_rollups(lag), 0)
+        self.assertFalse(DailyProductSales.objects.exists())
+
+        self.age(recent, timedelta(hours=1))
+        self.assertEqual(sales_rollups.update_rollups(lag), 2)
+        latest = self.order(timedelta(seconds=lag - 60), (self.basmati, 1, "0"))
+        self.assertEqual(sales_rollups.update_rollups(lag), 0)
+        self.assertEqual(
+            set(DailyProductSales.objects.values_list("product", flat=True)),
+            {self.apple.pk, self.mango.pk},
+        )
+
+        self.age(latest, timedelta(seconds=lag + 60))
+        self.assertEqual(sales_rollups.update_rollups(lag), 1)
+        incremental = self.rollups()
+        sales_rollups.rebuild_rollups(0)
+        self.assertEqual(self.rollups(), incremental)
@@ -1,7 +1,18 @@
+from django.conf import settings
 from django.urls import path
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from ecommerce.utils import metrics
+from ecommerce.utils.rate_limit import client_ip, posted_username, rate_limit
 
 from . import views
 
+# Under ASGI the small JSON endpoints are served by native async views.
+if getattr(settings, "SERVER_MODE", "wsgi") == "asgi":
+    from . import async_views as json_views
+else:
+    json_views = views
+
 urlpatterns = [
     path("", views.index, name="index"),
     # PRODUCT PAGES
@@ -11,9 +22,24 @@ urlpatterns = [
         views.ProductDetailView.as_view(),
         name="product_detail",
     ),
+    path(
+        "product/<int:product_id>/reviews/",
+        views.product_reviews,
+        name="product_reviews",
+    ),
+    path(
+        "product/<int:product_id>/related/",
+        views.related_products,
+        name="related_products",
+    ),
+    path(
+        "product/quick-view/batch/",
+        views.quick_view_batch,
+        name="quick_view_batch",
+    ),
     path(
         "product/quick-view/<int:product_id>/",
-        views.quick_view_product,
+        json_views.quick_view_product,
         name="quick_view_product",
     ),
     # LOGIIN LOGOUT PAGES
@@ -21,22 +47,23 @@ urlpatterns = [
     path("logout/", views.logout_view, name="logout"),
     path("register/", views.register_view, name="register"),
     #  CART PAGES
-    path("cart/add/<int:product_id>/", views.add_to_cart, name="add_to_cart"),
+    path("cart/add/<int:product_id>/", json_views.add_to_cart, name="add_to_cart"),
     path(
         "cart/remove/<int:product_id>/", views.remove_from_cart, name="remove_from_cart"
     ),
     path("cart", views.view_cart, name="view_cart"),
     path(
         "cart/increase/<int:product_id>/",
-        views.increase_quantity,
+        json_views.increase_quantity,
         name="increase_quantity",
     ),
     path(
         "cart/decrease/<int:product_id>/",
-        views.decrease_quantity,
+        json_views.decrease_quantity,
         name="decrease_quantity",
     ),
-    path("cart/count/", views.cart_count, name="cart_count"),
+    path("cart/count/", json_views.cart_count, name="cart_count"),
+    path("cart/coupon/", views.apply_coupon, name="apply_coupon"),
     #  PAYMENT PAGES
     path(
         "create-checkout-session/",
@@ -47,7 +74,26 @@ urlpatterns = [
     path("cancel/", views.payment_cancel, name="payment_cancel"),
     # saved pages
     path("saved-items/", views.saved_items_view, name="saved_items"),
-    path("save/<int:product_id>/", views.save_product, name="save_product"),
-    path("remove-saved/<int:product_id>/", views.remove_saved, name="remove_saved"),
+    path("save/<int:product_id>/", json_views.save_product, name="save_product"),
+    path("save/bulk/", views.save_products_bulk, name="save_products_bulk"),
+    path(
+        "remove-saved/<int:product_id>/", json_views.remove_saved, name="remove_saved"
+    ),
     path("orders/", views.order_history, name="order_history"),
+    path("metrics", views.metrics_view, name="metrics"),
+    # API TOKENS (see ecommerce.authentication)
+    path(
+        "api/token/",
+        metrics.instrument_view(
+            rate_limit(("login_ip", client_ip), ("login_user", posted_username))(
+                TokenObtainPairView.as_view()
+            )
+        ),
+        name="token_obtain_pair",
+    ),
+    path(
+        "api/token/refresh/",
+        metrics.instrument_view(TokenRefreshView.as_view()),
+        name="token_refresh",
+    ),
 ]
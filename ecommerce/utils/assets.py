@@ -0,0 +1,59 @@
+"""Concatenate the CSS/JS sources in ecommerce/assets into static bundles.
+
+Every page loads the shared ``shop`` bundles (cached once for the whole
+site) plus, where it has any, its own page bundle. The output is committed
+under ecommerce/static/ecommerce/bundles so no build step is needed to run
+the app; collectstatic then fingerprints and precompresses it (see
+ecommerce.storage). Rebuild with ``manage.py build_assets`` after editing a
+source file.
+"""
+
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+SOURCE_DIR = APP_DIR / "assets"
+OUTPUT_DIR = APP_DIR / "static" / "ecommerce" / "bundles"
+
+BUNDLES = {
+    "shop.css": ["css/base.css"],
+    "shop.js": ["js/core.js", "js/cart_controls.js", "js/quick_view.js"],
+    "index.css": ["css/index.css"],
+    "detail.css": ["css/detail.css"],
+    "product_detail.css": ["css/product_detail.css"],
+    "product_detail.js": ["js/product_detail.js"],
+    "cart.css": ["css/cart.css"],
+    "cart.js": ["js/cart.js"],
+    "saved_items.css": ["css/saved_items.css"],
+    "saved_items.js": ["js/saved_items.js"],
+    "login.css": ["css/login.css"],
+    "register.css": ["css/register.css"],
+    "auth.js": ["js/auth.js"],
+    "order_history.css": ["css/order_history.css"],
+}
+
+BANNER = (
+    "/* Generated by `manage.py build_assets` from ecommerce/assets: {sources} */\n"
+)
+
+
+def render_bundle(name):
+    sources = BUNDLES[name]
+    parts = [BANNER.format(sources=", ".join(sources))]
+    for source in sources:
+        parts.append((SOURCE_DIR / source).read_text(encoding="utf-8"))
+    return "\n".join(parts)
+
+
+def build_bundles(check=False):
+    """Write every bundle; returns the names that changed (or would, if `check`)."""
+    changed = []
+    for name in BUNDLES:
+        path = OUTPUT_DIR / name
+        content = render_bundle(name)
+        if path.exists() and path.read_text(encoding="utf-8") == content:
+            continue
+        changed.append(name)
+        if not check:
+            OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+    return changed
@@ -0,0 +1,374 @@
+"""Synthetic catalog seeding and in-process storefront benchmarks.
+
+Used by ``manage.py bench_storefront``; everything runs through Django's test
+client against a throwaway test database, so no server or load tool is needed.
+``run_http_load`` (``manage.py bench_concurrency``) is the exception: it drives
+a running server over HTTP to compare the WSGI and ASGI deployment modes.
+``run_promotions_benchmark`` (``manage.py bench_promotions``) times the
+promotion engine alone, in memory.
+"""
+
+import http.client
+import random
+import statistics
+import threading
+import time
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from ecommerce.models import (
+    Category,
+    Customer,
+    Order,
+    OrderItem,
+    Product,
+    Promotion,
+    Review,
+    Saved,
+)
+from ecommerce.utils.promotions import Rule, RuleSet
+
+SEARCH_TERMS = ["fresh", "local", "organic", "pack", "green", "rice"]
+SORTS = ["", "price_asc", "price_desc", "name_asc", "newest"]
+WORDS = ["Fresh", "Local", "Organic", "Green", "Premium", "Rice", "Pack", "Value"]
+
+
+def seed_catalog(
+    categories=10,
+    products_per_category=50,
+    users=20,
+    reviews_per_product=5,
+    saved_per_user=10,
+    orders_per_user=10,
+    items_per_order=3,
+    seed=42,
+):
+    rng = random.Random(seed)
+    Category.objects.bulk_create(
+        [
+            Category(choice=f"Category {i}", slug=f"category-{i}")
+            for i in range(categories)
+        ]
+    )
+    category_ids = list(Category.objects.values_list("id", flat=True))
+
+    Product.objects.bulk_create(
+        [
+            Product(
+                product_name=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {c}-{i}",
+                product_price=Decimal(rng.randint(1000, 99900)) / 100,
+                quantity=f"{rng.choice([250, 500, 1000])} g",
+                product_photo="products/bench.jpg",
+                category_id=category_id,
+            )
+            for c, category_id in enumerate(category_ids)
+            for i in range(products_per_category)
+        ],
+        batch_size=1000,
+    )
+    product_ids = list(Product.objects.values_list("id", flat=True))
+
+    User.objects.bulk_create(
+        [User(username=f"bench_user_{i}", password="!") for i in range(users)]
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith="bench_user_").values_list(
+            "id", flat=True
+        )
+    )
+    Customer.objects.bulk_create([Customer(user_id=uid) for uid in user_ids])
+
+    reviews = []
+    for product_id in product_ids:
+        reviewers = rng.sample(user_ids, min(reviews_per_product, len(user_ids)))
+        for user_id in reviewers:
+            reviews.append(
+                Review(
+                    product_id=product_id,
+                    user_id=user_id,
+                    rating=rng.randint(1, 5),
+                    comment="Benchmark review",
+                )
+            )
+    Review.objects.bulk_create(reviews, batch_size=1000)
+
+    Saved.objects.bulk_create(
+        [
+            Saved(user_id=user_id, product_id=product_id)
+            for user_id in user_ids
+            for product_id in rng.sample(
+                product_ids, min(saved_per_user, len(product_ids))
+            )
+        ],
+        batch_size=1000,
+    )
+
+    orders = Order.objects.bulk_create(
+        [
+            Order(user_id=user_id, total_amount=0, status="processing")
+            for user_id in user_ids
+            for _ in range(orders_per_user)
+        ],
+        batch_size=1000,
+    )
+    items = []
+    per_order = min(items_per_order, len(product_ids))
+    for order in orders:
+        for product_id in rng.sample(product_ids, per_order):
+            items.append(
+                OrderItem(
+                    order_id=order.id,
+                    product_id=product_id,
+                    quantity=rng.randint(1, 3),
+                    price=Decimal("10.00"),
+                )
+            )
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+    return {
+        "categories": len(category_ids),
+        "products": len(product_ids),
+        "users": len(user_ids),
+        "reviews": len(reviews),
+        "orders": len(orders),
+        "order_items": len(items),
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = round(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(durations, sizes=()):
+    durations = sorted(durations)
+    total = sum(durations)
+    return {
+        "mean_bytes": round(statistics.fmean(sizes)) if sizes else 0,
+        "requests": len(durations),
+        "throughput_rps": round(len(durations) / total, 2) if total else 0.0,
+        "mean_ms": round(statistics.fmean(durations) * 1000, 3),
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 99) * 1000, 3),
+    }
+
+
+def measure(request_fn, iterations, warmup):
+    for i in range(warmup):
+        request_fn(i)
+    durations = []
+    sizes = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        response = request_fn(i)
+        durations.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f"benchmark request failed with status {response.status_code}"
+            )
+        sizes.append(len(response.content))
+    return summarize(durations, sizes)
+
+
+def build_scenarios(seed=42):
+    rng = random.Random(seed)
+    product_ids = list(Product.objects.values_list("id", flat=True))
+    category_slugs = list(Category.objects.values_list("slug", flat=True))
+    user = User.objects.filter(username__startswith="bench_user_").first()
+
+    anonymous = Client()
+    shopper = Client()
+    member = Client()
+    member.force_login(user)
+
+    def listing(i):
+        params = {"sort_by": rng.choice(SORTS)}
+        if i % 2:
+            params["search"] = rng.choice(SEARCH_TERMS)
+        if i % 3 == 0:
+            params["category"] = rng.choice(category_slugs)
+        return anonymous.get(reverse("detail"), params)
+
+    def cart_add(i):
+        return shopper.post(reverse("add_to_cart", args=[rng.choice(product_ids)]))
+
+    def cart_increase(i):
+        return shopper.post(reverse("increase_quantity", args=[product_ids[i % 10]]))
+
+    def cart_decrease(i):
+        return shopper.post(reverse("decrease_quantity", args=[product_ids[i % 10]]))
+
+    return {
+        "index": lambda i: anonymous.get(reverse("index")),
+        "detail_listing": listing,
+        "product_detail": lambda i: anonymous.get(
+            reverse("product_detail", args=[rng.choice(product_ids)])
+        ),
+        "cart_add": cart_add,
+        "cart_increase": cart_increase,
+        "cart_decrease": cart_decrease,
+        "view_cart": lambda i: shopper.get(reverse("view_cart")),
+        "order_history": lambda i: member.get(reverse("order_history")),
+    }
+
+
+def run_benchmarks(iterations=200, warmup=20, only=None):
+    results = {}
+    # Every test client shares one address, which the cart limits would
+    # throttle long before the run ends.
+    with override_settings(RATE_LIMIT_ENABLED=False):
+        for name, request_fn in build_scenarios().items():
+            if only and name not in only:
+                continue
+            results[name] = measure(request_fn, iterations, warmup)
+    return results
+
+
+def _session_cookies(response, cookies):
+    for header in response.headers.get_all("Set-Cookie") or []:
+        parsed = SimpleCookie(header)
+        cookies.update({name: morsel.value for name, morsel in parsed.items()})
+
+
+def _http_worker(base_url, product_ids, deadline, durations, errors, seed):
+    """One keep-alive connection issuing the JSON endpoint mix until deadline."""
+    rng = random.Random(seed)
+    url = urlsplit(base_url)
+    connection_class = (
+        http.client.HTTPSConnection
+        if url.scheme == "https"
+        else http.client.HTTPConnection
+    )
+    conn = connection_class(url.netloc, timeout=30)
+    cookies = {}
+
+    def request(method, path):
+        headers = {"Cookie": "; ".join(f"{k}={v}" for k, v in cookies.items())}
+        if method == "POST":
+            headers["X-CSRFToken"] = cookies.get("csrftoken", "")
+            headers["Referer"] = base_url
+        start = time.perf_counter()
+        conn.request(method, url.path.rstrip("/") + path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - start
+        _session_cookies(response, cookies)
+        return response.status, elapsed
+
+    request("GET", "/login/")  # sets the csrftoken cookie
+    while time.perf_counter() < deadline:
+        product_id = rng.choice(product_ids)
+        for method, path in (
+            ("GET", "/cart/count/"),
+            ("POST", f"/cart/add/{product_id}/"),
+            ("POST", f"/cart/increase/{product_id}/"),
+            ("POST", f"/cart/decrease/{product_id}/"),
+            ("GET", f"/product/quick-view/{product_id}/"),
+        ):
+            status, elapsed = request(method, path)
+            durations.append(elapsed)
+            if status >= 400:
+                errors.append(status)
+    conn.close()
+
+
+def run_http_load(base_url, product_ids, connections=50, duration=10.0):
+    """Drive a running server with `connections` concurrent keep-alive clients.
+
+    Unlike run_benchmarks this goes over real sockets, so it measures what
+    the server mode (WSGI workers vs ASGI event loop) does under concurrency.
+    """
+    durations = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(
+            target=_http_worker,
+            args=(base_url, product_ids, deadline, durations, errors, seed),
+        )
+        for seed in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    result = summarize(durations)
+    result["throughput_rps"] = round(len(durations) / wall, 2) if wall else 0.0
+    result["connections"] = connections
+    result["errors"] = len(errors)
+    return result
+
+
+def synthetic_rules(count, product_ids, category_ids, rng):
+    """A mix of scoped, coupon, buy-X-get-Y and order-level rules."""
+    rules = []
+    for i in range(count):
+        slot = i % 10
+        kwargs = {}
+        if slot < 4:
+            kind = Promotion.PERCENT
+            kwargs["product_ids"] = rng.sample(product_ids, rng.randint(1, 5))
+        elif slot < 7:
+            kind = rng.choice([Promotion.PERCENT, Promotion.FLAT])
+            kwargs["category_ids"] = [rng.choice(category_ids)]
+        elif slot == 7:
+            kind = Promotion.PERCENT
+            kwargs["code"] = f"CODE{i}"
+            kwargs["category_ids"] = [rng.choice(category_ids)]
+        elif slot == 8:
+            kind = Promotion.BUY_X_GET_Y
+            kwargs["product_ids"] = rng.sample(product_ids, 3)
+        else:
+            kind = rng.choice([Promotion.PERCENT, Promotion.FLAT])
+            kwargs["min_subtotal"] = Decimal(rng.choice([0, 500, 1000]))
+        value = Decimal(rng.choice([5, 10, 15, 20]))
+        rules.append(Rule(i, f"Rule {i}", kind, value=value, buy=2, get=1, **kwargs))
+    return rules
+
+
+def run_promotions_benchmark(rules=100, lines=50, iterations=2000, seed=42):
+    """Time compiling `rules` promotions and pricing a `lines`-line cart."""
+    rng = random.Random(seed)
+    product_ids = list(range(1, 1001))
+    category_ids = list(range(1, 21))
+    rule_list = synthetic_rules(rules, product_ids, category_ids, rng)
+    # Carts are mostly made of promoted products, the expensive case.
+    promoted = [pid for rule in rule_list for pid in rule.product_ids]
+    cart = [
+        (
+            SimpleNamespace(
+                pk=pid,
+                category_id=rng.choice(category_ids),
+                product_price=Decimal(rng.randint(20, 500)),
+            ),
+            rng.randint(1, 6),
+        )
+        for pid in rng.sample(sorted(set(promoted)), min(lines, len(set(promoted))))
+    ]
+
+    start = time.perf_counter()
+    ruleset = RuleSet(rule_list)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    for _ in range(iterations // 10):
+        ruleset.price(cart, coupon="CODE7")
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        ruleset.price(cart, coupon="CODE7")
+        durations.append(time.perf_counter() - start)
+    result = summarize(durations)
+    result["rules"] = rules
+    result["lines"] = len(cart)
+    result["compile_ms"] = round(compile_ms, 3)
+    return result
@@ -1,31 +1,59 @@
-from decimal import Decimal
-
 from ecommerce.models import Product
+from ecommerce.utils import promotions
 
 
-def get_cart_items_and_total(cart):
-    items = []
-    total = Decimal("0.00")
-
-    product_ids = cart.keys()
-
-    products = Product.objects.filter(pk__in=product_ids)
-
+def price_cart(cart, coupon=None, now=None):
+    """Price the session cart with the current promotions (see PricedCart)."""
+    products = Product.objects.filter(pk__in=cart.keys())
     product_map = {str(p.pk): p for p in products}
-
-    for product_id, quantity in cart.items():
-        product = product_map.get(str(product_id))
-        if not product:
-            continue
-
-        item_total = Decimal(product.product_price) * quantity
-        items.append(
+    items = [
+        (product_map[str(product_id)], quantity)
+        for product_id, quantity in cart.items()
+        if str(product_id) in product_map
+    ]
+    return promotions.get_rules().price(items, coupon, now)
+
+
+def cart_totals(cart, coupon, product_id):
+    """Discounted totals for the JSON quantity endpoints.
+
+    Without promotions the line total is just price * quantity, which the
+    views already have, so this returns {} without querying.
+    """
+    if not promotions.get_rules():
+        return {}
+    pricing = price_cart(cart, coupon)
+    line = pricing.line_for(product_id)
+    return {
+        "item_total": float(line.item_total) if line else 0.0,
+        "cart_subtotal": float(pricing.subtotal),
+        "cart_discount": float(pricing.discount),
+        "cart_total": float(pricing.total),
+    }
+
+
+def checkout_line_items(pricing):
+    """Stripe line items charging exactly pricing.total.
+
+    Stripe has no negative lines, so each line carries its share of the
+    discounts; a line whose discounted total doesn't divide evenly by its
+    quantity is sent as a single item.
+    """
+    line_items = []
+    for line in pricing.lines:
+        amount = int(line.charged * 100)
+        name = line.product.product_name
+        quantity = line.quantity
+        if amount % quantity:
+            name, quantity = f"{name} × {quantity}", 1
+        line_items.append(
             {
-                "product": product,
-                "item_total": item_total,
+                "price_data": {
+                    "currency": "inr",
+                    "product_data": {"name": name},
+                    "unit_amount": amount // quantity,
+                },
                 "quantity": quantity,
             }
         )
-        total += item_total
-
-    return items, total
+    return line_items
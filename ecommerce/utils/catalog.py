@@ -0,0 +1,37 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = "catalog_version"
+
+
+def get_version(key):
+    """A number stored under `key` that changes whenever bump_version(key) runs.
+
+    Cache keys for derived data include it, so a bump invalidates them all
+    at once. It starts from the clock so an evicted key can never come back
+    as a version that was already used.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_version(key)
+        return cache.incr(key)
+
+
+def get_catalog_version():
+    """Changes whenever a product or category changes."""
+    return get_version(VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(VERSION_KEY)
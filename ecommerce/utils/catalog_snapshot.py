@@ -0,0 +1,218 @@
+"""Read-only binary snapshot of the catalog, shared by workers through mmap.
+
+Layout, in native byte order since the file is only shared by workers on one
+host: a fixed header, then fixed-width arrays indexed by row (id order)::
+
+    ids          int64[n]
+    category_ids int64[n]
+    price_cents  int64[n]
+    by_price     uint32[n]    row numbers sorted by (price, id)
+    by_name      uint32[n]    row numbers sorted by (name, id)
+    text_offsets uint32[n+1]  into `text`
+    text         bytes        per row: lowercased "name\\x1fcategory" (UTF-8)
+
+The header records the catalog version the snapshot was built from; readers
+only use a snapshot whose version is current, and fall back to the database
+otherwise. Writers build into a temporary file and os.replace() it over the
+old one, so a reader either sees the old complete file or the new one, and
+mappings opened on the old file stay valid until they are closed.
+"""
+
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+
+from django.conf import settings
+
+from ecommerce.models import Product
+from ecommerce.utils import metrics
+from ecommerce.utils.catalog import get_catalog_version
+from ecommerce.utils.facets import price_buckets
+
+MAGIC = b"MSCS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("=4sIQII")
+
+
+def snapshot_path():
+    return getattr(settings, "CATALOG_SNAPSHOT_PATH", "")
+
+
+def _cents(value):
+    return int(value * 100)
+
+
+def _typed(typecode, values):
+    return array(typecode, values).tobytes()
+
+
+def build_snapshot(path=None):
+    """Write a snapshot of the current catalog to `path`. Returns the row count."""
+    path = path or snapshot_path()
+    version = get_catalog_version()
+    rows = list(
+        Product.objects.order_by("id").values_list(
+            "id", "category_id", "product_price", "product_name", "category__choice"
+        )
+    )
+    n = len(rows)
+    by_price = sorted(range(n), key=lambda i: (rows[i][2], rows[i][0]))
+    by_name = sorted(range(n), key=lambda i: (rows[i][3], rows[i][0]))
+    text = bytearray()
+    offsets = [0]
+    for row in rows:
+        text += f"{row[3]}\x1f{row[4] or ''}".lower().encode()
+        offsets.append(len(text))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, version, n, len(text)))
+            f.write(_typed("q", [row[0] for row in rows]))
+            f.write(_typed("q", [row[1] for row in rows]))
+            f.write(_typed("q", [_cents(row[2]) for row in rows]))
+            f.write(_typed("I", by_price))
+            f.write(_typed("I", by_name))
+            f.write(_typed("I", offsets))
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return n
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.version, n, _ = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a catalog snapshot.")
+        self.count = n
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def take(typecode, length):
+            nonlocal offset
+            size = struct.calcsize(typecode) * length
+            part = view[offset : offset + size].cast(typecode)
+            offset += size
+            return part
+
+        self.ids = take("q", n)
+        self.category_ids = take("q", n)
+        self.price_cents = take("q", n)
+        self.by_price = take("I", n)
+        self.by_name = take("I", n)
+        self.text_offsets = take("I", n + 1)
+        self._text_start = offset
+
+    def _order(self, sort_by):
+        if sort_by == "price_asc":
+            return self.by_price
+        if sort_by == "price_desc":
+            return reversed(self.by_price)
+        if sort_by == "name_asc":
+            return self.by_name
+        if sort_by == "newest":
+            return range(self.count - 1, -1, -1)
+        return range(self.count)
+
+    def _price_ranges(self, filters):
+        ranges = [
+            (_cents(b["min"]), math.inf if b["max"] is None else _cents(b["max"]))
+            for b in price_buckets()
+            if b["key"] in filters["prices"]
+        ]
+        low = filters["min_price"]
+        high = filters["max_price"]
+        low = -math.inf if low is None else math.ceil(low * 100)
+        # max_price is inclusive; the bucket upper bounds are exclusive.
+        high = math.inf if high is None else math.floor(high * 100) + 1
+        return ranges, low, high
+
+    def query(self, filters, sort_by):
+        """Ordered product ids matching `filters`, like facets.apply_filters."""
+        categories = set(filters["categories"])
+        ranges, low, high = self._price_ranges(filters)
+        term = filters["search"].encode()
+        text, start, offsets = self._mmap, self._text_start, self.text_offsets
+        ids, category_ids, prices = self.ids, self.category_ids, self.price_cents
+        result = []
+        for i in self._order(sort_by):
+            if categories and category_ids[i] not in categories:
+                continue
+            price = prices[i]
+            if not low <= price < high:
+                continue
+            if ranges and not any(lo <= price < hi for lo, hi in ranges):
+                continue
+            if term and text.find(term, start + offsets[i], start + offsets[i + 1]) < 0:
+                continue
+            result.append(ids[i])
+        return result
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def current_snapshot():
+    """This process's mapping of the snapshot file, reopened after a swap."""
+    global _current
+    path = snapshot_path()
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    identity = (stat.st_ino, stat.st_mtime_ns)
+    snapshot = _current
+    if snapshot is None or snapshot.identity != identity:
+        with _lock:
+            if _current is None or _current.identity != identity:
+                # The previous mapping is left for the GC: pages handed out
+                # by memoryview keep it alive while a request still uses it.
+                _current = Snapshot(path)
+            snapshot = _current
+    return snapshot
+
+
+def query(filters, sort_by):
+    """Ids from the shared snapshot, or None when it is missing or stale."""
+    snapshot = current_snapshot()
+    usable = snapshot is not None and snapshot.version == get_catalog_version()
+    metrics.record_cache("catalog_snapshot", usable)
+    return snapshot.query(filters, sort_by) if usable else None
+
+
+def refresh():
+    """Rebuild the snapshot unless it already matches the catalog version."""
+    if not snapshot_path():
+        return 0
+    snapshot = current_snapshot()
+    if snapshot is not None and snapshot.version == get_catalog_version():
+        return 0
+    return build_snapshot()
+
+
+def schedule_refresh():
+    """Queue a rebuild after a catalog change, if snapshots are enabled."""
+    if snapshot_path():
+        from ecommerce import tasks  # tasks imports this module
+
+        tasks.refresh_catalog_snapshot.delay()
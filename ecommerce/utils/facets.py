@@ -0,0 +1,163 @@
+"""Category and price-range filters for the product listing, with counts.
+
+Facet counts for every category and price bucket come from one grouped
+query over (category, price bucket). Each facet's count applies the other
+facet's selection, so ticking a category still shows how many products
+every other category would add. The grouped rows depend only on the search
+term, so they are cached per (catalog version, search term).
+"""
+
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from ecommerce.models import Product
+from ecommerce.utils import metrics
+from ecommerce.utils.catalog import get_catalog_version
+
+
+# Stands in for categories that don't exist; no product has it (the
+# category is required), and Django drops it from IN lists.
+UNKNOWN_CATEGORY = None
+
+
+def price_buckets():
+    """[{"key": "100-250", "label": ..., "min": 100, "max": 250}, ...]"""
+    edges = getattr(settings, "PRICE_FACET_BUCKETS", [100, 250, 500, 1000])
+    buckets = []
+    low = 0
+    for edge in edges:
+        label = f"Under ₹{edge}" if not low else f"₹{low} – ₹{edge}"
+        buckets.append(
+            {"key": f"{low}-{edge}", "label": label, "min": low, "max": edge}
+        )
+        low = edge
+    buckets.append(
+        {"key": f"{low}+", "label": f"₹{low} & above", "min": low, "max": None}
+    )
+    return buckets
+
+
+def normalize_search(term):
+    """Lowercase, trim and collapse whitespace between tokens."""
+    return " ".join((term or "").lower().split())
+
+
+def _to_decimal(value):
+    try:
+        number = Decimal(value) if value not in (None, "") else None
+    except InvalidOperation:
+        return None
+    return number if number is not None and number.is_finite() else None
+
+
+def parse_filters(params, categories):
+    """Normalize GET params. Categories may be given by id, slug or name."""
+    lookup = {}
+    for category in categories:
+        lookup[str(category.pk)] = lookup[category.slug] = category.pk
+        lookup[category.choice.lower()] = category.pk
+    values = [value.lower() for value in params.getlist("category") if value]
+    category_ids = sorted({lookup[value] for value in values if value in lookup})
+    if values and not category_ids:
+        # Only unknown categories asked for: list nothing, not everything.
+        category_ids = [UNKNOWN_CATEGORY]
+    bucket_keys = [bucket["key"] for bucket in price_buckets()]
+    prices = [key for key in bucket_keys if key in params.getlist("price")]
+    return {
+        "categories": category_ids,
+        "prices": prices,
+        "min_price": _to_decimal(params.get("min_price")),
+        "max_price": _to_decimal(params.get("max_price")),
+        "search": normalize_search(params.get("search")),
+    }
+
+
+def search_filter(queryset, term):
+    if not term:
+        return queryset
+    return queryset.filter(
+        Q(product_name__icontains=term)
+        | Q(product_name__istartswith=term)
+        | Q(category__choice__icontains=term)
+    )
+
+
+def _price_q(bucket):
+    q = Q(product_price__gte=bucket["min"])
+    if bucket["max"] is not None:
+        q &= Q(product_price__lt=bucket["max"])
+    return q
+
+
+def apply_filters(queryset, filters):
+    """Apply category ids and price ranges as sargable (category, price) filters."""
+    queryset = search_filter(queryset, filters["search"])
+    if filters["categories"]:
+        queryset = queryset.filter(category_id__in=filters["categories"])
+    if filters["prices"]:
+        q = Q()
+        for bucket in price_buckets():
+            if bucket["key"] in filters["prices"]:
+                q |= _price_q(bucket)
+        queryset = queryset.filter(q)
+    if filters["min_price"] is not None:
+        queryset = queryset.filter(product_price__gte=filters["min_price"])
+    if filters["max_price"] is not None:
+        queryset = queryset.filter(product_price__lte=filters["max_price"])
+    return queryset
+
+
+def _bucket_expression(buckets):
+    return Case(
+        *[
+            When(product_price__lt=bucket["max"], then=Value(i))
+            for i, bucket in enumerate(buckets)
+            if bucket["max"] is not None
+        ],
+        default=Value(len(buckets) - 1),
+        output_field=IntegerField(),
+    )
+
+
+def _grouped_counts(search, buckets):
+    """{(category_id, bucket_index): count}, one grouped query on a miss."""
+    digest = hashlib.sha1(search.encode()).hexdigest()
+    key = f"facets:{get_catalog_version()}:{digest}"
+    counts = cache.get(key)
+    metrics.record_cache("facets", counts is not None)
+    if counts is None:
+        rows = (
+            search_filter(Product.objects.all(), search)
+            .annotate(bucket=_bucket_expression(buckets))
+            .values("category_id", "bucket")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        counts = {(row["category_id"], row["bucket"]): row["n"] for row in rows}
+        cache.set(key, counts, getattr(settings, "FACET_CACHE_TIMEOUT", 600))
+    return counts
+
+
+def facet_counts(filters):
+    """Return ({category_id: count}, {bucket_key: count}) for the filters.
+
+    min_price/max_price are free-form and not reflected in the counts.
+    """
+    buckets = price_buckets()
+    counts = _grouped_counts(filters["search"], buckets)
+    selected_buckets = {
+        i for i, bucket in enumerate(buckets) if bucket["key"] in filters["prices"]
+    }
+    selected_categories = set(filters["categories"])
+    by_category = {}
+    by_price = {bucket["key"]: 0 for bucket in buckets}
+    for (category_id, bucket), n in counts.items():
+        if not selected_buckets or bucket in selected_buckets:
+            by_category[category_id] = by_category.get(category_id, 0) + n
+        if not selected_categories or category_id in selected_categories:
+            by_price[buckets[bucket]["key"]] += n
+    return by_category, by_price
@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models import Sum
+
+from ecommerce.models import Order, OrderItem, OrderStatusEvent
+from ecommerce.utils import inventory
+
+# status -> statuses it may move to
+TRANSITIONS = {
+    "pending": {"processing", "cancelled"},
+    "processing": {"shipped", "cancelled"},
+    "shipped": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+
+# statuses whose orders have already taken their units out of stock
+# (payment_success commits stock as it creates the order as "processing")
+STOCK_COMMITTED = {"processing", "shipped", "delivered"}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def sources_for(to_status):
+    """Statuses an order may be in to move to `to_status`."""
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown order status {to_status!r}")
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def _restock(order_ids):
+    inventory.restock(
+        dict(
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .values("product_id")
+            .annotate(units=Sum("quantity"))
+            .values_list("product_id", "units")
+        )
+    )
+
+
+def _transition_batch(order_ids, to_status, changed_by):
+    with transaction.atomic():
+        current = dict(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status__in=sources_for(to_status))
+            .values_list("pk", "status")
+        )
+        if not current:
+            return 0
+        Order.objects.filter(pk__in=current).update(status=to_status)
+        paid = [pk for pk, status in current.items() if status in STOCK_COMMITTED]
+        if to_status == "cancelled" and paid:
+            _restock(paid)
+        OrderStatusEvent.objects.bulk_create(
+            [
+                OrderStatusEvent(
+                    order_id=pk,
+                    from_status=from_status,
+                    to_status=to_status,
+                    changed_by=changed_by,
+                )
+                for pk, from_status in current.items()
+            ]
+        )
+    return len(current)
+
+
+def bulk_transition(orders, to_status, changed_by=None, batch_size=1000):
+    """Move every order that is allowed to reach `to_status` there.
+
+    `orders` is a queryset or an iterable of ids. Each batch is one locking
+    SELECT, one UPDATE and one bulk INSERT of audit rows (plus, when
+    cancelling paid orders, one query and one UPDATE to restock their
+    items); orders whose current status does not allow the move are
+    skipped. Returns how many orders moved.
+    """
+    if hasattr(orders, "values_list"):
+        orders = (
+            orders.filter(status__in=sources_for(to_status))
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+    moved = 0
+    batch = []
+    for pk in orders:
+        batch.append(pk)
+        if len(batch) == batch_size:
+            moved += _transition_batch(batch, to_status, changed_by)
+            batch = []
+    if batch:
+        moved += _transition_batch(batch, to_status, changed_by)
+    return moved
+
+
+def transition(order, to_status, changed_by=None):
+    """Move a single order, raising InvalidTransition if it is not allowed."""
+    if to_status not in TRANSITIONS.get(order.status, ()):
+        raise InvalidTransition(
+            f"Order #{order.pk} cannot go from {order.status} to {to_status}"
+        )
+    if not _transition_batch([order.pk], to_status, changed_by):
+        raise InvalidTransition(f"Order #{order.pk} changed status concurrently")
+    order.status = to_status
+
+
+def queue(status, limit=100):
+    """Oldest orders in a status; served by the (status, created_at) index."""
+    return Order.objects.filter(status=status).order_by("created_at")[:limit]
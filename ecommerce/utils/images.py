@@ -0,0 +1,60 @@
+"""Product photo blobs: one ImageBlob per distinct stored image.
+
+Photos are saved through ecommerce.storage.ContentAddressedStorage, so the
+file name carries the SHA-256 of the bytes. The blob row for a hash is
+created the first time it is seen, which is the only time the image is
+opened to read its dimensions and format; later products with the same
+picture just reference it.
+"""
+
+from PIL import Image, UnidentifiedImageError
+
+from ecommerce.models import ImageBlob
+from ecommerce.storage import ContentAddressedStorage, product_photo_storage
+
+
+def blob_for_name(name):
+    """The ImageBlob for a content-addressed name, created on first use.
+
+    Returns None for legacy (pre content-addressing) names; see
+    ``manage.py dedupe_product_images``.
+    """
+    digest = ContentAddressedStorage.digest_of(name)
+    if digest is None:
+        return None
+    blob = ImageBlob.objects.filter(sha256=digest).first()
+    if blob is not None:
+        return blob
+    storage = product_photo_storage()
+    if not storage.exists(name):
+        return None
+    width = height = None
+    image_format = ""
+    with storage.open(name) as f:
+        try:
+            with Image.open(f) as image:
+                width, height = image.size
+                image_format = image.format or ""
+        except UnidentifiedImageError:
+            pass
+    blob, _ = ImageBlob.objects.get_or_create(
+        sha256=digest,
+        defaults={
+            "name": name,
+            "size": storage.size(name),
+            "width": width,
+            "height": height,
+            "format": image_format,
+        },
+    )
+    return blob
+
+
+def link_blob(product):
+    """Point product.photo_blob at the blob of its current photo."""
+    name = product.product_photo.name if product.product_photo else ""
+    digest = ContentAddressedStorage.digest_of(name)
+    if digest is None:
+        product.photo_blob = None
+    elif product.photo_blob_id is None or product.photo_blob.sha256 != digest:
+        product.photo_blob = blob_for_name(name)
@@ -0,0 +1,150 @@
+import secrets
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from ecommerce.models import Product, StockReservation
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(f"Not enough stock for products {self.product_ids}")
+
+
+def _ttl():
+    return getattr(settings, "STOCK_RESERVATION_TTL", 30 * 60)
+
+
+def _per_product(quantities):
+    """CASE expression giving each product's quantity inside one UPDATE."""
+    return Case(
+        *[When(pk=pid, then=Value(qty)) for pid, qty in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _cart_quantities(cart):
+    return {int(pid): int(qty) for pid, qty in cart.items() if int(qty) > 0}
+
+
+def _take_available(quantities, field):
+    """Atomically move units out of free stock into `field`.
+
+    Free stock is stock - reserved. The WHERE clause makes this a single
+    conditional UPDATE, so concurrent checkouts can never oversell; untracked
+    products (stock is null) are ignored. Returns the tracked quantities;
+    raises OutOfStock when any tracked product is short, leaving the
+    caller's transaction to roll back.
+    """
+    tracked = set(
+        Product.objects.filter(pk__in=quantities, stock__isnull=False).values_list(
+            "pk", flat=True
+        )
+    )
+    quantities = {pid: qty for pid, qty in quantities.items() if pid in tracked}
+    if not quantities:
+        return quantities
+    amount = _per_product(quantities)
+    if field == "reserved":
+        changes = {"reserved": F("reserved") + amount}
+    else:
+        changes = {"stock": F("stock") - amount}
+    updated = Product.objects.filter(
+        pk__in=quantities, stock__gte=F("reserved") + amount
+    ).update(**changes)
+    if updated != len(quantities):
+        short = Product.objects.filter(pk__in=quantities).exclude(
+            stock__gte=F("reserved") + amount
+        )
+        raise OutOfStock(short.values_list("pk", flat=True))
+    return quantities
+
+
+def _release(reservations):
+    """Give reserved units back and delete the reservation rows."""
+    if not reservations:
+        return
+    quantities = Counter()
+    for reservation in reservations:
+        quantities[reservation.product_id] += reservation.quantity
+    Product.objects.filter(pk__in=quantities).update(
+        reserved=F("reserved") - _per_product(quantities)
+    )
+    StockReservation.objects.filter(
+        pk__in=[reservation.pk for reservation in reservations]
+    ).delete()
+
+
+def reserve(cart, token=None):
+    """Hold stock for a cart and return the reservation token.
+
+    Any earlier reservation under the same token is replaced.
+    """
+    token = token or secrets.token_urlsafe(24)
+    quantities = _cart_quantities(cart)
+    with transaction.atomic():
+        release(token)
+        release_expired(product_ids=quantities)
+        quantities = _take_available(quantities, "reserved")
+        expires_at = timezone.now() + timedelta(seconds=_ttl())
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(
+                    token=token, product_id=pid, quantity=qty, expires_at=expires_at
+                )
+                for pid, qty in quantities.items()
+            ]
+        )
+    return token
+
+
+def release(token):
+    with transaction.atomic():
+        _release(list(StockReservation.objects.select_for_update().filter(token=token)))
+
+
+def commit(cart, token=None):
+    """Turn a checkout's reservation into a real stock decrement.
+
+    Must run inside the caller's transaction so a shortfall also rolls back
+    the order. If the reservation already expired the units are taken from
+    free stock instead, which fails if someone else got them first.
+    """
+    quantities = _cart_quantities(cart)
+    if token:
+        release(token)
+    release_expired(product_ids=quantities)
+    _take_available(quantities, "stock")
+
+
+def restock(quantities):
+    """Put units of cancelled orders back into stock; {product_id: quantity}."""
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities, stock__isnull=False).update(
+        stock=F("stock") + _per_product(quantities)
+    )
+
+
+def release_expired(now=None, product_ids=None):
+    """Release every reservation past its expiry. Returns rows released.
+
+    reserve() and commit() call this for the products they are about to
+    take, so abandoned checkouts stop holding stock even when the
+    release_expired_reservations command is not scheduled.
+    """
+    expired = StockReservation.objects.select_for_update(skip_locked=True).filter(
+        expires_at__lte=now or timezone.now()
+    )
+    if product_ids is not None:
+        expired = expired.filter(product_id__in=product_ids)
+    with transaction.atomic():
+        expired = list(expired)
+        _release(expired)
+    return len(expired)
@@ -0,0 +1,365 @@
+"""Small in-process metrics registry rendered in the Prometheus text format.
+
+Counters and histograms live in process memory behind one lock. When
+METRICS_MULTIPROC_DIR is set, every process (gunicorn worker) periodically
+dumps its values to ``<dir>/metrics-<pid>.json`` and the /metrics endpoint
+merges all files, so totals cover every worker. Clear the directory on deploy.
+"""
+
+import atexit
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from ecommerce.utils.query_metrics import QueryCollector
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+    def dump(self):
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def merge(self, values, dumped):
+        for key, value in dumped:
+            key = tuple(key)
+            values[key] = values.get(key, 0) + value
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+        self.registry.maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def dump(self):
+        return [[list(key), _copy(state)] for key, state in self.values.items()]
+
+    def merge(self, values, dumped):
+        for key, (counts, total, count) in dumped:
+            key = tuple(key)
+            state = values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            state[0] = [a + b for a, b in zip(state[0], counts)]
+            state[1] += total
+            state[2] += count
+
+    def render(self, values):
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", bound)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self._last_flush = 0.0
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(self, name, documentation, labelnames)
+        self.metrics[name] = metric
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self.metrics[name] = metric
+        return metric
+
+    def multiproc_dir(self):
+        return getattr(settings, "METRICS_MULTIPROC_DIR", None)
+
+    def maybe_flush(self):
+        if not self.multiproc_dir():
+            return
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        directory = self.multiproc_dir()
+        if not directory:
+            return
+        self._last_flush = time.monotonic()
+        with self.lock:
+            data = {name: metric.dump() for name, metric in self.metrics.items()}
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Return {name: values} merged across processes when configured."""
+        directory = self.multiproc_dir()
+        if not directory:
+            with self.lock:
+                return {
+                    name: {key: _copy(v) for key, v in metric.values.items()}
+                    for name, metric in self.metrics.items()
+                }
+        self.flush()
+        merged = {name: {} for name in self.metrics}
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, dumped in data.items():
+                metric = self.metrics.get(name)
+                if metric is not None:
+                    metric.merge(merged[name], dumped)
+        return merged
+
+    def render(self):
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+def _copy(value):
+    if isinstance(value, list):
+        return [list(value[0]), value[1], value[2]]
+    return value
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+VIEW_LATENCY = registry.histogram(
+    "myshop_view_latency_seconds", "Wall time spent in a view.", ["view", "method"]
+)
+VIEW_RESPONSES = registry.counter(
+    "myshop_view_responses_total", "Responses by view and status.", ["view", "status"]
+)
+VIEW_DB_TIME = registry.histogram(
+    "myshop_view_db_seconds", "Database time spent in a view.", ["view"]
+)
+CACHE_REQUESTS = registry.counter(
+    "myshop_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss).",
+    ["cache", "result"],
+)
+CART_OPERATIONS = registry.counter(
+    "myshop_cart_operations_total", "Cart mutations.", ["operation"]
+)
+CHECKOUT_OUTCOMES = registry.counter(
+    "myshop_checkout_total", "Checkout steps by outcome.", ["step", "outcome"]
+)
+STRIPE_LATENCY = registry.histogram(
+    "myshop_stripe_request_seconds", "Latency of Stripe API calls.", ["operation"]
+)
+RATE_LIMITED = registry.counter(
+    "myshop_rate_limited_total", "Requests rejected by rate limiting.", ["scope"]
+)
+TASK_RUNS = registry.counter(
+    "myshop_task_runs_total", "Background task runs by outcome.", ["task", "outcome"]
+)
+SAMPLED_QUERIES = registry.histogram(
+    "myshop_sampled_request_queries",
+    "Queries per request, for requests sampled by QueryMetricsMiddleware.",
+    ["view"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250),
+)
+SAMPLED_DB_TIME = registry.histogram(
+    "myshop_sampled_request_db_seconds",
+    "Database time per request, for requests sampled by QueryMetricsMiddleware.",
+    ["view"],
+)
+
+
+def record_cache(cache_name, hit):
+    CACHE_REQUESTS.inc(cache=cache_name, result="hit" if hit else "miss")
+
+
+def record_query_sample(view_name, collector):
+    SAMPLED_QUERIES.observe(collector.count, view=view_name)
+    SAMPLED_DB_TIME.observe(collector.duration, view=view_name)
+
+
+def _view_name(request, func):
+    match = getattr(request, "resolver_match", None)
+    if match is not None and match.url_name:
+        return match.url_name
+    return func.__name__
+
+
+def instrument_view(view_func):
+    """Record latency, DB time and response status for a view.
+
+    Async views run their queries on executor threads the collector cannot
+    see, so only latency and status are recorded for them.
+    """
+
+    if iscoroutinefunction(view_func):
+
+        @functools.wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            name = _view_name(request, view_func)
+            start = time.perf_counter()
+            response = await view_func(request, *args, **kwargs)
+            VIEW_LATENCY.observe(
+                time.perf_counter() - start, view=name, method=request.method
+            )
+            VIEW_RESPONSES.inc(view=name, status=response.status_code)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        name = _view_name(request, view_func)
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with collector.capture(request):
+            response = view_func(request, *args, **kwargs)
+        VIEW_LATENCY.observe(
+            time.perf_counter() - start, view=name, method=request.method
+        )
+        VIEW_DB_TIME.observe(collector.duration, view=name)
+        VIEW_RESPONSES.inc(view=name, status=response.status_code)
+        return response
+
+    return wrapper
+
+
+def count_cart_operation(operation):
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+
+            @functools.wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                response = await view_func(request, *args, **kwargs)
+                if response.status_code < 400:
+                    CART_OPERATIONS.inc(operation=operation)
+                return response
+
+            return async_wrapper
+
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            if response.status_code < 400:
+                CART_OPERATIONS.inc(operation=operation)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _response_outcome(response):
+    if response.status_code < 300:
+        return "ok"
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    location = urlparse(response.get("Location", ""))
+    if location.netloc:
+        return "redirect_external"
+    try:
+        return f"redirect_{resolve(location.path).url_name}"
+    except Resolver404:
+        return "redirect"
+
+
+def track_checkout(step):
+    """Count checkout attempts per step, classified by the response."""
+
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            CHECKOUT_OUTCOMES.inc(step=step, outcome=_response_outcome(response))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,94 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from ecommerce.utils.query_metrics import QueryCollector
+
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*%s\s*,?)+\)", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class PerformanceBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Reduce a statement to its shape so repeated lookups compare equal."""
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+class ShapeCollector(QueryCollector):
+    """QueryCollector that also counts statements per SQL shape."""
+
+    def __init__(self):
+        super().__init__()
+        self.shapes = Counter()
+        self.examples = {}
+
+    def add(self, sql, elapsed):
+        shape = fingerprint(sql)
+        self.shapes[shape] += 1
+        self.examples.setdefault(shape, sql)
+        super().add(sql, elapsed)
+
+    def repeated_shapes(self, threshold):
+        return [
+            (self.examples[shape], count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+def get_n_plus_one_threshold():
+    return getattr(settings, "N_PLUS_ONE_THRESHOLD", 5)
+
+
+def get_budget(view_name):
+    budgets = getattr(settings, "PERFORMANCE_BUDGETS", {})
+    return budgets.get(view_name, budgets.get("default", {}))
+
+
+def check_budget(view_name, collector, elapsed):
+    """Return a list of human readable violations for one request."""
+    problems = []
+    budget = get_budget(view_name)
+    max_queries = budget.get("queries")
+    if max_queries is not None and collector.count > max_queries:
+        problems.append(
+            f"{view_name}: {collector.count} queries (budget {max_queries})"
+        )
+    max_ms = budget.get("time_ms")
+    if max_ms is not None and elapsed * 1000 > max_ms:
+        problems.append(f"{view_name}: {elapsed * 1000:.1f}ms (budget {max_ms}ms)")
+    for sql, count in collector.repeated_shapes(get_n_plus_one_threshold()):
+        problems.append(f"{view_name}: possible N+1, {count}x {sql}")
+    return problems
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, n_plus_one_threshold=None):
+    """Test helper: fail if the block exceeds max_queries or repeats a query.
+
+    with assert_query_budget(max_queries=5):
+        self.client.get(reverse("order_history"))
+    """
+    if n_plus_one_threshold is None:
+        n_plus_one_threshold = get_n_plus_one_threshold()
+    collector = ShapeCollector()
+    with collector.capture():
+        yield collector
+
+    problems = []
+    if max_queries is not None and collector.count > max_queries:
+        problems.append(f"{collector.count} queries, expected at most {max_queries}")
+    for sql, count in collector.repeated_shapes(n_plus_one_threshold):
+        problems.append(f"possible N+1, {count}x {sql}")
+    if problems:
+        raise AssertionError("\n".join(problems))
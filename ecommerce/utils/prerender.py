@@ -0,0 +1,185 @@
+"""Pre-rendered HTML for the anonymous product and category listing pages.
+
+Logged-out visitors all see the same markup for these pages, so they are
+rendered ahead of time into PRERENDER_ROOT and served from there by
+ecommerce.middleware.PrerenderedPageMiddleware. Files are laid out as::
+
+    product/<id>.html      ProductDetailView
+    listing/all.html              ProductListView, no filters
+    listing/category/<slug>.html  ProductListView, ?category=<slug>
+
+CSRF tokens are rendered as CSRF_PLACEHOLDER and replaced with the
+visitor's own token when the page is served.
+"""
+
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve, reverse
+
+from ecommerce.models import Category, Product
+
+CSRF_PLACEHOLDER = "__prerendered_csrf_token__"
+SLUG = re.compile(r"[-\w]+")
+CSRF_INPUT = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def prerender_root():
+    return getattr(settings, "PRERENDER_ROOT", "")
+
+
+def product_file(product_id):
+    return os.path.join("product", f"{product_id}.html")
+
+
+def listing_file(slug=None):
+    if slug is None:
+        return os.path.join("listing", "all.html")
+    return os.path.join("listing", "category", f"{slug}.html")
+
+
+def render_page(path, params=None):
+    """Render `path` for an anonymous visitor without going through middleware."""
+    request = RequestFactory().get(path, params or {})
+    request.user = AnonymousUser()
+    # A session that is never saved: views may read the (empty) cart.
+    request.session = SessionStore()
+    match = resolve(request.path_info)
+    request.resolver_match = match
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, "render"):
+        response.render()
+    if response.status_code != 200:
+        return None
+    html = response.content.decode(response.charset)
+    return CSRF_INPUT.sub(rf"\g<1>{CSRF_PLACEHOLDER}\g<2>", html)
+
+
+def _write(relative_path, html):
+    path = os.path.join(prerender_root(), relative_path)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".prerender-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _remove(relative_path):
+    try:
+        os.remove(os.path.join(prerender_root(), relative_path))
+    except FileNotFoundError:
+        pass
+
+
+def render_products(product_ids):
+    """(Re)write the pages of `product_ids`, removing those of deleted products."""
+    existing = set(
+        Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+    )
+    for product_id in product_ids:
+        html = None
+        if product_id in existing:
+            html = render_page(reverse("product_detail", args=[product_id]))
+        if html is None:
+            _remove(product_file(product_id))
+        else:
+            _write(product_file(product_id), html)
+    return len(existing)
+
+
+def render_listings():
+    """Rewrite every category listing; facet counts on each span all categories."""
+    slugs = list(Category.objects.values_list("slug", flat=True))
+    _write(listing_file(), render_page(reverse("detail")))
+    for slug in slugs:
+        _write(listing_file(slug), render_page(reverse("detail"), {"category": slug}))
+    category_dir = os.path.join(prerender_root(), "listing", "category")
+    wanted = {f"{slug}.html" for slug in slugs}
+    for name in os.listdir(category_dir) if os.path.isdir(category_dir) else ():
+        if name.endswith(".html") and name not in wanted:
+            os.remove(os.path.join(category_dir, name))
+    return len(slugs) + 1
+
+
+def _init_worker():
+    django.setup()
+
+
+def render_all(workers=None, chunk_size=200):
+    """Render every page, spreading product pages over a process pool.
+
+    Returns (product pages, listing pages).
+    """
+    product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+    chunks = [
+        product_ids[i : i + chunk_size] for i in range(0, len(product_ids), chunk_size)
+    ]
+    if workers == 1 or len(chunks) <= 1:
+        rendered = sum(render_products(chunk) for chunk in chunks)
+    else:
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            rendered = sum(pool.map(render_products, chunks))
+    _prune_products(set(product_ids))
+    return rendered, render_listings()
+
+
+def _prune_products(product_ids):
+    product_dir = os.path.join(prerender_root(), "product")
+    if not os.path.isdir(product_dir):
+        return
+    for name in os.listdir(product_dir):
+        stem, ext = os.path.splitext(name)
+        if ext == ".html" and stem.isdigit() and int(stem) not in product_ids:
+            os.remove(os.path.join(product_dir, name))
+
+
+def refresh(product_ids=(), listings=True):
+    """Incremental rebuild after a catalog change (see ecommerce.tasks)."""
+    if not prerender_root():
+        return
+    if product_ids:
+        render_products(list(product_ids))
+    if listings:
+        render_listings()
+
+
+def schedule_refresh(product_ids=(), listings=True):
+    """Queue an incremental rebuild, if pre-rendering is enabled."""
+    if prerender_root():
+        from ecommerce import tasks  # tasks imports this module
+
+        tasks.refresh_prerendered_pages.delay(list(product_ids), listings)
+
+
+def lookup(path, params):
+    """Relative file for an anonymous GET of `path`, or None if not pre-rendered."""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if match.url_name == "product_detail" and not params:
+        return product_file(match.kwargs["product_id"])
+    if match.url_name == "detail":
+        if not params:
+            return listing_file()
+        categories = params.getlist("category")
+        if list(params) == ["category"] and len(categories) == 1:
+            if SLUG.fullmatch(categories[0]):
+                return listing_file(categories[0])
+    return None
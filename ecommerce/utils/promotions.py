@@ -0,0 +1,308 @@
+"""Promotions compiled into an in-memory rule index and applied in one pass.
+
+get_rules() loads the active Promotion rows once per process, and again
+after any promotion changes (PROMOTIONS_VERSION_KEY is bumped by
+ecommerce.signals), into a RuleSet indexed by product id and category id.
+RuleSet.price() walks the cart lines once and only looks at the rules
+indexed under each line's product and category plus the few unscoped ones,
+so pricing a cart does not get slower as promotions are added.
+
+Stacking: each line gets the single best line rule it qualifies for, then
+the best order-level rule (an unscoped percentage or flat discount) applies
+to what is left. Coupon rules only count when their code was entered.
+"""
+
+import time
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from ecommerce.models import Promotion
+from ecommerce.utils.catalog import bump_version, get_version
+
+PROMOTIONS_VERSION_KEY = "promotions_version"
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+
+def _money(amount):
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class Rule:
+    """A compiled Promotion: plain attributes, no database access."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "kind",
+        "value",
+        "buy",
+        "get",
+        "min_subtotal",
+        "code",
+        "starts_at",
+        "ends_at",
+        "product_ids",
+        "category_ids",
+    )
+
+    def __init__(
+        self,
+        id,
+        name,
+        kind,
+        value=ZERO,
+        buy=0,
+        get=0,
+        min_subtotal=ZERO,
+        code="",
+        starts_at=None,
+        ends_at=None,
+        product_ids=(),
+        category_ids=(),
+    ):
+        self.id = id
+        self.name = name
+        self.kind = kind
+        self.value = Decimal(value)
+        self.buy = buy
+        self.get = get
+        self.min_subtotal = Decimal(min_subtotal)
+        self.code = code
+        self.starts_at = starts_at
+        self.ends_at = ends_at
+        self.product_ids = tuple(product_ids)
+        self.category_ids = tuple(category_ids)
+
+    def live(self, now):
+        return (self.starts_at is None or self.starts_at <= now) and (
+            self.ends_at is None or now < self.ends_at
+        )
+
+    def applies(self, now, subtotal, coupon):
+        return (
+            (not self.code or self.code == coupon)
+            and subtotal >= self.min_subtotal
+            and self.live(now)
+        )
+
+    def line_discount(self, unit_price, quantity):
+        if self.kind == Promotion.PERCENT:
+            return unit_price * quantity * self.value / 100
+        if self.kind == Promotion.FLAT:
+            return min(self.value, unit_price) * quantity
+        group = self.buy + self.get
+        return quantity // group * self.get * unit_price if group else ZERO
+
+    def order_discount(self, amount):
+        if self.kind == Promotion.PERCENT:
+            return amount * self.value / 100
+        return self.value
+
+
+class PricedLine:
+    __slots__ = (
+        "product",
+        "quantity",
+        "unit_price",
+        "subtotal",
+        "discount",
+        "promotion",
+        "item_total",
+        "charged",
+    )
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        self.unit_price = product.product_price
+        self.subtotal = self.item_total = self.charged = self.unit_price * quantity
+        self.discount = ZERO
+        self.promotion = None
+
+
+class PricedCart:
+    def __init__(self, lines, subtotal, order_discount, order_promotion, applied):
+        self.lines = lines
+        self.subtotal = subtotal
+        self.line_discount = sum((line.discount for line in lines), ZERO)
+        self.order_discount = order_discount
+        self.order_promotion = order_promotion
+        self.discount = self.line_discount + order_discount
+        self.total = subtotal - self.discount
+        self.promotions = [rule.name for rule in applied]
+        self.coupon_applied = any(rule.code for rule in applied)
+
+    def line_for(self, product_id):
+        for line in self.lines:
+            if line.product.pk == int(product_id):
+                return line
+        return None
+
+
+def _allocate(lines, discount):
+    """Spread an order discount over the lines, in paise, by line total."""
+    cents = int(discount * 100)
+    weights = [int(line.item_total * 100) for line in lines]
+    base = sum(weights)
+    if not cents or not base:
+        return
+    shares = [divmod(cents * weight, base) for weight in weights]
+    leftover = cents - sum(share for share, _ in shares)
+    by_remainder = sorted(range(len(lines)), key=lambda i: -shares[i][1])
+    bonus = set(by_remainder[:leftover])
+    for i, line in enumerate(lines):
+        share = shares[i][0] + (1 if i in bonus else 0)
+        line.charged = line.item_total - Decimal(share) / 100
+
+
+class RuleSet:
+    def __init__(self, rules):
+        self.by_product = defaultdict(list)
+        self.by_category = defaultdict(list)
+        self.every_line = []
+        self.order_rules = []
+        self.codes = defaultdict(list)
+        self.size = 0
+        for rule in rules:
+            self.size += 1
+            if rule.code:
+                self.codes[rule.code].append(rule)
+            if rule.product_ids or rule.category_ids:
+                for product_id in rule.product_ids:
+                    self.by_product[product_id].append(rule)
+                for category_id in rule.category_ids:
+                    self.by_category[category_id].append(rule)
+            elif rule.kind == Promotion.BUY_X_GET_Y:
+                self.every_line.append(rule)
+            else:
+                self.order_rules.append(rule)
+
+    def __bool__(self):
+        return self.size > 0
+
+    def has_code(self, code, now=None):
+        now = now or timezone.now()
+        return any(rule.live(now) for rule in self.codes.get(code, ()))
+
+    def price(self, items, coupon=None, now=None):
+        """Price `items`, a list of (product, quantity) pairs."""
+        now = now or timezone.now()
+        lines = [PricedLine(product, quantity) for product, quantity in items]
+        subtotal = sum((line.subtotal for line in lines), ZERO)
+        applied = []
+        for line in lines:
+            best, best_rule = ZERO, None
+            for rules in (
+                self.by_product.get(line.product.pk, ()),
+                self.by_category.get(line.product.category_id, ()),
+                self.every_line,
+            ):
+                for rule in rules:
+                    if rule.applies(now, subtotal, coupon):
+                        amount = rule.line_discount(line.unit_price, line.quantity)
+                        if amount > best:
+                            best, best_rule = amount, rule
+            if best_rule is not None:
+                line.discount = min(_money(best), line.subtotal)
+                line.promotion = best_rule.name
+                line.item_total = line.charged = line.subtotal - line.discount
+                if best_rule not in applied:
+                    applied.append(best_rule)
+
+        remaining = subtotal - sum((line.discount for line in lines), ZERO)
+        order_discount, order_rule = ZERO, None
+        for rule in self.order_rules:
+            if rule.applies(now, subtotal, coupon):
+                amount = min(_money(rule.order_discount(remaining)), remaining)
+                if amount > order_discount:
+                    order_discount, order_rule = amount, rule
+        if order_rule is not None:
+            applied.append(order_rule)
+            _allocate(lines, order_discount)
+        return PricedCart(
+            lines,
+            subtotal,
+            order_discount,
+            order_rule.name if order_rule else None,
+            applied,
+        )
+
+
+def load_rules():
+    """Compile the active promotions (three queries)."""
+    rows = list(
+        Promotion.objects.filter(is_active=True)
+        .exclude(ends_at__lte=timezone.now())
+        .values(
+            "id",
+            "name",
+            "kind",
+            "value",
+            "buy_quantity",
+            "get_quantity",
+            "min_subtotal",
+            "code",
+            "starts_at",
+            "ends_at",
+        )
+    )
+    ids = [row["id"] for row in rows]
+    product_ids = defaultdict(list)
+    category_ids = defaultdict(list)
+    if ids:
+        for promotion_id, product_id in Promotion.products.through.objects.filter(
+            promotion_id__in=ids
+        ).values_list("promotion_id", "product_id"):
+            product_ids[promotion_id].append(product_id)
+        for promotion_id, category_id in Promotion.categories.through.objects.filter(
+            promotion_id__in=ids
+        ).values_list("promotion_id", "category_id"):
+            category_ids[promotion_id].append(category_id)
+    return RuleSet(
+        Rule(
+            row["id"],
+            row["name"],
+            row["kind"],
+            value=row["value"],
+            buy=row["buy_quantity"],
+            get=row["get_quantity"],
+            min_subtotal=row["min_subtotal"],
+            code=row["code"],
+            starts_at=row["starts_at"],
+            ends_at=row["ends_at"],
+            product_ids=product_ids[row["id"]],
+            category_ids=category_ids[row["id"]],
+        )
+        for row in rows
+    )
+
+
+_compiled = (None, 0.0, RuleSet(()))
+
+
+def _max_age():
+    return getattr(settings, "PROMOTIONS_RULES_MAX_AGE", 300)
+
+
+def get_rules():
+    """This process's compiled RuleSet.
+
+    Recompiled when the shared version changes (every worker sees a bump made
+    by any of them) and at least every PROMOTIONS_RULES_MAX_AGE seconds, in
+    case a change was made without bumping it.
+    """
+    global _compiled
+    version = get_version(PROMOTIONS_VERSION_KEY)
+    compiled_version, compiled_at, rules = _compiled
+    if compiled_version != version or time.monotonic() - compiled_at > _max_age():
+        rules = load_rules()
+        _compiled = (version, time.monotonic(), rules)
+    return rules
+
+
+def bump_promotions_version():
+    return bump_version(PROMOTIONS_VERSION_KEY)
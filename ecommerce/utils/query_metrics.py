@@ -0,0 +1,147 @@
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("ecommerce.query_metrics")
+
+
+class QueryCollector:
+    """Execute wrapper that counts queries, DB time and the slowest statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+
+    def add(self, sql, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        if elapsed >= self.slowest_duration:
+            self.slowest_duration = elapsed
+            self.slowest_sql = sql
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(sql, time.perf_counter() - start)
+
+    @contextmanager
+    def capture(self, request=None):
+        """Collect the queries run inside the block.
+
+        Given a request, the query metrics and budget middleware and
+        instrument_view share a single execute wrapper for it: the first one
+        installs it and every statement is timed once and added to each
+        collector active at the time.
+        """
+        if request is None:
+            with _wrapping(self):
+                yield self
+            return
+        active = getattr(request, "_query_collectors", None)
+        if active is not None:
+            active.append(self)
+            try:
+                yield self
+            finally:
+                active.remove(self)
+            return
+        request._query_collectors = active = [self]
+        try:
+            with _wrapping(_SharedWrapper(active)):
+                yield self
+        finally:
+            del request._query_collectors
+
+
+class _SharedWrapper:
+    def __init__(self, collectors):
+        self.collectors = collectors
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            for collector in self.collectors:
+                collector.add(sql, elapsed)
+
+
+@contextmanager
+def _wrapping(wrapper):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+class ViewQueryStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.duration = 0.0
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+
+    def add(self, collector):
+        self.requests += 1
+        self.queries += collector.count
+        self.duration += collector.duration
+        if collector.slowest_duration >= self.slowest_duration:
+            self.slowest_duration = collector.slowest_duration
+            self.slowest_sql = collector.slowest_sql
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "avg_queries": self.queries / self.requests if self.requests else 0,
+            "db_time_ms": round(self.duration * 1000, 3),
+            "slowest_ms": round(self.slowest_duration * 1000, 3),
+            "slowest_sql": self.slowest_sql,
+        }
+
+
+_lock = threading.Lock()
+_stats = {}
+_sampled_requests = 0
+
+
+def should_sample():
+    rate = getattr(settings, "QUERY_METRICS_SAMPLE_RATE", 1.0)
+    return rate >= 1 or random.random() < rate
+
+
+def record(view_name, collector):
+    global _sampled_requests
+    with _lock:
+        _stats.setdefault(view_name, ViewQueryStats()).add(collector)
+        _sampled_requests += 1
+        log_every = getattr(settings, "QUERY_METRICS_LOG_EVERY", 500)
+        if log_every and _sampled_requests % log_every == 0:
+            logger.info("query metrics: %s", _snapshot_locked())
+
+
+def _snapshot_locked():
+    return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+def snapshot():
+    with _lock:
+        return _snapshot_locked()
+
+
+def reset():
+    global _sampled_requests
+    with _lock:
+        _stats.clear()
+        _sampled_requests = 0
@@ -0,0 +1,75 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from ecommerce.models import Product
+from ecommerce.utils import metrics
+
+
+def _cache_key(product_id):
+    return f"quick_view:{product_id}"
+
+
+def _timeout():
+    return getattr(settings, "QUICK_VIEW_CACHE_TIMEOUT", 3600)
+
+
+def render_quick_view(product):
+    return render_to_string("ecommerce/product_quick_view.html", {"product": product})
+
+
+def _cached_fragments(product_ids, cached):
+    """Split a get_many() result into ({id: html} hits, ids still to render)."""
+    fragments = {}
+    missing = []
+    for pid in product_ids:
+        key = _cache_key(pid)
+        if key in cached:
+            fragments[pid] = cached[key]
+        else:
+            missing.append(pid)
+        metrics.record_cache("quick_view", key in cached)
+    return fragments, missing
+
+
+def _render_and_cache(product_ids):
+    rendered = {
+        product.pk: render_quick_view(product)
+        for product in Product.objects.filter(pk__in=product_ids).select_related(
+            "category"
+        )
+    }
+    cache.set_many(
+        {_cache_key(pid): html for pid, html in rendered.items()}, _timeout()
+    )
+    return rendered
+
+
+def get_quick_view_fragments(product_ids):
+    """Return {product_id: html}, rendering and caching only the misses.
+
+    Missing products are simply absent from the result.
+    """
+    cached = cache.get_many([_cache_key(pid) for pid in product_ids])
+    fragments, missing = _cached_fragments(product_ids, cached)
+    if missing:
+        fragments.update(_render_and_cache(missing))
+    return fragments
+
+
+async def aget_quick_view_fragments(product_ids):
+    """get_quick_view_fragments for ecommerce.async_views.
+
+    Hits are read with the async cache API; misses are rendered by the same
+    code as the sync version, in a thread.
+    """
+    cached = await cache.aget_many([_cache_key(pid) for pid in product_ids])
+    fragments, missing = _cached_fragments(product_ids, cached)
+    if missing:
+        fragments.update(await sync_to_async(_render_and_cache)(missing))
+    return fragments
+
+
+def invalidate_quick_views(product_ids):
+    cache.delete_many([_cache_key(pid) for pid in product_ids])
@@ -0,0 +1,175 @@
+"""Token-bucket rate limiting for expensive or abusable POST endpoints.
+
+Each rule in RATE_LIMITS is ``(burst, period)``: a bucket holds up to
+``burst`` tokens and refills at ``burst / period`` tokens per second, and
+every request takes one. Buckets live in the RATE_LIMIT_CACHE cache, which
+must be one all worker processes share (the default cache is: Redis, or the
+database cache; see CACHES). With a per-process cache such as LocMemCache
+each worker would allow the full burst. If the cache is unreachable each
+process falls back to its own buckets rather than failing open or closed.
+
+The read-modify-write on the cache is not atomic, so concurrent requests
+can occasionally both take the last token. That is fine for throttling:
+the point is to reject bursts before they reach PBKDF2 (login, register)
+or the session store (cart), not to count exactly.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from ecommerce.utils import metrics
+from ecommerce.utils.search_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Buckets untouched for a day are full again whatever their rule.
+_local = LRUCache(maxsize=10000, ttl=24 * 60 * 60)
+_local_lock = threading.Lock()
+
+
+def client_ip(request):
+    """The client address, skipping RATE_LIMIT_PROXY_COUNT trusted proxies."""
+    proxies = getattr(settings, "RATE_LIMIT_PROXY_COUNT", 0)
+    if proxies:
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def posted_username(request):
+    """The username from a login form or a JSON token request."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = None
+        username = data.get("username") if isinstance(data, dict) else None
+    else:
+        username = request.POST.get("username")
+    return username.strip().lower() if isinstance(username, str) else ""
+
+
+def take(state, now, burst, period):
+    """Take one token. Returns (allowed, new state, seconds until a token)."""
+    tokens, updated = state if state else (burst, now)
+    tokens = min(burst, tokens + (now - updated) * burst / period)
+    if tokens >= 1:
+        return True, (tokens - 1, now), 0
+    return False, (tokens, now), (1 - tokens) * period / burst
+
+
+def _rule(scope):
+    return getattr(settings, "RATE_LIMITS", {})[scope]
+
+
+def _cache_key(scope, key):
+    # Keys include user input (usernames); hash them into safe cache keys.
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    return f"ratelimit:{scope}:{digest}"
+
+
+def _cache():
+    return caches[getattr(settings, "RATE_LIMIT_CACHE", "default")]
+
+
+def _take_local(cache_key, burst, period):
+    with _local_lock:
+        allowed, state, wait = take(_local.get(cache_key), time.time(), burst, period)
+        _local.set(cache_key, state)
+    return allowed, wait
+
+
+def hit(scope, key):
+    """Take a token from the (scope, key) bucket; returns the wait, 0 if allowed."""
+    burst, period = _rule(scope)
+    cache_key = _cache_key(scope, key)
+    try:
+        cache = _cache()
+        allowed, state, wait = take(cache.get(cache_key), time.time(), burst, period)
+        cache.set(cache_key, state, period)
+    except Exception:
+        logger.warning("Rate limit cache unavailable, using local buckets.")
+        allowed, wait = _take_local(cache_key, burst, period)
+    return 0 if allowed else wait
+
+
+async def ahit(scope, key):
+    burst, period = _rule(scope)
+    cache_key = _cache_key(scope, key)
+    try:
+        cache = _cache()
+        state = await cache.aget(cache_key)
+        allowed, state, wait = take(state, time.time(), burst, period)
+        await cache.aset(cache_key, state, period)
+    except Exception:
+        logger.warning("Rate limit cache unavailable, using local buckets.")
+        allowed, wait = _take_local(cache_key, burst, period)
+    return 0 if allowed else wait
+
+
+def too_many_requests(request, retry_after):
+    return JsonResponse(
+        {"status": "error", "message": "Too many requests. Please slow down."},
+        status=429,
+    )
+
+
+def _rejected(request, scope, wait, on_reject):
+    metrics.RATE_LIMITED.inc(scope=scope)
+    response = on_reject(request, wait)
+    response["Retry-After"] = str(max(1, round(wait)))
+    return response
+
+
+def rate_limit(*rules, on_reject=too_many_requests, methods=("POST",)):
+    """Reject over-limit requests before the view runs.
+
+    `rules` are ``(scope, key_func)`` pairs; the request must have a token in
+    every bucket. Keys that come out empty (e.g. no username posted) are not
+    limited. `on_reject(request, retry_after)` builds the 429 response.
+    """
+
+    def enabled(request):
+        return request.method in methods and getattr(
+            settings, "RATE_LIMIT_ENABLED", True
+        )
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+
+            @functools.wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                if enabled(request):
+                    for scope, key_func in rules:
+                        key = key_func(request)
+                        wait = key and await ahit(scope, key)
+                        if wait:
+                            return _rejected(request, scope, wait, on_reject)
+                return await view_func(request, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if enabled(request):
+                for scope, key_func in rules:
+                    key = key_func(request)
+                    wait = key and hit(scope, key)
+                    if wait:
+                        return _rejected(request, scope, wait, on_reject)
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,112 @@
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+
+from django.conf import settings
+from django.db import transaction
+
+from ecommerce.models import OrderItem, Product, ProductRelation
+
+
+def _top_k():
+    return getattr(settings, "RELATED_PRODUCTS_TOP_K", 8)
+
+
+def _trim(basket):
+    # Pairs grow quadratically with basket size, and bulk orders say little
+    # about what goes together, so only the first N products are paired.
+    return sorted(basket)[: getattr(settings, "RELATED_PRODUCTS_MAX_BASKET", 20)]
+
+
+def iter_baskets(chunk_size=2000):
+    """Yield the distinct product ids of each order, streaming OrderItem rows."""
+    rows = (
+        OrderItem.objects.order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=chunk_size)
+    )
+    for _, items in groupby(rows, key=lambda row: row[0]):
+        yield {product_id for _, product_id in items}
+
+
+def count_copurchases(baskets, matrix=None):
+    """Accumulate a sparse co-purchase matrix as {product_id: Counter}."""
+    matrix = matrix if matrix is not None else defaultdict(Counter)
+    for basket in baskets:
+        for a, b in combinations(_trim(basket), 2):
+            matrix[a][b] += 1
+            matrix[b][a] += 1
+    return matrix
+
+
+def _relations(matrix, product_ids, top_k):
+    return [
+        ProductRelation(product_id=pid, related_id=related_id, score=score)
+        for pid in product_ids
+        for related_id, score in matrix[pid].most_common(top_k)
+    ]
+
+
+def rebuild_relations(top_k=None, chunk_size=2000, batch_size=1000):
+    """Recompute every product's neighbours from scratch. Returns rows written."""
+    top_k = top_k or _top_k()
+    matrix = count_copurchases(iter_baskets(chunk_size))
+    relations = _relations(matrix, list(matrix), top_k)
+    with transaction.atomic():
+        ProductRelation.objects.all().delete()
+        ProductRelation.objects.bulk_create(relations, batch_size=batch_size)
+    return len(relations)
+
+
+def record_order_copurchases(product_ids, top_k=None):
+    """Fold one new order into the stored neighbours of its products.
+
+    Orders sharing a product are folded in one at a time: the products' rows
+    are locked (in id order, so two orders can't deadlock) before their
+    scores are read. Rows are upserted and only neighbours that dropped out
+    of the top K are deleted, so a concurrent rebuild can't cause duplicate
+    key errors either.
+
+    A pair pruned from both products' top K starts counting again from zero,
+    so scores drift low over time; the nightly rebuild corrects that.
+    """
+    product_ids = set(_trim(set(product_ids)))
+    if len(product_ids) < 2:
+        return
+    top_k = top_k or _top_k()
+    with transaction.atomic():
+        list(
+            Product.objects.select_for_update()
+            .filter(pk__in=product_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        matrix = defaultdict(Counter)
+        stored = {}
+        for relation in ProductRelation.objects.filter(product_id__in=product_ids):
+            matrix[relation.product_id][relation.related_id] = relation.score
+            stored[relation.product_id, relation.related_id] = relation.pk
+        for a, b in combinations(sorted(product_ids), 2):
+            # A pair pruned from one side's top K may still be on the other's.
+            matrix[a][b] = matrix[b][a] = max(matrix[a][b], matrix[b][a])
+        count_copurchases([product_ids], matrix)
+        relations = _relations(matrix, product_ids, top_k)
+        kept = {(relation.product_id, relation.related_id) for relation in relations}
+        ProductRelation.objects.filter(
+            pk__in=[pk for pair, pk in stored.items() if pair not in kept]
+        ).delete()
+        ProductRelation.objects.bulk_create(
+            relations,
+            update_conflicts=True,
+            unique_fields=["product", "related"],
+            update_fields=["score"],
+        )
+
+
+def get_related_products(product_id, limit=None):
+    """Return the related Product objects, best first, in one indexed query."""
+    relations = (
+        ProductRelation.objects.filter(product_id=product_id)
+        .select_related("related__category")
+        .order_by("-score")[: limit or _top_k()]
+    )
+    return [relation.related for relation in relations]
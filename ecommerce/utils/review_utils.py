@@ -0,0 +1,82 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from ecommerce.models import Product, Review
+from ecommerce.utils import metrics
+
+
+def _histogram_key(product_id):
+    return f"rating_histogram:{product_id}"
+
+
+def _timeout():
+    return getattr(settings, "RATING_HISTOGRAM_CACHE_TIMEOUT", 3600)
+
+
+def _compute_histogram(product_id):
+    histogram = {rating: 0 for rating in range(5, 0, -1)}
+    rows = (
+        Review.objects.filter(product_id=product_id)
+        .order_by()
+        .values("rating")
+        .annotate(count=Count("id"))
+    )
+    for row in rows:
+        histogram[row["rating"]] = row["count"]
+    return histogram
+
+
+def rating_histogram(product_id):
+    """Return {5: n, 4: n, ..., 1: n}; one grouped query on a cache miss."""
+    histogram = cache.get(_histogram_key(product_id))
+    metrics.record_cache("rating_histogram", histogram is not None)
+    if histogram is None:
+        histogram = _compute_histogram(product_id)
+        cache.set(_histogram_key(product_id), histogram, _timeout())
+    return histogram
+
+
+def refresh_rating_summary(product_id):
+    """Recompute the denormalized rating fields and cached histogram."""
+    histogram = _compute_histogram(product_id)
+    count = sum(histogram.values())
+    total = sum(rating * n for rating, n in histogram.items())
+    avg = round(total / count, 1) if count else 0
+    Product.objects.filter(pk=product_id).update(review_count=count, avg_rating=avg)
+    cache.set(_histogram_key(product_id), histogram, _timeout())
+
+
+def encode_cursor(review):
+    raw = f"{review.created_at.isoformat()}|{review.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def get_reviews_page(product_id, cursor=None, page_size=None):
+    """Return (reviews, next_cursor), newest first, keyset-paginated."""
+    page_size = page_size or getattr(settings, "REVIEWS_PAGE_SIZE", 10)
+    reviews = Review.objects.filter(product_id=product_id).select_related("user")
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        reviews = reviews.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    reviews = list(reviews.order_by("-created_at", "-id")[: page_size + 1])
+    next_cursor = None
+    if len(reviews) > page_size:
+        reviews = reviews[:page_size]
+        next_cursor = encode_cursor(reviews[-1])
+    return reviews, next_cursor
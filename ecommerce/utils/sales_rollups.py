@@ -0,0 +1,130 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ecommerce.models import (
+    DailyCategorySales,
+    DailyProductSales,
+    Order,
+    OrderItem,
+    RollupWatermark,
+)
+
+WATERMARK = "daily_sales"
+
+# Orders in these states count as sales. An order cancelled after it was
+# rolled up stays counted until the next --rebuild.
+SALE_STATUSES = ("processing", "shipped", "delivered")
+
+# What the line was charged, after its share of the promotions.
+LINE_TOTAL = ExpressionWrapper(
+    F("quantity") * F("price") - F("discount"),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+
+def _aggregate(items, group_by):
+    return (
+        items.values(date=TruncDate("order__created_at"), group_id=F(group_by))
+        .annotate(
+            units=Sum("quantity"),
+            revenue=Sum(LINE_TOTAL),
+            order_count=Count("order_id", distinct=True),
+        )
+        .order_by()
+    )
+
+
+def _merge(model, field, rows):
+    """Add aggregated rows onto the stored rollup: one read, one upsert."""
+    if not rows:
+        return
+    existing = {
+        (row.date, getattr(row, f"{field}_id")): row
+        for row in model.objects.filter(
+            date__in={row["date"] for row in rows},
+            **{f"{field}_id__in": {row["group_id"] for row in rows}},
+        )
+    }
+    merged = []
+    for row in rows:
+        current = existing.get((row["date"], row["group_id"]))
+        merged.append(
+            model(
+                date=row["date"],
+                units=row["units"] + (current.units if current else 0),
+                revenue=row["revenue"] + (current.revenue if current else 0),
+                order_count=row["order_count"]
+                + (current.order_count if current else 0),
+                **{f"{field}_id": row["group_id"]},
+            )
+        )
+    model.objects.bulk_create(
+        merged,
+        update_conflicts=True,
+        unique_fields=["date", field],
+        update_fields=["units", "revenue", "order_count"],
+    )
+
+
+def update_rollups(lag_seconds=None, batch_size=None):
+    """Fold orders past the watermark into the daily rollups.
+
+    Only orders before the first one inside the lag are read, so a checkout
+    that is still writing its items is picked up on a later run. Returns
+    orders processed.
+    """
+    if lag_seconds is None:
+        lag_seconds = getattr(settings, "SALES_ROLLUP_LAG_SECONDS", 900)
+    batch_size = batch_size or getattr(settings, "SALES_ROLLUP_BATCH_SIZE", 5000)
+    cutoff = timezone.now() - timedelta(seconds=lag_seconds)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(
+                name=WATERMARK
+            )
+            pending = Order.objects.filter(id__gt=watermark.last_order_id)
+            # Stop before the first order still inside the lag, even if later
+            # ids look older (app servers' clocks differ): the watermark only
+            # moves forward, so an order passed over would never be counted.
+            recent = (
+                pending.filter(created_at__gt=cutoff)
+                .order_by("id")
+                .values_list("id", flat=True)
+                .first()
+            )
+            if recent is not None:
+                pending = pending.filter(id__lt=recent)
+            order_ids = list(
+                pending.order_by("id").values_list("id", flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return processed
+            items = OrderItem.objects.filter(
+                order_id__gt=watermark.last_order_id,
+                order_id__lte=order_ids[-1],
+                order__status__in=SALE_STATUSES,
+            )
+            _merge(DailyProductSales, "product", list(_aggregate(items, "product_id")))
+            _merge(
+                DailyCategorySales,
+                "category",
+                list(_aggregate(items, "product__category_id")),
+            )
+            watermark.last_order_id = order_ids[-1]
+            watermark.save(update_fields=["last_order_id", "updated_at"])
+        processed += len(order_ids)
+
+
+def rebuild_rollups(lag_seconds=None, batch_size=None):
+    """Throw the rollups away and recompute them from the first order."""
+    with transaction.atomic():
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).delete()
+        return update_rollups(lag_seconds, batch_size)
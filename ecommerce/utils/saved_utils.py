@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from ecommerce.models import Saved
+from ecommerce.utils import metrics
+
+
+def _cache_key(user_id):
+    return f"saved_ids:{user_id}"
+
+
+def _timeout():
+    return getattr(settings, "SAVED_IDS_CACHE_TIMEOUT", 3600)
+
+
+def get_saved_ids(user):
+    """Return the set of product ids the user has saved (cached per user)."""
+    if not user.is_authenticated:
+        return set()
+    key = _cache_key(user.pk)
+    ids = cache.get(key)
+    metrics.record_cache("saved_ids", ids is not None)
+    if ids is None:
+        ids = set(Saved.objects.filter(user=user).values_list("product_id", flat=True))
+        cache.set(key, ids, _timeout())
+    return ids
+
+
+def _invalidate(user):
+    # Dropping the key (rather than updating the cached set in place) means
+    # two concurrent writers can't overwrite each other's change; the next
+    # read repopulates it from the database.
+    cache.delete(_cache_key(user.pk))
+
+
+def save_products(user, product_ids):
+    Saved.objects.bulk_create(
+        [Saved(user=user, product_id=pid) for pid in product_ids],
+        ignore_conflicts=True,
+    )
+    _invalidate(user)
+
+
+def unsave_products(user, product_ids):
+    deleted, _ = Saved.objects.filter(user=user, product_id__in=product_ids).delete()
+    _invalidate(user)
+    return deleted
+
+
+def toggle_saved(user, product_id):
+    """Save or unsave one product. Returns True if it is now saved."""
+    if product_id in get_saved_ids(user) and unsave_products(user, [product_id]):
+        return False
+    save_products(user, [product_id])
+    return True
+
+
+def annotate_is_saved(queryset, user):
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        is_saved=Exists(Saved.objects.filter(user=user, product=OuterRef("pk")))
+    )
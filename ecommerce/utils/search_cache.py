@@ -0,0 +1,110 @@
+"""Per-process LRU cache of product-id lists for listing/search results.
+
+Keys are the normalized filters (search tokens, category ids, price
+buckets, sort) plus the catalog version, so any product or category change
+makes old entries unreachable; they then age out through the TTL or LRU
+eviction. Pages are hydrated from the cached ids with one ``id__in`` query.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from ecommerce.utils import catalog_snapshot, metrics
+from ecommerce.utils.catalog import get_catalog_version
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+results = LRUCache(
+    getattr(settings, "SEARCH_CACHE_SIZE", 512),
+    getattr(settings, "SEARCH_CACHE_TTL", 60),
+)
+
+
+def stats():
+    """Hit/miss/eviction counters for this process's search cache."""
+    return results.stats()
+
+
+def cache_key(filters, sort_by):
+    return (
+        get_catalog_version(),
+        tuple(filters["search"].split()),
+        tuple(filters["categories"]),
+        tuple(filters["prices"]),
+        filters["min_price"],
+        filters["max_price"],
+        sort_by or "",
+    )
+
+
+def get_result_ids(queryset, filters, sort_by):
+    """Return the ordered product ids for a filtered, sorted queryset.
+
+    Misses are answered from the shared catalog snapshot when it is current,
+    and from the database otherwise. Result sets larger than
+    SEARCH_CACHE_MAX_IDS are not cached, to bound memory per entry.
+    """
+    key = cache_key(filters, sort_by)
+    ids = results.get(key)
+    metrics.record_cache("search_results", ids is not None)
+    if ids is None:
+        ids = catalog_snapshot.query(filters, sort_by)
+        if ids is None:
+            ids = list(queryset.values_list("pk", flat=True))
+        if len(ids) <= getattr(settings, "SEARCH_CACHE_MAX_IDS", 5000):
+            results.set(key, ids)
+    return ids
+
+
+def hydrate(queryset, ids):
+    """Fetch the products for `ids` in one query, preserving their order."""
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
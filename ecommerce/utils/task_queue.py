@@ -0,0 +1,199 @@
+"""A small database-backed task queue.
+
+Functions decorated with ``@task`` (see ecommerce.tasks) get a ``delay()``
+method that inserts a Task row; ``manage.py run_worker`` claims and runs
+them. The row is inserted once the caller's transaction commits, so a task
+queued while saving an order never runs before (or without) that order, and
+a failure to queue it can't roll the order back.
+
+Claiming uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database
+supports it (Postgres). Elsewhere (SQLite) workers poll and claim with a
+conditional UPDATE, so two workers can never run the same task.
+"""
+
+import functools
+import logging
+import random
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from ecommerce.models import Task
+from ecommerce.utils import metrics
+
+logger = logging.getLogger("ecommerce.tasks")
+
+registry = {}
+
+
+class TaskFunction:
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        functools.update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue the call when the current transaction commits.
+
+        With TASKS_ALWAYS_EAGER set the call runs at that point instead. Either
+        way errors are logged rather than raised, as the caller's writes are
+        already committed.
+        """
+        if getattr(settings, "TASKS_ALWAYS_EAGER", False):
+            action = functools.partial(self.func, *args, **kwargs)
+        else:
+            action = functools.partial(self._enqueue, args, kwargs)
+        # named after the task in Django's log line when the action fails
+        transaction.on_commit(functools.update_wrapper(action, self.func), robust=True)
+
+    def _enqueue(self, args, kwargs):
+        Task.objects.create(
+            name=self.name,
+            payload={"args": list(args), "kwargs": kwargs},
+            max_attempts=self.max_attempts,
+            run_at=timezone.now(),
+        )
+
+
+def task(func=None, *, max_attempts=5):
+    """Register a function as a background task. Arguments must be JSON."""
+
+    def decorator(func):
+        name = f"{func.__module__}.{func.__name__}"
+        registry[name] = TaskFunction(func, name, max_attempts)
+        return registry[name]
+
+    return decorator(func) if func is not None else decorator
+
+
+def backoff(attempts):
+    base = getattr(settings, "TASK_RETRY_BACKOFF", 10)
+    cap = getattr(settings, "TASK_RETRY_BACKOFF_MAX", 3600)
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _claim_skip_locked(worker_id):
+    with transaction.atomic():
+        task = (
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", run_at__lte=timezone.now())
+            .order_by("run_at")
+            .first()
+        )
+        if task is None:
+            return None
+        task.status = "running"
+        task.attempts += 1
+        task.locked_by = worker_id
+        task.locked_at = timezone.now()
+        task.save(update_fields=["status", "attempts", "locked_by", "locked_at"])
+        return task
+
+
+def _claim_polling(worker_id):
+    now = timezone.now()
+    candidates = Task.objects.filter(status="queued", run_at__lte=now).order_by(
+        "run_at"
+    )
+    for pk, attempts in candidates.values_list("pk", "attempts")[:10]:
+        claimed = Task.objects.filter(pk=pk, status="queued").update(
+            status="running",
+            attempts=attempts + 1,
+            locked_by=worker_id,
+            locked_at=now,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def claim(worker_id):
+    """Take the next due task for this worker, or return None."""
+    if connection.features.has_select_for_update_skip_locked:
+        return _claim_skip_locked(worker_id)
+    return _claim_polling(worker_id)
+
+
+def execute(task):
+    """Run a claimed task and record the outcome; failures are retried."""
+    func = registry.get(task.name)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task {task.name!r}")
+        func(*task.payload.get("args", []), **task.payload.get("kwargs", {}))
+    except Exception:
+        task.last_error = traceback.format_exc()
+        if task.attempts < task.max_attempts and func is not None:
+            task.status = "queued"
+            task.run_at = timezone.now() + backoff(task.attempts)
+            outcome = "retry"
+        else:
+            task.status = "failed"
+            task.finished_at = timezone.now()
+            outcome = "failed"
+        logger.warning("Task %s #%s %s", task.name, task.pk, outcome, exc_info=True)
+    else:
+        task.status = "done"
+        task.finished_at = timezone.now()
+        outcome = "done"
+    task.locked_by = ""
+    task.locked_at = None
+    task.save(
+        update_fields=[
+            "status",
+            "run_at",
+            "finished_at",
+            "last_error",
+            "locked_by",
+            "locked_at",
+        ]
+    )
+    metrics.TASK_RUNS.inc(task=task.name, outcome=outcome)
+    return outcome
+
+
+def requeue_stale(timeout=None):
+    """Put back tasks whose worker died mid-run. Returns how many."""
+    timeout = timeout or getattr(settings, "TASK_LOCK_TIMEOUT", 1800)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Task.objects.filter(status="running", locked_at__lt=cutoff).update(
+        status="queued", locked_by="", locked_at=None, run_at=timezone.now()
+    )
+
+
+def work(worker_id, stop, poll_interval, burst=False):
+    """Claim and run tasks until `stop` is set (or the queue is empty, in burst)."""
+    while not stop.is_set():
+        close_old_connections()
+        task = claim(worker_id)
+        if task is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        execute(task)
+    connection.close()
+
+
+def run_workers(concurrency, poll_interval, burst=False, prefix="worker"):
+    stop = threading.Event()
+    threads = [
+        threading.Thread(
+            target=work,
+            args=(f"{prefix}-{i}", stop, poll_interval, burst),
+            name=f"{prefix}-{i}",
+        )
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    return stop, threads
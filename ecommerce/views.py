@@ -1,3 +1,6 @@
+import hmac
+import logging
+import time
 from decimal import Decimal
 import stripe
 from django.conf import settings
@@ -5,52 +8,76 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Avg, Prefetch, Q
-from django.http import JsonResponse
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST
 from django.views.generic import DetailView, ListView
-from ecommerce.utils.cart_utils import get_cart_items_and_total
-from .models import Category, Order, OrderItem, Product, Review, Saved, Customer
+from ecommerce import tasks
+from ecommerce.utils import facets, inventory, metrics, promotions, search_cache
+from ecommerce.utils.cart_utils import cart_totals, checkout_line_items, price_cart
+from ecommerce.utils.quick_view import get_quick_view_fragments
+from ecommerce.utils.rate_limit import client_ip, posted_username, rate_limit
+from ecommerce.utils.related_products import get_related_products
+from ecommerce.utils.review_utils import get_reviews_page, rating_histogram
+from ecommerce.utils.saved_utils import (
+    annotate_is_saved,
+    get_saved_ids,
+    save_products,
+    toggle_saved,
+    unsave_products,
+)
+from .models import Category, Order, OrderItem, Product, Review, Customer
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+logger = logging.getLogger(__name__)
 
+
+@metrics.instrument_view
 def index(request):
+    products = annotate_is_saved(Product.objects.order_by("-id"), request.user)
     categories = Category.objects.prefetch_related(
-        Prefetch(
-            "product_set",
-            queryset=Product.objects.order_by("-id")[:15],
-            to_attr="top_products",
-        )
+        Prefetch("product_set", queryset=products[:15], to_attr="top_products")
     )
     return render(request, "ecommerce/index.html", {"categories": categories})
 
 
+@method_decorator(metrics.instrument_view, name="dispatch")
 class ProductDetailView(DetailView):
     model = Product
     template_name = "ecommerce/product_detail.html"
     pk_url_kwarg = "product_id"
+
     def get_queryset(self):
-        return Product.objects.prefetch_related(
-            Prefetch(
-                'reviews',
-                queryset=Review.objects.select_related('user')
-            )
-        )
-        
+        return Product.objects.select_related("category")
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
-        reviews = product.reviews.all()
+        reviews, next_cursor = get_reviews_page(product.id)
         context["reviews"] = reviews
-        context["review_count"] =len(reviews)
-        context["avg_rating"] = round(
-            reviews.aggregate(Avg("rating"))["rating__avg"] or 0, 1
-        )
+        context["reviews_next_cursor"] = next_cursor
+        context["review_count"] = product.review_count
+        context["avg_rating"] = product.avg_rating
+        total = product.review_count
+        context["rating_histogram"] = [
+            (rating, count, round(count * 100 / total) if total else 0)
+            for rating, count in rating_histogram(product.id).items()
+        ]
         context["categories"] = Category.objects.all()
+        context["is_saved"] = product.id in get_saved_ids(self.request.user)
+        context["related_products"] = get_related_products(product.id)
         return context
 
     def post(self, request, *args, **kwargs):
@@ -76,52 +103,112 @@ class ProductDetailView(DetailView):
         return redirect("product_detail", product_id=product.id)
 
 
+@metrics.instrument_view
+def product_reviews(request, product_id):
+    reviews, next_cursor = get_reviews_page(product_id, request.GET.get("cursor"))
+    if request.GET.get("format") == "json":
+        return JsonResponse(
+            {
+                "reviews": [
+                    {
+                        "id": review.id,
+                        "user": review.user.username,
+                        "rating": review.rating,
+                        "comment": review.comment,
+                        "created_at": review.created_at.isoformat(),
+                    }
+                    for review in reviews
+                ],
+                "next_cursor": next_cursor,
+            }
+        )
+    html = render_to_string("ecommerce/review_list.html", {"reviews": reviews})
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+
+@metrics.instrument_view
+def related_products(request, product_id):
+    return JsonResponse(
+        {
+            "products": [
+                {
+                    "id": product.id,
+                    "product_name": product.product_name,
+                    "product_price": str(product.product_price),
+                    "category": product.category.choice,
+                    "url": reverse("product_detail", args=[product.id]),
+                }
+                for product in get_related_products(product_id)
+            ]
+        }
+    )
+
+
+@method_decorator(metrics.instrument_view, name="dispatch")
 class ProductListView(ListView):
     model = Product
     template_name = "ecommerce/detail.html"
     context_object_name = "products"
+    paginate_by = settings.PRODUCTS_PAGE_SIZE
+    sort_map = {
+        "price_asc": "product_price",
+        "price_desc": "-product_price",
+        "name_asc": "product_name",
+        "newest": "-id",
+    }
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related("category")
-        search_query = self.request.GET.get("search")
-        selected_category = self.request.GET.get("category")
+        self.categories = list(Category.objects.all())
+        self.filters = facets.parse_filters(self.request.GET, self.categories)
         sort_by = self.request.GET.get("sort_by")
-        if selected_category:
-            queryset = queryset.filter(category__choice__iexact=selected_category)
-        if search_query:
-            queryset = queryset.filter(
-                Q(product_name__icontains=search_query)
-                | Q(product_name__istartswith=search_query)
-                | Q(category__choice__icontains=search_query)
-            ).distinct()
-        sort_map = {
-            "price_asc": "product_price",
-            "price_desc": "-product_price",
-            "name_asc": "product_name",
-            'newest': '-id'
-        }
-        if sort_by in sort_map:
-            queryset = queryset.order_by(sort_map[sort_by])
-        else:
-            queryset = queryset.order_by("id")
-        return queryset
+        self.sort_by = sort_by if sort_by in self.sort_map else None
+        queryset = facets.apply_filters(super().get_queryset(), self.filters)
+        return queryset.order_by(self.sort_map.get(self.sort_by, "id"))
+
+    def paginate_queryset(self, queryset, page_size):
+        # Paginate the (cached) id list, then load only the page's products.
+        ids = search_cache.get_result_ids(queryset, self.filters, self.sort_by)
+        paginator, page, ids, is_paginated = super().paginate_queryset(ids, page_size)
+        products = Product.objects.select_related("category")
+        page.object_list = search_cache.hydrate(
+            annotate_is_saved(products, self.request.user), ids
+        )
+        return paginator, page, page.object_list, is_paginated
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["categories"] = Category.objects.all()
-        context["selected_category"] = self.request.GET.get("category")
+        category_counts, price_counts = facets.facet_counts(self.filters)
+        selected = self.filters["categories"]
+        context["categories"] = self.categories
+        context["category_facets"] = [
+            (category, category_counts.get(category.pk, 0), category.pk in selected)
+            for category in self.categories
+        ]
+        prices = self.filters["prices"]
+        context["price_facets"] = [
+            (bucket, price_counts[bucket["key"]], bucket["key"] in prices)
+            for bucket in facets.price_buckets()
+        ]
+        context["selected_category_ids"] = selected
         context["search_query"] = self.request.GET.get("search")
         context["selected_sort_by"] = self.request.GET.get("sort_by")
-        if self.request.user.is_authenticated:
-            saved_product_ids = Saved.objects.filter(
-                user=self.request.user
-            ).values_list("product_id", flat=True)
-            context["saved_product_ids"] = set(saved_product_ids)
-        else:
-            context["saved_product_ids"] = set()
         return context
 
 
+def _form_rate_limited(template_name):
+    def on_reject(request, retry_after):
+        messages.error(request, "Too many attempts. Please try again later.")
+        return render(request, template_name, status=429)
+
+    return on_reject
+
+
+@metrics.instrument_view
+@rate_limit(
+    ("login_ip", client_ip),
+    ("login_user", posted_username),
+    on_reject=_form_rate_limited("ecommerce/login.html"),
+)
 def login_view(request):
     if request.method == "POST":
         username = request.POST.get("username")
@@ -139,12 +226,18 @@ def login_view(request):
     return render(request, "ecommerce/login.html")
 
 
+@metrics.instrument_view
 def logout_view(request):
     logout(request)
     messages.success(request, "You have been logged out successfully.")
     return redirect("index")
 
 
+@metrics.instrument_view
+@rate_limit(
+    ("register_ip", client_ip),
+    on_reject=_form_rate_limited("ecommerce/register.html"),
+)
 def register_view(request):
     if request.method == "POST":
         username = request.POST["username"]
@@ -166,22 +259,82 @@ def register_view(request):
     return render(request, "ecommerce/register.html")
 
 
+def _cart_rate_limited(request, retry_after):
+    messages.error(request, "Too many cart updates. Please try again shortly.")
+    return redirect("view_cart")
+
+
+# The JSON endpoints below are also served by ecommerce.async_views, which
+# does the session I/O natively and runs these helpers in a thread.
+
+
+def _session_cart(cart):
+    return cart if isinstance(cart, dict) else {}
+
+
+def _add_to_cart(cart, product_id):
+    product = get_object_or_404(Product.objects.only("product_name"), pk=product_id)
+    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
+    return {
+        "status": "success",
+        "cart_total_items": sum(cart.values()),
+        "message": f"{product.product_name} added to cart!",
+        "redirect_url": reverse("view_cart"),
+    }
+
+
+def _quantity_changed(cart, product_id, coupon):
+    quantity = cart.get(str(product_id), 0)
+    if quantity > 0:
+        product = get_object_or_404(
+            Product.objects.only("product_price"), pk=product_id
+        )
+        item_total = product.product_price * int(quantity)
+    else:
+        item_total = Decimal("0.00")
+    return {
+        "status": "success",
+        "quantity": int(quantity),
+        "item_total": float(item_total),
+        "cart_total_items": sum(cart.values()),
+        "message": "Quantity updated",
+        **cart_totals(cart, coupon, product_id),
+    }
+
+
+def _increase_quantity(cart, product_id, coupon):
+    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
+    return _quantity_changed(cart, product_id, coupon)
+
+
+def _decrease_quantity(cart, product_id, coupon):
+    """None if the product isn't in the cart."""
+    if str(product_id) not in cart:
+        return None
+    if cart[str(product_id)] > 1:
+        cart[str(product_id)] -= 1
+    else:
+        del cart[str(product_id)]
+    return _quantity_changed(cart, product_id, coupon)
+
+
+NOT_IN_CART = {"status": "error", "message": "Product not in cart"}
+
+
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip))
+@metrics.count_cart_operation("add")
 @require_POST
 def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, pk=product_id)
-    cart = request.session.get("cart", {})
-    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
+    cart = _session_cart(request.session.get("cart", {}))
+    payload = _add_to_cart(cart, product_id)
     request.session["cart"] = cart
-    return JsonResponse(
-        {
-            "status": "success",
-            "cart_total_items": sum(cart.values()),
-            "message": f"{product.product_name} added to cart!",
-            "redirect_url": reverse("view_cart"),
-        }
-    )
+    return JsonResponse(payload)
 
 
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip), on_reject=_cart_rate_limited)
+@metrics.count_cart_operation("remove")
 @require_POST
 def remove_from_cart(request, product_id):
     cart = request.session.get("cart", {})
@@ -191,212 +344,395 @@ def remove_from_cart(request, product_id):
     return redirect("view_cart")
 
 
+@metrics.instrument_view
 def view_cart(request):
     cart = request.session.get("cart", {})
-    cart_items, total = get_cart_items_and_total(cart)
+    coupon = request.session.get("coupon")
+    pricing = price_cart(cart, coupon)
     return render(
         request,
         "ecommerce/cart.html",
         {
-            "cart_items": cart_items,
-            "total": total,
+            "cart_items": pricing.lines,
+            "pricing": pricing,
+            "total": pricing.total,
+            "coupon": coupon,
             "stripe_public_key": settings.STRIPE_PUBLISHABLE_KEY,
         },
     )
 
 
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip), on_reject=_cart_rate_limited)
+@require_POST
+def apply_coupon(request):
+    code = request.POST.get("code", "").strip().upper()
+    if not code:
+        request.session.pop("coupon", None)
+        messages.info(request, "Coupon removed.")
+    elif promotions.get_rules().has_code(code):
+        request.session["coupon"] = code
+        messages.success(request, f"Coupon {code} applied.")
+    else:
+        messages.error(request, "That coupon code is not valid.")
+    return redirect("view_cart")
+
+
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip))
+@metrics.count_cart_operation("increase")
 @require_POST
 def increase_quantity(request, product_id):
-    cart = request.session.get("cart", {})
-    if not isinstance(cart, dict):
-        cart = {}
-    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
+    cart = _session_cart(request.session.get("cart", {}))
+    payload = _increase_quantity(cart, product_id, request.session.get("coupon"))
     request.session["cart"] = cart
-    product = get_object_or_404(Product, pk=product_id)
-    quantity = cart[str(product_id)]
-    item_total = product.product_price * int(quantity)
-    return JsonResponse(
-        {
-            "status": "success",
-            
-            "quantity": int(quantity),
-            "item_total": float(item_total),
-            "cart_total_items": sum(cart.values()),
-            "message": "Quantity updated"
-        }
-    )
+    return JsonResponse(payload)
 
 
+@metrics.instrument_view
+@rate_limit(("cart_ip", client_ip))
+@metrics.count_cart_operation("decrease")
 @require_POST
 def decrease_quantity(request, product_id):
-    cart = request.session.get("cart", {})
-    if not isinstance(cart, dict):
-        cart = {}
-    if str(product_id) in cart:
-        if cart[str(product_id)] > 1:
-            cart[str(product_id)] -= 1
-        else:
-            del cart[str(product_id)]
-        request.session["cart"] = cart
-        quantity = cart.get(str(product_id), 0)
-        if quantity > 0:
-            product = get_object_or_404(Product, pk=product_id)
-            item_total = product.product_price * int(quantity)
-        else:
-            item_total = Decimal("0.00")
-        return JsonResponse(
-            {
-                "status": "success",
-                
-                "quantity": int(quantity),
-                "item_total": float(item_total),
-                "cart_total_items": sum(cart.values()),
-                "message": "Quantity updated"
-            }
-        )
-    return JsonResponse({"status": "error", "message": "Product not in cart"})
-
+    cart = _session_cart(request.session.get("cart", {}))
+    payload = _decrease_quantity(cart, product_id, request.session.get("coupon"))
+    if payload is None:
+        return JsonResponse(NOT_IN_CART)
+    request.session["cart"] = cart
+    return JsonResponse(payload)
 
 
+@metrics.instrument_view
+@metrics.track_checkout("session")
 @require_POST
 def create_checkout_session(request):
     if not request.user.is_authenticated:
         messages.error(request, "You need to login first to proceed to checkout.")
         return redirect("login")
     cart = request.session.get("cart", {})
-    _, total = get_cart_items_and_total(cart)
-    if total < 50:
-        messages.error(request, "Minimum order value must be at least ₹50.")
+    pricing = price_cart(cart, request.session.get("coupon"))
+    minimum = settings.MINIMUM_ORDER_AMOUNT
+    if pricing.total < minimum:
+        messages.error(request, f"Minimum order value must be at least ₹{minimum}.")
         return redirect("view_cart")
-    line_items = []
-    for product_id, quantity in cart.items():
-        product = get_object_or_404(Product, pk=product_id)
-        line_items.append(
-            {
-                "price_data": {
-                    "currency": "inr",
-                    "product_data": {
-                        "name": product.product_name,
-                    },
-                    "unit_amount": int(Decimal(product.product_price) * 100),
-                },
-                "quantity": quantity,
-            }
-        )
+    line_items = checkout_line_items(pricing)
     if not line_items:
         return redirect("view_cart")
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=line_items,
-            mode="payment",
-            success_url=request.build_absolute_uri(reverse("payment_success"))
-            + "?session_id={CHECKOUT_SESSION_ID}",
-            cancel_url=request.build_absolute_uri(reverse("payment_cancel")),
+        token = inventory.reserve(cart, request.session.get("stock_reservation"))
+    except inventory.OutOfStock as e:
+        names = ", ".join(
+            line.product.product_name
+            for line in pricing.lines
+            if line.product.pk in e.product_ids
         )
+        messages.error(request, f"Not enough stock for: {names}.")
+        return redirect("view_cart")
+    request.session["stock_reservation"] = token
+    try:
+        with metrics.STRIPE_LATENCY.time(operation="checkout_session_create"):
+            session = stripe.checkout.Session.create(
+                payment_method_types=["card"],
+                line_items=line_items,
+                mode="payment",
+                success_url=request.build_absolute_uri(reverse("payment_success"))
+                + "?session_id={CHECKOUT_SESSION_ID}",
+                cancel_url=request.build_absolute_uri(reverse("payment_cancel")),
+                expires_at=int(time.time()) + settings.CHECKOUT_SESSION_TTL,
+            )
+        # The order is recorded from this snapshot of what Stripe charges,
+        # not from the cart, which may change or be repriced meanwhile.
+        request.session["checkout"] = {
+            "session_id": session.id,
+            "total": str(pricing.total),
+            "lines": [
+                [
+                    line.product.pk,
+                    line.quantity,
+                    str(line.unit_price),
+                    str(line.subtotal - line.charged),
+                ]
+                for line in pricing.lines
+            ],
+        }
         return redirect(session.url, code=303)
     except Exception as e:
+        inventory.release(token)
         messages.error(request, f"Payment error: {str(e)}")
         return redirect("view_cart")
 
 
+@metrics.instrument_view
+@metrics.track_checkout("cancel")
 def payment_cancel(request):
     return render(request, "ecommerce/cancel.html")
 
 
+def _refund(checkout):
+    """Refund a paid checkout session; failures are logged for manual follow-up."""
+    try:
+        with metrics.STRIPE_LATENCY.time(operation="refund_create"):
+            stripe.Refund.create(payment_intent=checkout.payment_intent)
+    except stripe.StripeError:
+        logger.exception(
+            "Refund failed for paid checkout %s; refund it manually.", checkout.id
+        )
+        return False
+    return True
+
+
+@metrics.instrument_view
+@metrics.track_checkout("finalize")
+@login_required(login_url="login")
 def payment_success(request):
-    cart = request.session.get("cart", {})
-    if not cart:
+    session_id = request.GET.get("session_id")
+    if session_id:
+        # Reloading the success page shows the order placed the first time.
+        order = Order.objects.filter(user=request.user, payment_id=session_id).first()
+        if order:
+            return render(request, "ecommerce/success.html", {"order": order})
+    snapshot = request.session.get("checkout")
+    if not snapshot or not session_id:
         return redirect("index")
-    product_ids = list(cart.keys())
-    products = Product.objects.filter(id__in=product_ids).select_related('category')  # prefetch category if needed
-    product_map = {str(p.id): p for p in products}  
-    total = Decimal("0.00")
+    if session_id != snapshot["session_id"]:
+        messages.error(request, "That payment doesn't belong to your checkout.")
+        return redirect("view_cart")
     try:
-        order = Order.objects.create(
-            user=request.user,
-            total_amount=0,
-            payment_id=request.GET.get("session_id"),
-            status="processing",
+        with metrics.STRIPE_LATENCY.time(operation="checkout_session_retrieve"):
+            checkout = stripe.checkout.Session.retrieve(session_id)
+    except stripe.StripeError:
+        messages.error(request, "We couldn't confirm your payment. Please try again.")
+        return redirect("view_cart")
+    if checkout.payment_status != "paid":
+        messages.error(request, "Your payment hasn't been completed.")
+        return redirect("view_cart")
+    total = Decimal(snapshot["total"])
+    if checkout.amount_total != int(total * 100):
+        logger.error(
+            "Checkout %s charged %s paise for an order priced at %s.",
+            session_id,
+            checkout.amount_total,
+            total,
+        )
+    lines = [
+        (product_id, quantity, Decimal(price), Decimal(discount))
+        for product_id, quantity, price, discount in snapshot["lines"]
+    ]
+    products = Product.objects.in_bulk([product_id for product_id, *_ in lines])
+    token = request.session.get("stock_reservation")
+    try:
+        with transaction.atomic():
+            gone = [pid for pid, *_ in lines if pid not in products]
+            if gone:
+                raise inventory.OutOfStock(gone)
+            order = Order.objects.create(
+                user=request.user,
+                total_amount=total,
+                payment_id=session_id,
+                status="processing",
+            )
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        product=products[product_id],
+                        quantity=quantity,
+                        price=price,
+                        discount=discount,
+                    )
+                    for product_id, quantity, price, discount in lines
+                ]
+            )
+            inventory.commit(
+                {str(product_id): quantity for product_id, quantity, *_ in lines},
+                token,
+            )
+            tasks.record_order_copurchases.delay(order.id)
+    except inventory.OutOfStock as e:
+        # The customer has already paid, so the payment goes back.
+        if token:
+            inventory.release(token)
+        request.session.pop("stock_reservation", None)
+        request.session.pop("checkout", None)
+        names = ", ".join(
+            products[pid].product_name for pid in e.product_ids if pid in products
+        )
+        if _refund(checkout):
+            outcome = "your payment has been refunded"
+        else:
+            outcome = "we will refund your payment shortly"
+        messages.error(
+            request,
+            f"Sorry, {names or 'some items'} sold out before your order could be "
+            f"placed; {outcome}.",
         )
-        order_items = []
-        for pid, quantity in cart.items():
-            product = product_map.get(str(pid))
-            if product:
-                price = product.product_price
-                total += price * quantity
-                order_items.append(
-                    OrderItem(order=order, product=product, quantity=quantity, price=price)
-                )
-        OrderItem.objects.bulk_create(order_items)
+        return redirect("view_cart")
+    except IntegrityError:
+        # Another request for the same session placed the order first.
+        return redirect("order_history")
     except Exception:
         messages.error(request, "There was a problem finalizing your order.")
         return redirect("view_cart")
-    order.total_amount = total
-    order.save()
     request.session["cart"] = {}
+    request.session.pop("stock_reservation", None)
+    request.session.pop("checkout", None)
+    request.session.pop("coupon", None)
     messages.success(request, "Your order has been placed successfully!")
     return render(request, "ecommerce/success.html", {"order": order})
 
 
+@metrics.instrument_view
 @login_required(login_url="login")
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by("created_at")
+    orders = (
+        Order.objects.filter(user=request.user)
+        .prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+        )
+        .order_by("created_at")
+    )
     return render(request, "ecommerce/order_history.html", {"orders": orders})
 
 
+def _quick_view(fragments, product_id):
+    if product_id not in fragments:
+        raise Http404("No Product matches the given query.")
+    return {"html": fragments[product_id]}
+
+
+@metrics.instrument_view
 def quick_view_product(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    context = {
-        "product": product,
-    }
-    html_content = render_to_string(
-        "ecommerce/product_quick_view.html", context, request=request
+    return JsonResponse(_quick_view(get_quick_view_fragments([product_id]), product_id))
+
+
+@metrics.instrument_view
+def quick_view_batch(request):
+    try:
+        product_ids = [
+            int(pid) for pid in request.GET.get("ids", "").split(",") if pid.strip()
+        ]
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid ids."}, status=400)
+    product_ids = product_ids[: settings.QUICK_VIEW_BATCH_LIMIT]
+    fragments = get_quick_view_fragments(product_ids)
+    return JsonResponse(
+        {"fragments": {str(pid): html for pid, html in fragments.items()}}
     )
-    return JsonResponse({"html": html_content})
 
 
+@metrics.instrument_view
 def cart_count(request):
-    cart = request.session.get("cart", {})
+    cart = _session_cart(request.session.get("cart", {}))
     return JsonResponse({"cart_count": len(cart)})
 
 
+@metrics.instrument_view
 @login_required(login_url="login")
 def saved_items_view(request):
-    saved_products = Product.objects.filter(saved_by__user=request.user)
+    saved_products = (
+        Product.objects.filter(saved_by__user=request.user)
+        .select_related("category")
+        .order_by("-saved_by__saved_at")
+    )
+    page = Paginator(saved_products, settings.SAVED_ITEMS_PAGE_SIZE).get_page(
+        request.GET.get("page")
+    )
     return render(
-        request, "ecommerce/saved_items.html", {"saved_products": saved_products}
+        request,
+        "ecommerce/saved_items.html",
+        {"saved_products": page.object_list, "page_obj": page},
     )
 
 
+def login_required_json(request):
+    return JsonResponse(
+        {"status": "error", "message": "Please login to save products"}, status=403
+    )
+
+
+def _save_product(user, product_id):
+    product = get_object_or_404(Product.objects.only("product_name"), id=product_id)
+    if toggle_saved(user, product.id):
+        return {
+            "status": "added",
+            "message": f"{product.product_name} added to saved items.",
+        }
+    return {
+        "status": "removed",
+        "message": f"{product.product_name} removed from saved items.",
+    }
+
+
+def _remove_saved(user, product_id):
+    unsave_products(user, [product_id])
+    return {"status": "removed", "message": "removed from saved items."}
+
+
+@metrics.instrument_view
 @require_POST
 def save_product(request, product_id):
+    if not request.user.is_authenticated:
+        return login_required_json(request)
+    return JsonResponse(_save_product(request.user, product_id))
+
+
+@metrics.instrument_view
+@require_POST
+def save_products_bulk(request):
+    if not request.user.is_authenticated:
+        return login_required_json(request)
+    action = request.POST.get("action", "save")
     try:
-        product = get_object_or_404(Product, id=product_id)
-        saved_item, created = Saved.objects.get_or_create(user=request.user, product=product)
-        if created:
-            return JsonResponse(
-            {
-                "status": "added",
-                "message": f"{product.product_name} added to saved items.",
-            }
+        product_ids = {
+            int(pid)
+            for value in request.POST.getlist("product_ids")
+            for pid in value.split(",")
+            if pid.strip()
+        }
+    except ValueError:
+        return JsonResponse(
+            {"status": "error", "message": "Invalid product ids."}, status=400
         )
-        saved_item.delete()
+    if action == "save":
+        product_ids = set(
+            Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+        )
+        save_products(request.user, product_ids)
+    elif action == "unsave":
+        unsave_products(request.user, product_ids)
+    else:
         return JsonResponse(
-            {
-                "status": "removed",
-                "message": f"{product.product_name} removed from saved items.",
-            }
+            {"status": "error", "message": "Unknown action."}, status=400
         )
+    return JsonResponse(
+        {"status": "success", "saved_ids": sorted(get_saved_ids(request.user))}
+    )
 
 
-    except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)}, status=500)
-
-
+@metrics.instrument_view
 @require_POST
 def remove_saved(request, product_id):
-    saved_item = Saved.objects.filter(user=request.user, product_id=product_id)
-    if saved_item:
-        saved_item.delete()
-    return JsonResponse({"status": "removed", "message": "removed from saved items."})
+    if not request.user.is_authenticated:
+        return login_required_json(request)
+    return JsonResponse(_remove_saved(request.user, product_id))
+
+
+def _metrics_allowed(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return True
+    return request.META.get("REMOTE_ADDR") in getattr(
+        settings, "METRICS_ALLOWED_IPS", []
+    )
+
+
+def metrics_view(request):
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.registry.render(), content_type="text/plain; version=0.0.4"
+    )
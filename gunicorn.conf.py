@@ -0,0 +1,15 @@
+# Gunicorn settings, picked up automatically from the working directory.
+#
+# SERVER_MODE=wsgi (default) runs the classic sync workers on myshop.wsgi.
+# SERVER_MODE=asgi runs uvicorn workers on myshop.asgi; the JSON cart,
+# saved-item and quick-view endpoints are then served by the native async
+# views in ecommerce.async_views (see ecommerce/urls.py).
+import os
+
+server_mode = os.environ.get("SERVER_MODE", "wsgi")
+
+if server_mode == "asgi":
+    wsgi_app = "myshop.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "myshop.wsgi:application"
@@ -7,7 +7,16 @@ import os
 from pathlib import Path
 from decouple import config
 
-# Logging for SQL queries (optional)
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = config("SECRET_KEY")
+
+# Debug
+DEBUG = config("DEBUG", default=False, cast=bool)
+
+# Logging. SQL statement logging is expensive, so it is opt-in via LOG_SQL.
+LOG_SQL = config("LOG_SQL", default=False, cast=bool)
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -17,20 +26,67 @@ LOGGING = {
         },
     },
     "loggers": {
-        "django.db.backends": {
+        "ecommerce": {
             "handlers": ["console"],
-            "level": "DEBUG",
+            "level": "INFO",
         },
     },
 }
+if LOG_SQL:
+    LOGGING["loggers"]["django.db.backends"] = {
+        "handlers": ["console"],
+        "level": "DEBUG",
+    }
 
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = config("SECRET_KEY")
+# Query metrics: fraction of requests instrumented by QueryMetricsMiddleware
+QUERY_METRICS_SAMPLE_RATE = config(
+    "QUERY_METRICS_SAMPLE_RATE", default=1.0 if DEBUG else 0.05, cast=float
+)
+QUERY_METRICS_LOG_EVERY = config("QUERY_METRICS_LOG_EVERY", default=500, cast=int)
 
-# Debug
-DEBUG = config("DEBUG", default=False, cast=bool)
+# Per-view performance budgets, keyed by URL name ("default" applies to the rest)
+PERFORMANCE_BUDGETS_ENABLED = config(
+    "PERFORMANCE_BUDGETS_ENABLED", default=DEBUG, cast=bool
+)
+PERFORMANCE_BUDGET_ACTION = config("PERFORMANCE_BUDGET_ACTION", default="log")
+N_PLUS_ONE_THRESHOLD = config("N_PLUS_ONE_THRESHOLD", default=5, cast=int)
+PERFORMANCE_BUDGETS = {
+    "default": {"queries": 10, "time_ms": 500},
+    "index": {"queries": 5, "time_ms": 300},
+    "detail": {"queries": 5, "time_ms": 300},
+    "product_detail": {"queries": 6, "time_ms": 300},
+    "view_cart": {"queries": 5, "time_ms": 300},
+    "order_history": {"queries": 6, "time_ms": 300},
+    "saved_items": {"queries": 6, "time_ms": 300},
+}
+
+# Metrics (/metrics). Set METRICS_MULTIPROC_DIR under gunicorn so that the
+# endpoint aggregates every worker.
+METRICS_MULTIPROC_DIR = config("METRICS_MULTIPROC_DIR", default="")
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=5, cast=float)
+# /metrics is served to staff users, to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>", and to METRICS_ALLOWED_IPS. The IP
+# allowlist compares REMOTE_ADDR, which behind a reverse proxy is the proxy's
+# address for every request: leave it empty there and use the token.
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_ALLOWED_IPS = [
+    ip for ip in config("METRICS_ALLOWED_IPS", default="").split(",") if ip
+]
+
+# "wsgi" (gunicorn sync workers) or "asgi" (uvicorn workers, with the JSON
+# cart/saved/quick-view endpoints served by ecommerce.async_views).
+# gunicorn.conf.py reads the same variable.
+SERVER_MODE = config("SERVER_MODE", default="wsgi")
+
+# Background tasks (ecommerce.tasks, run by `manage.py run_worker`). Eager
+# mode runs them inline, once the caller's transaction commits, instead of
+# queueing, so development needs no worker.
+TASKS_ALWAYS_EAGER = config("TASKS_ALWAYS_EAGER", default=DEBUG, cast=bool)
+TASK_WORKER_CONCURRENCY = config("TASK_WORKER_CONCURRENCY", default=4, cast=int)
+TASK_POLL_INTERVAL = config("TASK_POLL_INTERVAL", default=1.0, cast=float)
+TASK_RETRY_BACKOFF = 10  # seconds, doubled on every retry
+TASK_RETRY_BACKOFF_MAX = 60 * 60
+TASK_LOCK_TIMEOUT = 30 * 60  # running tasks older than this are requeued
 
 # Allowed Hosts
 ALLOWED_HOSTS = config("ALLOWED_HOSTS", default="*").split(",")
@@ -42,8 +98,6 @@ STRIPE_PUBLISHABLE_KEY = config("STRIPE_PUBLISHABLE_KEY")
 # Database
 import dj_database_url
 
-
-
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -55,7 +109,27 @@ DATABASES = {
     }
 }
 
-
+# Cache shared by every web and worker process. Invalidation of cached saved
+# ids, rating histograms and quick views, the catalog and promotion versions,
+# and the rate-limit buckets only reach other processes through it, so it
+# must not be the per-process local-memory default. Set REDIS_URL in
+# production; without it the database cache table is used, which migration
+# 0025 creates (`manage.py createcachetable` does the same).
+REDIS_URL = config("REDIS_URL", default="")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "ecommerce_cache",
+        }
+    }
 
 # Application definition
 INSTALLED_APPS = [
@@ -72,12 +146,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "ecommerce.middleware.QueryMetricsMiddleware",
+    "ecommerce.middleware.PerformanceBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "ecommerce.middleware.PrerenderedPageMiddleware",
 ]
 
 ROOT_URLCONF = "myshop.urls"
@@ -121,12 +198,20 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "ecommerce.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ),
 }
+SIMPLE_JWT = {
+    "TOKEN_OBTAIN_SERIALIZER": (
+        "ecommerce.authentication.ShopTokenObtainPairSerializer"
+    ),
+}
+# How long a worker trusts its cached copy of a user's token version, i.e.
+# how long a revoked API token can keep working on other workers.
+JWT_TOKEN_VERSION_TTL = 30
 
 
 # Internationalization
@@ -138,9 +223,102 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Saved items
+SAVED_ITEMS_PAGE_SIZE = 24
+SAVED_IDS_CACHE_TIMEOUT = 60 * 60
+
+# Reviews shown per page on product detail / the reviews endpoint
+REVIEWS_PAGE_SIZE = 10
+# Review changes refresh the cached histogram (ecommerce.tasks); the timeout
+# bounds how long a missed refresh can go unnoticed.
+RATING_HISTOGRAM_CACHE_TIMEOUT = 60 * 60
+
+# Quick view fragments, invalidated by product and category changes; the
+# timeout bounds staleness after bulk updates that bypass the signals.
+QUICK_VIEW_CACHE_TIMEOUT = 60 * 60
+QUICK_VIEW_BATCH_LIMIT = 48
+
+# Listing facets: upper edges of the price buckets (the last bucket is open)
+PRICE_FACET_BUCKETS = [100, 250, 500, 1000]
+FACET_CACHE_TIMEOUT = 10 * 60
+
+# Product listing pages, and the per-process cache of result id lists
+PRODUCTS_PAGE_SIZE = 24
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 60
+SEARCH_CACHE_MAX_IDS = 5000
+
+# Binary catalog snapshot mmapped by every worker to sort and filter listings
+# without a database query; empty disables it (see build_catalog_snapshot).
+CATALOG_SNAPSHOT_PATH = config("CATALOG_SNAPSHOT_PATH", default="")
+
+# Directory of pre-rendered anonymous product/listing pages, written by
+# prerender_pages and kept current by background tasks; empty disables it.
+PRERENDER_ROOT = config("PRERENDER_ROOT", default="")
+
+# Frequently bought together neighbours kept per product
+RELATED_PRODUCTS_TOP_K = 8
+RELATED_PRODUCTS_MAX_BASKET = 20
+
+# Sales rollups only pick up orders older than this, so in-flight checkouts
+# (order created, items not yet written) are never half-counted.
+SALES_ROLLUP_LAG_SECONDS = 15 * 60
+SALES_ROLLUP_BATCH_SIZE = 5000
+
+# Stripe checkout sessions expire after this; Stripe's minimum is 30 minutes
+# from creation, so a minute is added for the request's own latency.
+CHECKOUT_SESSION_TTL = 31 * 60
+
+# How long stock stays held for an unpaid checkout. It outlives the Stripe
+# session so a payment made just before that expires still finds its stock.
+STOCK_RESERVATION_TTL = CHECKOUT_SESSION_TTL + 10 * 60
+
+# Token buckets checked before the view runs (ecommerce.utils.rate_limit):
+# scope -> (burst, seconds to refill it). RATE_LIMIT_CACHE must be shared by
+# all workers (not LocMemCache) or each process gets its own buckets. Set
+# RATE_LIMIT_PROXY_COUNT to the number of reverse proxies that append to
+# X-Forwarded-For.
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMIT_CACHE = "default"
+RATE_LIMIT_PROXY_COUNT = config("RATE_LIMIT_PROXY_COUNT", default=0, cast=int)
+RATE_LIMITS = {
+    "login_ip": (20, 60),
+    "login_user": (5, 5 * 60),
+    "register_ip": (5, 60 * 60),
+    "cart_ip": (120, 60),
+}
+
+# Each process recompiles the promotion rules when they change, and at least
+# this often (seconds) in case a change skipped the version bump
+PROMOTIONS_RULES_MAX_AGE = 5 * 60
+
+# Orders whose total (after promotions) is below this can't be checked out
+MINIMUM_ORDER_AMOUNT = config("MINIMUM_ORDER_AMOUNT", default=50, cast=int)
+
+# Admin changelists switch to the planner's row estimate above this size
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
 # Static files
 STATIC_URL = "static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# Production serving mode: collectstatic writes fingerprinted files with
+# gzip/brotli variants, and the app serves them and MEDIA with far-future
+# cache headers (ecommerce.serving). Off by default, so tests and DEBUG runs
+# work without running collectstatic first.
+SERVE_STATIC_FILES = config("SERVE_STATIC_FILES", default=False, cast=bool)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    # Product photos are stored once per distinct image (ecommerce.storage).
+    "product_photos": {"BACKEND": "ecommerce.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "ecommerce.storage.CompressedManifestStaticFilesStorage"
+            if SERVE_STATIC_FILES
+            else "django.contrib.staticfiles.storage.StaticFilesStorage"
+        )
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
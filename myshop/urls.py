@@ -1,12 +1,31 @@
+import re
+
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from ecommerce import serving
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("ecommerce.urls")),
 ]
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+elif settings.SERVE_STATIC_FILES:
+    urlpatterns += [
+        re_path(
+            r"^%s/(?P<path>.+)$" % re.escape(settings.STATIC_URL.strip("/")),
+            serving.serve,
+            {"document_root": settings.STATIC_ROOT},
+        ),
+        # Uploads never reuse a name (the storage picks a fresh one), so
+        # they can be cached as immutable like the fingerprinted assets.
+        re_path(
+            r"^%s/(?P<path>.+)$" % re.escape(settings.MEDIA_URL.strip("/")),
+            serving.serve,
+            {"document_root": settings.MEDIA_ROOT, "immutable": True},
+        ),
+    ]